@@ -1,11 +1,14 @@
 import os
+import argparse
 import numpy as np
 import pandas as pd
-import pytaxonkit
 import requests
-from tqdm import tqdm
 from pathlib import Path
-from config import PROKARYOTES_FILE, GENOME_DATASET_FILE, NCBI_GENOME_RECORDS_DIR
+from taxonomy import resolve_taxonomy
+from dataset_delta import snapshot_assemblies, diff_assemblies
+from instrumentation import add_report_arguments, start_run
+from config import (PROKARYOTES_FILE, GENOME_DATASET_FILE, NCBI_GENOME_RECORDS_DIR, TAXONOMY_FILE, TAXONOMY_CACHE_DIR,
+                    TAXDUMP_DIR, ASSEMBLY_SNAPSHOT_FILE, ASSEMBLY_DELTA_FILE, RUN_REPORTS_DIR)
 
 # NCBI FTP link for latest prokaryotes.txt
 NCBI_PROKARYOTES_URL = "https://ftp.ncbi.nlm.nih.gov/genomes/GENOME_REPORTS/prokaryotes.txt"
@@ -26,29 +29,11 @@ def download_latest_prokaryotes():
         except requests.RequestException as e:
             print(f"❌ Failed to download latest prokaryotes.txt: {e}")
 
-def fetch_taxonomy(data, cpu=4):
+def fetch_taxonomy(data, cpu=os.cpu_count()):
+    """Resolves ranks for every TaxID, reading the local taxdump when present and reusing cached TaxIDs."""
     data["TaxID"] = data["TaxID"].astype(str)
-    data_taxonkit = pytaxonkit.lineage(data["TaxID"].unique(), formatstr="{s}", threads=cpu)
-    data_taxonkit["TaxID"] = data_taxonkit["TaxID"].astype(str)
-
-    taxonomic_info = []
-    for _, row in tqdm(data_taxonkit.iterrows(), total=data_taxonkit.shape[0], desc="Processing taxonomic information"):
-        lineage_ranks = row['FullLineageRanks'].split(';')
-        full_lineage = row['FullLineage'].split(';')
-        taxonomy = dict(zip(lineage_ranks, full_lineage))
-        taxonomic_info.append({
-            'TaxID': row['TaxID'],
-            'Organism': full_lineage[1] if len(full_lineage) > 1 else None,
-            'Superkingdom': taxonomy.get('superkingdom'),
-            'Phylum': taxonomy.get('phylum'),
-            'Class': taxonomy.get('class'),
-            'Order': taxonomy.get('order'),
-            'Family': taxonomy.get('family'),
-            'Genus': taxonomy.get('genus'),
-            'Species': taxonomy.get('species'),
-            'Strain': taxonomy.get('strain'),
-        })
-    return pd.DataFrame(taxonomic_info).drop_duplicates()
+    taxdump_dir = TAXDUMP_DIR if (TAXDUMP_DIR / "nodes.dmp").exists() else None
+    return resolve_taxonomy(data["TaxID"].unique(), TAXONOMY_CACHE_DIR, taxdump_dir=taxdump_dir, threads=cpu)
 
 def load_prokaryotes():
     """Loads prokaryotes data and prepares it for processing."""
@@ -79,14 +64,49 @@ def save_output(genomes_records, dir_path):
         else:
             print(f"⚠️ Warning: '{column}' column is missing. Skipping file: {filepath}")
 
-download_latest_prokaryotes()
-data = load_prokaryotes()
-data = data[data['Status'].isin(['Complete Genome', 'Chromosome', 'Complete', 'Chromosome(s)'])]
-save_output(data, NCBI_GENOME_RECORDS_DIR)
-data = data[['TaxID', 'Group', 'SubGroup', 'Size (Mb)', 'GC%', 'Genes', 'Proteins', 'Assembly Accession', 'Reference', 'FTP Path']]
-taxonomy_data = fetch_taxonomy(data)
-data['FTP Path'] = data['FTP Path'].replace('-', np.nan)
-data.dropna(subset=['FTP Path'], inplace=True)
-data = taxonomy_data[['Organism', 'Species', 'Strain', 'TaxID']].merge(data, on='TaxID', how='inner')
-taxonomy_data.to_csv(NCBI_GENOME_RECORDS_DIR / 'taxonomy.csv', index=False)
-data.to_csv(GENOME_DATASET_FILE, index=False)
+def record_assembly_delta(data, refresh):
+    """
+    Snapshots the assemblies of this run and, when refreshing, writes the delta against the last snapshot.
+
+    Args:
+        data (pd.DataFrame): Filtered prokaryotes.txt rows with GenomePath and CDSPath.
+        refresh (bool): Diff against the previous snapshot and write ASSEMBLY_DELTA_FILE.
+    """
+    current = snapshot_assemblies(data)
+    if refresh and ASSEMBLY_SNAPSHOT_FILE.exists():
+        delta = diff_assemblies(pd.read_csv(ASSEMBLY_SNAPSHOT_FILE, dtype=str), current)
+        delta.to_csv(ASSEMBLY_DELTA_FILE, index=False)
+        counts = delta['Change'].value_counts()
+        print(f"✅ Assembly delta saved to {ASSEMBLY_DELTA_FILE}: {counts.get('added', 0)} added, "
+              f"{counts.get('removed', 0)} removed, {counts.get('updated', 0)} updated")
+    else:
+        if refresh:
+            print(f"⚠️ No previous snapshot at {ASSEMBLY_SNAPSHOT_FILE}; run the full pipeline this time.")
+        # A full run supersedes any pending delta
+        ASSEMBLY_DELTA_FILE.unlink(missing_ok=True)
+    current.to_csv(ASSEMBLY_SNAPSHOT_FILE, index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch taxonomy and prepare genome and CDS download lists.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Diff against the previous run's assemblies and write the delta for downstream --delta runs")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+
+    download_latest_prokaryotes()
+    report = start_run("02_fetch_taxonomy_prepare_downloads", args.report_dir, args.profile)
+    with report.stage("prepare download lists", inputs=[PROKARYOTES_FILE]):
+        data = load_prokaryotes()
+        data = data[data['Status'].isin(['Complete Genome', 'Chromosome', 'Complete', 'Chromosome(s)'])]
+        save_output(data, NCBI_GENOME_RECORDS_DIR)
+        record_assembly_delta(data, args.refresh)
+    data = data[['TaxID', 'Group', 'SubGroup', 'Size (Mb)', 'GC%', 'Genes', 'Proteins', 'Assembly Accession', 'Reference', 'FTP Path']]
+    with report.stage("resolve taxonomy") as stage:
+        taxonomy_data = fetch_taxonomy(data)
+        stage['taxa'] = len(taxonomy_data)
+    with report.stage("write dataset"):
+        data['FTP Path'] = data['FTP Path'].replace('-', np.nan)
+        data.dropna(subset=['FTP Path'], inplace=True)
+        data = taxonomy_data[['Organism', 'Species', 'Strain', 'TaxID']].merge(data, on='TaxID', how='inner')
+        taxonomy_data.to_csv(TAXONOMY_FILE, index=False)
+        data.to_csv(GENOME_DATASET_FILE, index=False)
@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+import http.client
+from datetime import datetime
+from pathlib import Path
+from urllib import request
+from urllib.parse import urlsplit
+from urllib.error import HTTPError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+from dataset_delta import AssemblyDelta
+from instrumentation import add_report_arguments, start_run
+from config import (GENOMES_DIR, CDS_DIR, NCBI_GENOME_RECORDS_DIR, GENOMIC_METADATA_DIR, ASSEMBLY_DELTA_FILE,  # Import standardized paths
+                    RUN_REPORTS_DIR)
+
+# Download lists written by 02_fetch_taxonomy_prepare_downloads.py
+GENOMES_FTP_FILE = NCBI_GENOME_RECORDS_DIR / "ncbi_genomes_ftp.txt"
+CDS_FTP_FILE = NCBI_GENOME_RECORDS_DIR / "ncbi_cds_ftp.txt"
+DOWNLOAD_MANIFEST_FILE = GENOMIC_METADATA_DIR / "download_manifest.jsonl"
+
+CHECKSUM_FILE_NAME = "md5checksums.txt"
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+BLOCK_SIZE = 1 << 20
+SAVED_STATUSES = ("ok", "unverified")  # Manifest statuses of files in place; only "ok" passed the MD5 check
+
+def normalise_url(url):
+    """Serves NCBI `ftp://` links over HTTPS, which supports range requests and connection reuse."""
+    if url.startswith("ftp://ftp.ncbi.nlm.nih.gov/"):
+        return "https://" + url[len("ftp://"):]
+    return url
+
+def read_url_list(list_file):
+    """Reads one URL per line, skipping blank lines and duplicates."""
+    with open(list_file) as handle:
+        return list(dict.fromkeys(normalise_url(line.strip()) for line in handle if line.strip()))
+
+def file_md5(path, block_size=BLOCK_SIZE):
+    """Returns the MD5 hex digest of a file, the checksum NCBI publishes."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as handle:
+        while block := handle.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DownloadManifest:
+    """
+    Append-only JSONL record of finished downloads.
+
+    Each line records the URL, local path, size, mtime, MD5 and whether it was verified
+    against NCBI's checksum. Files saved without a checksum to compare against are recorded
+    as "unverified" rather than "ok", so later runs check them again. A file is current when
+    its latest record succeeded and it still has the recorded size and mtime, so reruns
+    skip it with a single `stat`.
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = Path(manifest_file)
+        self.records = {}  # path -> latest record
+        self._lock = threading.Lock()
+        if self.manifest_file.exists():
+            with open(self.manifest_file) as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Truncated last line after a crash
+                    self.records[record["path"]] = record
+
+    def status(self, path):
+        """Returns "ok" or "unverified" if the file is still as last saved, otherwise None."""
+        with self._lock:
+            record = self.records.get(str(path))
+        if not record or record["status"] not in SAVED_STATUSES or not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) != (record["size"], record["mtime_ns"]):
+            return None
+        return record["status"]
+
+    def record(self, url, path, status, md5=None, verified=False):
+        """Appends a download record."""
+        record = {"url": url, "path": str(path), "status": status, "md5": md5, "verified": verified}
+        if status in SAVED_STATUSES:
+            stat = os.stat(path)
+            record.update({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        record["fetched_at"] = datetime.now().isoformat(timespec="seconds")
+
+        with self._lock:
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.manifest_file, 'a') as handle:
+                handle.write(json.dumps(record) + "\n")
+            self.records[str(path)] = record
+
+class HostLimiter:
+    """Caps the number of simultaneous connections to each host."""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self.semaphores = {}
+        self._lock = threading.Lock()
+
+    def slot(self, url):
+        """Returns the semaphore guarding connections to the URL's host."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+class Downloader:
+    """
+    Concurrent HTTP(S) downloader with per-host connection limits, range resume and MD5 checks.
+
+    Partial transfers are kept as `<file>.part` and continued with a `Range` request on the
+    next attempt or run. Finished files are checked against the `md5checksums.txt` that NCBI
+    publishes in every assembly directory (fetched once per directory) before being moved
+    into place.
+    """
+
+    def __init__(self, manifest, per_host=8, max_retries=5, timeout=60, verify=True):
+        self.manifest = manifest
+        self.hosts = HostLimiter(per_host)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.verify = verify
+        self.checksums = {}  # directory URL -> {file name: md5} (None if unavailable)
+        self._checksum_locks = {}
+        self._lock = threading.Lock()
+
+    def _with_retries(self, url, transfer):
+        """Runs `transfer()` under the host limit, retrying transient failures with backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.hosts.slot(url):
+                    return transfer()
+            except HTTPError as e:
+                if e.code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    raise
+            # URLError, timeouts, SSL errors and dropped connections are OSErrors; IncompleteRead is an HTTPException
+            except (OSError, http.client.HTTPException):
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+
+    def expected_md5(self, url):
+        """Looks up the published MD5 of a file, or None when the directory has no checksum list."""
+        directory, name = url.rsplit("/", 1)
+        with self._lock:
+            directory_lock = self._checksum_locks.setdefault(directory, threading.Lock())
+
+        with directory_lock:
+            if directory not in self.checksums:
+                def fetch():
+                    with request.urlopen(f"{directory}/{CHECKSUM_FILE_NAME}", timeout=self.timeout) as response:
+                        return response.read().decode()
+                try:
+                    text = self._with_retries(directory, fetch)
+                except (OSError, http.client.HTTPException) as e:
+                    logging.warning(f"⚠️ No {CHECKSUM_FILE_NAME} for {directory}: {e}")
+                    self.checksums[directory] = None
+                else:
+                    self.checksums[directory] = {
+                        file_name.removeprefix("./"): md5
+                        for md5, file_name in (line.split(None, 1) for line in text.splitlines() if line.strip())
+                    }
+            checksums = self.checksums[directory]
+        return checksums.get(name) if checksums else None
+
+    def _fetch_to(self, url, part_file):
+        """Downloads into `part_file`, continuing from its current size when the server allows it."""
+        offset = part_file.stat().st_size if part_file.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            response = request.urlopen(request.Request(url, headers=headers), timeout=self.timeout)
+        except HTTPError as e:
+            if e.code == 416 and offset:
+                return  # Nothing left to fetch; the part file is verified by the caller
+            raise
+
+        with response:
+            # 206 continues the partial file; a plain 200 means the server ignored the range
+            mode = 'ab' if offset and response.status == 206 else 'wb'
+            with open(part_file, mode) as handle:
+                start = handle.tell()
+                shutil.copyfileobj(response, handle, BLOCK_SIZE)
+                received = handle.tell() - start
+
+        # A dropped connection can end the body early without an error; resume instead of verifying
+        expected_length = response.headers.get("Content-Length")
+        if expected_length is not None and received < int(expected_length):
+            raise ConnectionError(f"Transfer ended after {received} of {expected_length} bytes")
+
+    def download(self, url, target_dir):
+        """
+        Downloads one file unless it is already complete.
+
+        Args:
+            url (str): File URL.
+            target_dir (Path): Directory the file is saved in, under its URL base name.
+
+        Returns:
+            str: "skipped", "downloaded" or "failed".
+        """
+        path = Path(target_dir) / url.rsplit("/", 1)[1]
+        try:
+            return self._download(url, path)
+        except (OSError, http.client.HTTPException) as e:
+            logging.error(f"❌ Download failed for {url}: {e}")
+            self.manifest.record(url, path, "failed")
+            return "failed"
+
+    def _download(self, url, path):
+        """Downloads one file to `path`, leaving transfer and file errors to `download`."""
+        status = self.manifest.status(path)
+        if status == "ok" or (status == "unverified" and not self.verify):
+            return "skipped"
+
+        expected = self.expected_md5(url) if self.verify else None
+
+        # Files fetched before the manifest existed (e.g. by wget), or saved while no checksum
+        # was available, are accepted once verified
+        if path.exists() and expected and file_md5(path) == expected:
+            self.manifest.record(url, path, "ok", expected, verified=True)
+            return "skipped"
+        if status == "unverified":
+            if expected is None:
+                return "skipped"  # Still nothing to check against; tried again on the next run
+            logging.warning(f"⚠️ Unverified file {path} does not match its checksum, downloading again")
+
+        part_file = path.with_name(path.name + ".part")
+        for attempt in range(2):
+            self._with_retries(url, lambda: self._fetch_to(url, part_file))
+            md5 = file_md5(part_file)
+            if expected is None or md5 == expected:
+                os.replace(part_file, path)
+                if expected is None:
+                    self.manifest.record(url, path, "unverified", md5)
+                else:
+                    self.manifest.record(url, path, "ok", md5, verified=True)
+                return "downloaded"
+
+            # A corrupt partial file cannot be resumed; start over once
+            logging.warning(f"⚠️ Checksum mismatch for {url} (attempt {attempt + 1})")
+            part_file.unlink()
+
+        self.manifest.record(url, path, "checksum_mismatch", md5)
+        return "failed"
+
+def download_all(urls, target_dir, downloader, connections=16):
+    """
+    Downloads a list of URLs into a directory over a pool of connections.
+
+    Returns:
+        dict: Number of files per outcome ("skipped", "downloaded", "failed").
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    outcomes = {"skipped": 0, "downloaded": 0, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(downloader.download, url, target_dir) for url in urls]
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f"Downloading to {target_dir.name}"):
+            try:
+                outcomes[future.result()] += 1
+            except Exception as e:  # e.g. the manifest itself cannot be written; keep the other downloads going
+                logging.error(f"❌ Download failed: {e}")
+                outcomes["failed"] += 1
+    return outcomes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download genome and CDS archives listed by 02_fetch_taxonomy_prepare_downloads.py.")
+    parser.add_argument("--genomes-list", type=Path, default=GENOMES_FTP_FILE, help="File with one genome URL per line")
+    parser.add_argument("--cds-list", type=Path, default=CDS_FTP_FILE, help="File with one CDS URL per line")
+    parser.add_argument("--genomes-dir", type=Path, default=GENOMES_DIR, help="Directory for genome files")
+    parser.add_argument("--cds-dir", type=Path, default=CDS_DIR, help="Directory for CDS files")
+    parser.add_argument("--manifest", type=Path, default=DOWNLOAD_MANIFEST_FILE, help="JSONL record of finished downloads")
+    parser.add_argument("--connections", type=int, default=16, help="Total simultaneous downloads")
+    parser.add_argument("--per-host", type=int, default=8, help="Maximum simultaneous connections to one host")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per file on transient errors")
+    parser.add_argument("--timeout", type=float, default=60, help="Socket timeout in seconds")
+    parser.add_argument("--no-verify", action="store_true", help=f"Skip {CHECKSUM_FILE_NAME} verification")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only fetch added/updated assemblies from the refresh delta and delete files of removed/replaced ones")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    report = start_run("03_download_genomes_cds", args.report_dir, args.profile)
+
+    downloader = Downloader(DownloadManifest(args.manifest), args.per_host, args.max_retries, args.timeout,
+                            verify=not args.no_verify)
+
+    if args.delta:
+        delta = AssemblyDelta.from_file(ASSEMBLY_DELTA_FILE)
+        for column, target_dir in (("GenomePath", args.genomes_dir), ("CDSPath", args.cds_dir)):
+            target_dir.mkdir(parents=True, exist_ok=True)
+            removed = delta.remove_stale_files(target_dir.iterdir())
+            urls = [normalise_url(url) for url in delta.urls(column)]
+            with report.stage(f"download {target_dir.name}") as stage:
+                outcomes = download_all(urls, target_dir, downloader, args.connections)
+                stage.update(outcomes)
+            print(f"✅ {column} delta: {outcomes['downloaded']} downloaded, {outcomes['skipped']} already complete, "
+                  f"{outcomes['failed']} failed, {removed} stale files removed")
+    else:
+        # Download genome and CDS files
+        for list_file, target_dir in ((args.genomes_list, args.genomes_dir), (args.cds_list, args.cds_dir)):
+            if not list_file.exists():
+                print(f"⚠️ File {list_file} not found, skipping...")
+                continue
+            with report.stage(f"download {target_dir.name}") as stage:
+                outcomes = download_all(read_url_list(list_file), target_dir, downloader, args.connections)
+                stage.update(outcomes)
+            print(f"✅ {list_file.name}: {outcomes['downloaded']} downloaded, {outcomes['skipped']} already complete, "
+                  f"{outcomes['failed']} failed")
+
+    print("🎯 All genome and CDS downloads are complete!")
@@ -1,10 +1,15 @@
 import os
 import re
+import gzip
+import argparse
 import pandas as pd
-from Bio import SeqIO
+from Bio.Seq import Seq
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
 import warnings
-from config import CDS_DIR, CDS_METADATA_DIR  # Import standardized paths
+from dataset_delta import AssemblyDelta
+from instrumentation import add_report_arguments, start_run
+from config import CDS_DIR, CDS_METADATA_DIR, ASSEMBLY_DELTA_FILE, RUN_REPORTS_DIR  # Import standardized paths
 
 warnings.filterwarnings("ignore")
 
@@ -12,6 +17,19 @@ warnings.filterwarnings("ignore")
 NUO_CDS_FILE = CDS_METADATA_DIR / "nuo_cds_prescreened.csv"
 NDU_CDS_FILE = CDS_METADATA_DIR / "ndu_cds_prescreened.csv"
 
+# Gene prefixes screened in a single pass, with their output files
+GENE_PREFIXES = {"nuo": NUO_CDS_FILE, "nduf": NDU_CDS_FILE}
+
+HEADER_PATTERNS = {
+    "accession": r"lcl\|(.*?)_cds",
+    "gene": r"\[gene=(.*?)\]",
+    "protein": r"\[protein=(.*?)\]"
+}
+
+# Stop codons of the bacterial, archaeal and plant plastid code (NCBI table 11)
+STOP_CODONS = {"TAA", "TAG", "TGA"}
+UNAMBIGUOUS_BASES = set("ACGT")
+
 def extract_from_header(header, patterns):
     """Extracts values from a FASTA header using regex patterns."""
     return {key: (match.group(1) if (match := re.search(pattern, header)) else None) for key, pattern in patterns.items()}
@@ -20,23 +38,73 @@ def clean_gene_symbol(gene_symbol):
     """Formats gene symbols by removing special characters and standardizing casing."""
     return gene_symbol.lower().replace('[h', '').replace('[c', '').strip().replace('nuo', '').upper().translate(str.maketrans('', '', '-_/'))
 
-def parse_cds_files(gene_initial="nuo"):
-    """Parses CDS FASTA files to extract gene-specific records."""
-    data = []
-    patterns = {
-        "accession": r"lcl\|(.*?)_cds",
-        "gene": r"\[gene=(.*?)\]",
-        "protein": r"\[protein=(.*?)\]"
-    }
-
-    for fasta in tqdm(os.listdir(CDS_DIR), desc=f"Processing {gene_initial.upper()} CDS files"):
-        fasta_path = CDS_DIR / fasta
-        for record in SeqIO.parse(fasta_path, "fasta"):
-            if f"gene={gene_initial}" in record.description.lower():
-                prot_seq = record.seq.translate(table=11, to_stop=True)
-                record_info = extract_from_header(record.description, patterns)
-                data.append([fasta, record.description] + list(record_info.values()) + [len(prot_seq)])
+def open_fasta(fasta_path):
+    """Opens a plain or gzip-compressed FASTA file for reading text."""
+    if str(fasta_path).endswith(".gz"):
+        return gzip.open(fasta_path, "rt")
+    return open(fasta_path, "r")
+
+def protein_length(nucleotides):
+    """
+    Returns the length of `Seq(nucleotides).translate(table=11, to_stop=True)` without translating.
+
+    The length is the number of complete codons before the first in-frame stop codon.
+    Sequences containing ambiguous bases are translated, since an ambiguous codon can
+    still resolve to a stop.
+    """
+    nucleotides = nucleotides.upper()
+    if not UNAMBIGUOUS_BASES.issuperset(nucleotides):
+        return len(Seq(nucleotides).translate(table=11, to_stop=True))
+
+    n_codons = len(nucleotides) // 3
+    for codon_index in range(n_codons):
+        if nucleotides[3 * codon_index:3 * codon_index + 3] in STOP_CODONS:
+            return codon_index
+    return n_codons
+
+def scan_cds_file(fasta_path, gene_initials=tuple(GENE_PREFIXES)):
+    """
+    Scans one CDS FASTA file for records of the given gene prefixes.
+
+    Only header lines are inspected; sequence lines are collected just for matching records.
+
+    Args:
+        fasta_path (Path): CDS FASTA file (plain or `.gz`).
+        gene_initials (tuple): Gene name prefixes to look for, e.g. ("nuo", "nduf").
+
+    Returns:
+        dict: Maps each gene prefix to a list of
+            [CDSFile, Header, Accession, GeneName, ProteinName, ProteinLength] rows.
+    """
+    fasta = os.path.basename(fasta_path)
+    markers = {gene_initial: f"gene={gene_initial}" for gene_initial in gene_initials}
+    data = {gene_initial: [] for gene_initial in gene_initials}
+
+    def flush(description, matched, sequence_lines):
+        record_info = extract_from_header(description, HEADER_PATTERNS)
+        length = protein_length("".join(sequence_lines))
+        for gene_initial in matched:
+            data[gene_initial].append([fasta, description] + list(record_info.values()) + [length])
 
+    description, matched, sequence_lines = None, [], []
+    with open_fasta(fasta_path) as handle:
+        for line in handle:
+            if line.startswith(">"):
+                if matched:
+                    flush(description, matched, sequence_lines)
+                description = line[1:].rstrip()
+                lowered = description.lower()
+                matched = [gene_initial for gene_initial, marker in markers.items() if marker in lowered]
+                sequence_lines = []
+            elif matched:
+                sequence_lines.append(line.strip())
+        if matched:
+            flush(description, matched, sequence_lines)
+
+    return data
+
+def build_cds_table(data):
+    """Formats scanned CDS records into a prescreened subunit table."""
     df = pd.DataFrame(data, columns=['CDSFile', 'Header', 'Accession', 'GeneName', 'ProteinName', 'ProteinLength'])
 
     if not df.empty:
@@ -54,11 +122,57 @@ def parse_cds_files(gene_initial="nuo"):
 
     return df
 
-# Process both 'nuo' and 'nduf' genes
-for gene, output_file in [("nuo", NUO_CDS_FILE), ("nduf", NDU_CDS_FILE)]:
-    result_df = parse_cds_files(gene)
-    if not result_df.empty:
-        result_df.to_csv(output_file, index=False)
-        print(f"✅ Saved {output_file}")
-    else:
-        print(f"⚠️ No data found for {gene}, skipping...")
\ No newline at end of file
+def parse_cds_files(gene_initials=tuple(GENE_PREFIXES), workers=None, fasta_paths=None):
+    """
+    Parses all CDS FASTA files once, extracting records for every gene prefix.
+
+    Args:
+        gene_initials (tuple): Gene name prefixes to look for.
+        workers (int): Number of worker processes (default: number of CPUs).
+        fasta_paths (list): CDS files to parse (default: every file in CDS_DIR).
+
+    Returns:
+        dict: Maps each gene prefix to its prescreened DataFrame.
+    """
+    if fasta_paths is None:
+        fasta_paths = sorted(CDS_DIR / fasta for fasta in os.listdir(CDS_DIR))
+    data = {gene_initial: [] for gene_initial in gene_initials}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        scans = executor.map(scan_cds_file, fasta_paths, [gene_initials] * len(fasta_paths), chunksize=32)
+        for file_data in tqdm(scans, total=len(fasta_paths), desc="Processing CDS files"):
+            for gene_initial, rows in file_data.items():
+                data[gene_initial].extend(rows)
+
+    return {gene_initial: build_cds_table(rows) for gene_initial, rows in data.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prescreen CDS files for annotated Complex I subunits.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only scan CDS files of added/updated assemblies and update the existing tables")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+    report = start_run("04_prescreen_cds", args.report_dir, args.profile)
+
+    fasta_paths = sorted(CDS_DIR / fasta for fasta in os.listdir(CDS_DIR))
+    if args.delta:
+        delta = AssemblyDelta.from_file(ASSEMBLY_DELTA_FILE)
+        fasta_paths = [fasta_path for fasta_path in fasta_paths if delta.is_fresh(fasta_path.name)]
+
+    # Process both 'nuo' and 'nduf' genes in a single pass
+    with report.stage("scan CDS files", inputs=fasta_paths):
+        results = parse_cds_files(tuple(GENE_PREFIXES), args.workers, fasta_paths)
+
+    with report.stage("write tables"):
+        for gene, output_file in GENE_PREFIXES.items():
+            result_df = results[gene]
+            # A delta update is written even when empty, so rows of removed assemblies do not linger
+            updating = args.delta and output_file.exists()
+            if updating:
+                result_df = delta.apply(pd.read_csv(output_file), result_df, 'CDSFile')
+            if updating or not result_df.empty:
+                result_df.to_csv(output_file, index=False)
+                print(f"✅ Saved {output_file}")
+            else:
+                print(f"⚠️ No data found for {gene}, skipping...")
@@ -1,40 +1,82 @@
 import os
+import argparse
 import pandas as pd
-from Bio import SeqIO
 from tqdm import tqdm
-from config import GENOMES_DIR, GENOME_METADATA_DIR  # Import standardized paths
+from concurrent.futures import ProcessPoolExecutor
+from fasta_index import record_lengths
+from dataset_delta import AssemblyDelta
+from instrumentation import add_report_arguments, start_run
+from config import GENOMES_DIR, GENOME_METADATA_FILE, ASSEMBLY_DELTA_FILE, RUN_REPORTS_DIR  # Import standardized paths
 
-# Define output file
-GENOME_METADATA_FILE = GENOME_METADATA_DIR / "genomes_metadata.csv"
+# Index files that may sit next to the genomes
+INDEX_SUFFIXES = ('.fai', '.gzi')
 
-def extract_genome_metadata():
-    """Extracts genome metadata from FASTA headers."""
-    metadata = []
+def classify_replicon(description):
+    """Classifies a replicon from its FASTA header."""
+    description = description.lower()
+    if 'plasmid' in description:
+        return 'Plasmid'
+    elif 'chromosome' in description or 'genome' in description:
+        return 'Chromosome'
+    return 'Undefined'
+
+def scan_genome(genome):
+    """
+    Extracts (Accession, Replicon, GenomeFile, SequenceLength(Mb)) rows for one genome file.
 
-    for genome in tqdm(os.listdir(GENOMES_DIR), desc="Extracting genome metadata"):
-        fasta_path = GENOMES_DIR / genome
+    Sequence lengths are counted by streaming the file (or read from its `.fai` index),
+    so no replicon sequence is ever held in memory.
+    """
+    rows = []
+    for header, length in record_lengths(GENOMES_DIR / genome):
+        accession = header.split(None, 1)[0] if header else ""
+        rows.append((accession, classify_replicon(header), genome, length / 1_000_000))  # Convert to megabases
+    return rows
 
-        for record in SeqIO.parse(fasta_path, "fasta"):
-            accession = record.id
-            description = record.description
-            seq_length = len(record.seq) / 1_000_000  # Convert to megabases
+def extract_genome_metadata(workers=None, genomes=None):
+    """
+    Extracts genome metadata from FASTA headers, scanning genome files across a process pool.
 
-            if 'plasmid' in description.lower():
-                replicon_type = 'Plasmid'
-            elif 'chromosome' in description.lower() or 'genome' in description.lower():
-                replicon_type = 'Chromosome'
-            else:
-                replicon_type = 'Undefined'
+    Args:
+        workers (int): Number of worker processes (default: number of CPUs).
+        genomes (list): Genome file names to scan (default: every genome in GENOMES_DIR).
+
+    Returns:
+        pd.DataFrame: One row per replicon.
+    """
+    if genomes is None:
+        genomes = sorted(genome for genome in os.listdir(GENOMES_DIR) if not genome.endswith(INDEX_SUFFIXES))
+    metadata = []
 
-            metadata.append((accession, replicon_type, genome, seq_length))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        scans = executor.map(scan_genome, genomes, chunksize=8)
+        for rows in tqdm(scans, total=len(genomes), desc="Extracting genome metadata"):
+            metadata.extend(rows)
 
     return pd.DataFrame(metadata, columns=['Accession', 'Replicon', 'GenomeFile', 'SequenceLength(Mb)'])
 
-# Process and save genome metadata
-genome_df = extract_genome_metadata()
-if not genome_df.empty:
-    genome_df.to_csv(GENOME_METADATA_FILE, index=False)
-    print(f"✅ Saved genome metadata to {GENOME_METADATA_FILE}")
-else:
-    print("⚠️ No genome metadata extracted.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract per-replicon metadata from genome FASTA files.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only scan genomes of added/updated assemblies and update the existing metadata")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+    report = start_run("05_extract_genome_metadata", args.report_dir, args.profile)
 
+    # Process and save genome metadata
+    genomes = sorted(genome for genome in os.listdir(GENOMES_DIR) if not genome.endswith(INDEX_SUFFIXES))
+    if args.delta:
+        delta = AssemblyDelta.from_file(ASSEMBLY_DELTA_FILE)
+        genomes = [genome for genome in genomes if delta.is_fresh(genome)]
+    with report.stage("scan genomes", inputs=[GENOMES_DIR / genome for genome in genomes]):
+        genome_df = extract_genome_metadata(args.workers, genomes)
+    # A delta update is written even when empty, so rows of removed assemblies do not linger
+    updating = args.delta and GENOME_METADATA_FILE.exists()
+    if updating:
+        genome_df = delta.apply(pd.read_csv(GENOME_METADATA_FILE), genome_df, 'GenomeFile')
+    if updating or not genome_df.empty:
+        genome_df.to_csv(GENOME_METADATA_FILE, index=False)
+        print(f"✅ Saved genome metadata to {GENOME_METADATA_FILE}")
+    else:
+        print("⚠️ No genome metadata extracted.")
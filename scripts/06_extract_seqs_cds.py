@@ -1,40 +1,54 @@
 import os
+import argparse
 import pandas as pd
 from Bio import SeqIO
+from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 from tqdm import tqdm
-from config import CDS_DIR, CDS_METADATA_DIR, HMM_CDS_SEQS_DIR  # Correct output directory
+from config import CDS_DIR, CDS_METADATA_DIR, HMM_CDS_SEQS_DIR, RUN_REPORTS_DIR  # Correct output directory
+from fasta_index import FastaIndex
+from instrumentation import add_report_arguments, start_run
 
 # Ensure output directory exists
 HMM_CDS_SEQS_DIR.mkdir(parents=True, exist_ok=True)
 
-def process_sequences(cds_df):
+# Persistent record-offset index over the CDS files
+CDS_INDEX_FILE = CDS_METADATA_DIR / "cds_index.sqlite"
+
+def process_sequences(cds_df, index):
     """
     Process and save protein sequences from CDS data.
 
+    Records are fetched by seeking to their indexed offsets, so only the wanted CDS are read.
+
     :param cds_df: DataFrame containing CDS information
+    :param index: FastaIndex covering the CDS files
     """
     # Filter for chromosome-associated CDS entries
     chr_cds = cds_df[cds_df['Replicon'] == 'Chromosome']
 
-    # Group CDS entries by file, mapping them to (Subunit, Header)
-    cds_to_info = chr_cds.groupby('CDSFile')[['Subunit', 'Header']].apply(lambda x: x.values.tolist()).to_dict()
-    
-    # Initialize a dictionary to store sequences by subunit
-    sequence_data = {subunit: [] for subunit in cds_df['Subunit'].unique()}
-
-    # Process each CDS file
-    for fasta in tqdm(chr_cds['CDSFile'].unique(), desc="Extracting sequences"):
+    # Skip CDS files that are no longer on disk
+    cds_files = []
+    for fasta in chr_cds['CDSFile'].unique():
         fasta_path = CDS_DIR / fasta
-
         if not fasta_path.exists():
             print(f"⚠️ Skipping missing file: {fasta_path}")
             continue
+        cds_files.append(fasta_path)
+    index.update(cds_files)
 
-        for record in SeqIO.parse(fasta_path, "fasta"):
-            for subunit, header in cds_to_info[fasta]:
-                if header in record.description:
-                    sequence_data[subunit].append(record.seq.translate(table=11, to_stop=True))
+    # Map each wanted (file, sequence ID) to its subunit; the ID is the first word of the header
+    wanted = {
+        (CDS_DIR / fasta, header.split()[0]): subunit
+        for fasta, header, subunit in chr_cds[['CDSFile', 'Header', 'Subunit']].itertuples(index=False)
+    }
+
+    # Initialize a dictionary to store sequences by subunit
+    sequence_data = {subunit: [] for subunit in cds_df['Subunit'].unique()}
+
+    for fasta_path, key, _, sequence in tqdm(index.fetch(wanted), total=len(wanted), desc="Extracting sequences"):
+        subunit = wanted[(fasta_path, key)]
+        sequence_data[subunit].append(Seq(sequence).translate(table=11, to_stop=True))
 
     # Write sequences to the correct HMM directory
     for subunit, sequences in sequence_data.items():
@@ -44,19 +58,28 @@ def process_sequences(cds_df):
             SeqIO.write(records, output_file, "fasta")
             print(f"✅ Saved sequences to: {output_file}")
 
-# Load preprocessed CDS metadata
-NUO_CDS_FILE = CDS_METADATA_DIR / "nuo_cds_prescreened.csv"
-NDU_CDS_FILE = CDS_METADATA_DIR / "ndu_cds_prescreened.csv"
-
-# Read input data
-if NUO_CDS_FILE.exists():
-    nuo_data = pd.read_csv(NUO_CDS_FILE)
-    process_sequences(nuo_data)
-else:
-    print(f"⚠️ Missing file: {NUO_CDS_FILE}")
-
-if NDU_CDS_FILE.exists():
-    ndu_data = pd.read_csv(NDU_CDS_FILE)
-    process_sequences(ndu_data)
-else:
-    print(f"⚠️ Missing file: {NDU_CDS_FILE}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract chromosomal Complex I subunit sequences from CDS files.")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+    report = start_run("06_extract_seqs_cds", args.report_dir, args.profile)
+
+    # Load preprocessed CDS metadata
+    NUO_CDS_FILE = CDS_METADATA_DIR / "nuo_cds_prescreened.csv"
+    NDU_CDS_FILE = CDS_METADATA_DIR / "ndu_cds_prescreened.csv"
+
+    with FastaIndex(CDS_INDEX_FILE) as cds_index:
+        # Read input data
+        if NUO_CDS_FILE.exists():
+            with report.stage("extract nuo sequences"):
+                nuo_data = pd.read_csv(NUO_CDS_FILE)
+                process_sequences(nuo_data, cds_index)
+        else:
+            print(f"⚠️ Missing file: {NUO_CDS_FILE}")
+
+        if NDU_CDS_FILE.exists():
+            with report.stage("extract nduf sequences"):
+                ndu_data = pd.read_csv(NDU_CDS_FILE)
+                process_sequences(ndu_data, cds_index)
+        else:
+            print(f"⚠️ Missing file: {NDU_CDS_FILE}")
@@ -2,62 +2,283 @@ import os
 import sys
 import json
 import ssl
-from time import sleep
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import http.client
+from time import monotonic, time
+from pathlib import Path
 from urllib import request
-from urllib.error import HTTPError
+from urllib.error import HTTPError, URLError
 from tqdm import tqdm
 import pandas as pd
-from config import HMM_INTERPRO_SEQS_DIR, INTERPRO_CSV  # Use updated config paths
+from config import HMM_ANALYSIS_DIR, HMM_INTERPRO_SEQS_DIR, INTERPRO_CSV, RUN_REPORTS_DIR  # Use updated config paths
+from instrumentation import add_report_arguments, start_run
+
+INTERPRO_API_BASE = "https://www.ebi.ac.uk:443/interpro/api"
+CACHE_DIR = HMM_ANALYSIS_DIR / "interpro_cache"
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+CACHE_MAX_AGE_DAYS = 30
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by all concurrent requests."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ResponseCache:
+    """
+    On-disk cache of API page responses, stored under the SHA-256 of the request URL.
+
+    Entries are kept per InterPro release (`<cache_dir>/<release>/`), so pages cached for an
+    earlier release are never replayed after a new one. Entries older than `max_age_days`
+    expire as well, which also covers runs where the release could not be determined.
+    """
+
+    def __init__(self, cache_dir, release=None, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.cache_dir = Path(cache_dir) / (release or "unknown_release")
+        self.max_age = max_age_days * 86400 if max_age_days is not None else None
+
+    def path(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.json"
+
+    def get(self, url):
+        cache_file = self.path(url)
+        if not cache_file.exists():
+            return None
+        if self.max_age is not None and time() - cache_file.stat().st_mtime > self.max_age:
+            return None
+        return cache_file.read_bytes()
+
+    def put(self, url, body):
+        cache_file = self.path(url)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(".tmp")
+        temp_file.write_bytes(body)
+        os.replace(temp_file, cache_file)
+
+class FetchSession:
+    """
+    Bounded-concurrency, rate-limited HTTP client with retries and an optional response cache.
+
+    With `refresh`, cached responses are not read, but fresh ones are still written to the cache.
+    """
+
+    def __init__(self, concurrency=8, rate=5.0, max_retries=5, cache=None, timeout=60, refresh=False):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.timeout = timeout
+        self.refresh = refresh
+        self.ssl_context = ssl.create_default_context()
+
+    def _get(self, url):
+        """Blocking GET; returns (status, body)."""
+        req = request.Request(url, headers={"Accept": "application/json"})
+        with request.urlopen(req, context=self.ssl_context, timeout=self.timeout) as response:
+            return response.status, response.read()
+
+    async def get(self, url, cached=True):
+        """
+        Fetches a URL, retrying transient failures with exponential backoff.
+
+        Args:
+            url (str): URL to fetch.
+            cached (bool): Read and write the response cache for this URL.
+
+        Returns:
+            bytes: Response body (empty if the server returned no content), or None if all retries failed.
+        """
+        cache = self.cache if cached else None
+        if cache and not self.refresh and (body := cache.get(url)) is not None:
+            return body
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with self.semaphore:
+                    status, body = await asyncio.get_running_loop().run_in_executor(None, self._get, url)
+            except HTTPError as e:
+                if e.code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    logging.error(f"❌ HTTP {e.code} for {url}")
+                    return None
+                retry_after = e.headers.get("Retry-After") if e.headers else None
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            except (URLError, TimeoutError, ConnectionError, http.client.HTTPException) as e:  # Incl. IncompleteRead
+                if attempt == self.max_retries:
+                    logging.error(f"❌ Request failed for {url}: {e}")
+                    return None
+                delay = 2 ** attempt
+            else:
+                if status == 204:  # No data for this query
+                    body = b""
+                if cache:
+                    cache.put(url, body)
+                return body
+
+            await asyncio.sleep(delay + random.uniform(0, 1))
+
+async def interpro_release(session, api_base=INTERPRO_API_BASE):
+    """Returns the current InterPro release reported by the API root, or None if it cannot be read."""
+    body = await session.get(f"{api_base}/", cached=False)
+    try:
+        return str(json.loads(body)["databases"]["interpro"]["version"])
+    except (TypeError, ValueError, KeyError) as e:
+        logging.warning(f"⚠️ Could not determine the InterPro release ({e}); cached pages expire by age only")
+        return None
 
 class InterProFetcher:
     HEADER_SEPARATOR = "|"
     LINE_LENGTH = 80
 
-    def __init__(self, interpro_accession, ncbi_taxid, subunit, organism):
+    def __init__(self, interpro_accession, ncbi_taxid, subunit, organism, api_base=INTERPRO_API_BASE):
         self.interpro_accession = interpro_accession
         self.ncbi_taxid = ncbi_taxid
         self.subunit = subunit
         self.organism = organism
-        self.base_url = f"https://www.ebi.ac.uk:443/interpro/api/protein/reviewed/entry/InterPro/{interpro_accession}/taxonomy/uniprot/{ncbi_taxid}/?page_size=200&extra_fields=sequence"
+        self.base_url = f"{api_base}/protein/reviewed/entry/InterPro/{interpro_accession}/taxonomy/uniprot/{ncbi_taxid}/?page_size=200&extra_fields=sequence"
         self.output_file = HMM_INTERPRO_SEQS_DIR / f"{subunit.lower()}_{organism}_{interpro_accession.lower()}_interpro.faa"
 
-    def fetch_and_save_sequences(self):
-        """Fetches InterPro sequences and saves them in FASTA format."""
-        next_url = self.base_url
+    async def fetch_data(self, url, session):
+        """Fetches and decodes one page of API results; returns None if the page could not be fetched."""
+        body = await session.get(url)
+        if body is None:
+            return None
+        if not body:  # 204: no sequences for this query
+            return {"results": [], "next": None}
+        return json.loads(body)
+
+    def write_fasta(self, item, file):
+        """Writes a single API result as a FASTA record."""
+        metadata = item["metadata"]
+        header = [metadata["accession"], metadata.get("name") or ""]
+        if source_organism := metadata.get("source_organism"):
+            header.append(source_organism.get("scientificName") or "")
+        sequence = item["extra_fields"]["sequence"]
+
+        file.write(">" + self.HEADER_SEPARATOR.join(header) + "\n")
+        for i in range(0, len(sequence), self.LINE_LENGTH):
+            file.write(sequence[i:i + self.LINE_LENGTH] + "\n")
+
+    async def fetch_and_save_sequences(self, session):
+        """
+        Fetches InterPro sequences and saves them in FASTA format.
+
+        Returns:
+            int: Number of sequences saved, or None if a page failed after all retries, in
+            which case the previous output file is left untouched.
+        """
+        next_url, items = self.base_url, []
+
+        # Pages are cursor-linked, so they are fetched in order
+        while next_url:
+            data = await self.fetch_data(next_url, session)
+            if data is None:
+                logging.error(f"❌ Could not fetch {next_url}; keeping the previous {self.output_file.name}")
+                return None
+            items.extend(data["results"])
+            next_url = data.get("next")
+
+        temp_file = self.output_file.with_suffix(".tmp")
+        with open(temp_file, "w") as file:
+            for item in items:
+                self.write_fasta(item, file)
+        os.replace(temp_file, self.output_file)
+        return len(items)
+
+async def fetch_all(fetchers, session):
+    """
+    Runs all fetchers concurrently, reporting progress as they finish.
+
+    Returns:
+        list: Fetchers whose query failed.
+    """
+    async def run(fetcher):
+        return fetcher, await fetcher.fetch_and_save_sequences(session)
+
+    failed = []
+    with tqdm(total=len(fetchers), desc="Fetching InterPro sequences") as progress:
+        for task in asyncio.as_completed([run(fetcher) for fetcher in fetchers]):
+            fetcher, count = await task
+            if count is None:
+                failed.append(fetcher)
+            else:
+                logging.info(f"✅ {count} sequences saved to {fetcher.output_file}")
+            progress.update(1)
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch reviewed InterPro sequences for each Complex I subunit.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum simultaneous API requests")
+    parser.add_argument("--rate", type=float, default=5.0, help="Maximum API requests per second")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per request on transient errors")
+    parser.add_argument("--api-base", default=INTERPRO_API_BASE, help="InterPro API base URL (e.g. a local stub server)")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the response cache")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Refetch every page, ignoring cached responses, and store the new ones in the cache")
+    parser.add_argument("--cache-max-age", type=float, default=CACHE_MAX_AGE_DAYS,
+                        help="Days after which cached pages are refetched, even within the same InterPro release")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    report = start_run("07_fetch_interpro_seqs", args.report_dir, args.profile)
 
-        with open(self.output_file, "w") as file:
-            while next_url:
-                data = self.fetch_data(next_url)
-                if not data:
-                    break
+    # Ensure output directory exists
+    HMM_INTERPRO_SEQS_DIR.mkdir(parents=True, exist_ok=True)
 
-                for item in data["results"]:
-                    self.write_fasta(item, file)
+    # Check if the InterPro file exists
+    if not INTERPRO_CSV.exists():
+        sys.stderr.write(f"⚠️ Missing InterPro classification file: {INTERPRO_CSV}\n")
+        sys.exit(1)
 
-                next_url = data.get("next")
-                sleep(1)  
+    # Load InterPro accessions
+    interpro_data = pd.read_csv(INTERPRO_CSV)
+    print(f"✅ Loaded {len(interpro_data)} InterPro accessions from {INTERPRO_CSV}")
 
-# Ensure output directory exists
-HMM_INTERPRO_SEQS_DIR.mkdir(parents=True, exist_ok=True)
+    # Define taxonomic groups
+    prok_ncbi_taxid = [('archaea', 2157), ('bacteria', 2)]
 
-# Check if the InterPro file exists
-if not INTERPRO_CSV.exists():
-    sys.stderr.write(f"⚠️ Missing InterPro classification file: {INTERPRO_CSV}\n")
-    sys.exit(1)
+    fetchers = [
+        InterProFetcher(row['InterPro Accession'], ncbi_taxid, row['Protein'], organism, args.api_base)
+        for organism, ncbi_taxid in prok_ncbi_taxid
+        for _, row in interpro_data.iterrows()
+    ]
 
-# Load InterPro accessions
-interpro_data = pd.read_csv(INTERPRO_CSV)
-print(f"✅ Loaded {len(interpro_data)} InterPro accessions from {INTERPRO_CSV}")
+    async def main():
+        session = FetchSession(args.concurrency, args.rate, args.max_retries, refresh=args.refresh)
+        if not args.no_cache:
+            release = await interpro_release(session, args.api_base)
+            logging.info(f"📦 InterPro release {release or 'unknown'}; caching pages in {CACHE_DIR}")
+            session.cache = ResponseCache(CACHE_DIR, release, args.cache_max_age)
+        return await fetch_all(fetchers, session)
 
-# Define taxonomic groups
-prok_ncbi_taxid = [('archaea', 2157), ('bacteria', 2)]
+    with report.stage("fetch InterPro sequences") as stage:
+        failed = asyncio.run(main())
+        stage['queries'] = len(fetchers)
 
-# Fetch sequences
-for organism, ncbi_taxid in prok_ncbi_taxid:
-    for _, row in tqdm(interpro_data.iterrows(), total=len(interpro_data), desc=f"Fetching sequences for {organism}"):
-        subunit_protein = row['Protein']
-        interpro_accession = row['InterPro Accession']
-        fetcher = InterProFetcher(interpro_accession, ncbi_taxid, subunit_protein, organism)
-        fetcher.fetch_and_save_sequences()
+    if failed:
+        logging.error(f"❌ {len(failed)} of {len(fetchers)} InterPro queries failed; rerun to retry them")
+        sys.exit(1)
 
-print("✅ InterPro sequence fetching complete.")
+    print("✅ InterPro sequence fetching complete.")
@@ -1,13 +1,25 @@
 import os
+import json
 import shutil
+import hashlib
+import csv
+import argparse
+import threading
 import subprocess
 import logging
+import time
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
 from tqdm import tqdm
 from config import (
-    HMM_CDS_SEQS_DIR, HMM_INTERPRO_SEQS_DIR, HMM_COMBINED_SEQS_DIR, HMM_MSA_SEQS_DIR,
-    HMM_CLUST_SEQS_DIR, HMM_PROFILES_DIR
+    HMM_ANALYSIS_DIR, HMM_CDS_SEQS_DIR, HMM_INTERPRO_SEQS_DIR, HMM_COMBINED_SEQS_DIR, HMM_MSA_SEQS_DIR,
+    HMM_CLUST_SEQS_DIR, HMM_PROFILES_DIR, RUN_REPORTS_DIR
 )
+from instrumentation import add_report_arguments, run_subprocess, start_run
+from file_utils import file_digest
 
 # Setup logging
 LOG_FILE = Path(__file__).parent / "hmm_pipeline.log"
@@ -21,6 +33,23 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 logging.getLogger().addHandler(console_handler)
 
+# Fingerprints of the inputs and parameters that produced each stage output
+BUILD_STATE_FILE = HMM_ANALYSIS_DIR / "hmm_build_state.json"
+# One JSON line per alignment: input size, chosen MAFFT strategy and runtime
+BUILD_LOG_FILE = HMM_ANALYSIS_DIR / "hmm_build_log.jsonl"
+BUILD_LOG_LOCK = threading.Lock()
+
+# MAFFT options per strategy; "seeded" aligns representatives, then adds the rest
+MAFFT_STRATEGIES = {
+    "linsi": ["--localpair", "--maxiterate", "400"],
+    "fftns2": ["--retree", "2", "--maxiterate", "0"],
+    "parttree": ["--retree", "2", "--parttree"],
+}
+LINSI_MAX_SEQS = 500
+LINSI_MAX_LENGTH = 3000
+FFTNS_MAX_SEQS = 20000
+SEED_IDENTITY = 0.5
+
 def setup_directories(directories):
     """Creates the required directories if they do not exist."""
     for directory in directories:
@@ -28,9 +57,9 @@ def setup_directories(directories):
         logging.info(f"✅ Directory ensured: {directory}")
 
 def run_command(command):
-    """Runs a shell command, logs output and errors."""
+    """Runs a shell command, logs output and errors, and records its resource use in the run report."""
     try:
-        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        result = run_subprocess(command, check=True)
         logging.info(f"✅ Command succeeded: {' '.join(command)}")
         return result.stdout
     except subprocess.CalledProcessError as e:
@@ -62,83 +91,492 @@ def concatenate_sequences(combined_dir, seq_dir):
         if subunit_dir.is_dir():
             concat_file = seq_dir / f"combined_cds_interpro_{subunit_dir.name.lower()}.faa"
             with concat_file.open('wb') as outfile:
-                for fasta in subunit_dir.glob("*.faa"):
+                for fasta in sorted(subunit_dir.glob("*.faa")):
                     with fasta.open('rb') as infile:
                         shutil.copyfileobj(infile, outfile)
             logging.info(f"✅ Concatenated sequences for subunit: {subunit_dir.name}")
 
-def run_mmseqs_commands(fasta_file, basename, output_dir, threshold=0.85):
+def clustered_fasta_path(output_dir, basename, threshold):
+    """Returns the representative-sequence FASTA written by `run_mmseqs_commands`."""
+    return Path(output_dir) / f"{basename}_clustered_mmseq_{int(100 * threshold)}.fasta"
+
+def run_mmseqs_commands(fasta_file, basename, output_dir, threshold=0.85, threads=8):
     """Runs MMSeqs2 clustering commands on the provided fasta file."""
     output_dir = Path(output_dir)
-    temp_dir = output_dir / "temp"
-    temp_dir.mkdir(exist_ok=True)
-    db_name, cluster_db, subset_db = temp_dir / f"{basename}_db", f"{db_name}_clu", f"{cluster_db}_rep"
-    output_fasta = output_dir / f"{basename}_clustered_mmseq_{int(100 * threshold)}.fasta"
+    temp_dir = output_dir / "temp" / basename  # One temp dir per input, so clusterings can run concurrently
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    temp_dir.mkdir(parents=True)
+    db_name = temp_dir / f"{basename}_db"
+    cluster_db = f"{db_name}_clu"
+    subset_db = f"{cluster_db}_rep"
+    output_fasta = clustered_fasta_path(output_dir, basename, threshold)
 
     commands = [
         ["mmseqs", "createdb", str(fasta_file), str(db_name)],
-        ["mmseqs", "cluster", str(db_name), str(cluster_db), str(temp_dir), "--min-seq-id", str(threshold)],
+        ["mmseqs", "cluster", str(db_name), str(cluster_db), str(temp_dir), "--min-seq-id", str(threshold),
+         "--threads", str(threads)],
         ["mmseqs", "createsubdb", str(cluster_db), str(db_name), str(subset_db)],
         ["mmseqs", "convert2fasta", str(subset_db), str(output_fasta)]
     ]
 
     for cmd in commands:
-        run_command(cmd)
-
-def run_mafft(msa_input_dir, msa_output_dir):
-    """Performs multiple sequence alignment using MAFFT."""
-    msa_sequences = sorted(Path(msa_input_dir).glob("*.fasta"))
-    setup_directories([msa_output_dir])
-
-    for seq in tqdm(msa_sequences, desc="Running MAFFT"):
-        input_file, output_file = seq, Path(msa_output_dir) / seq.name.replace(".fasta", "_mafft_msa.fasta")
-        mafft_command = f"mafft --localpair --maxiterate 400 --quiet --thread 8 {input_file} > {output_file}"
-        result = run_command(mafft_command.split())
-        if result:
-            logging.info(f"✅ MAFFT alignment saved: {output_file}")
-
-def run_hmmbuild(msa_input_dir, profile_dir):
-    """Generates HMM profiles using HMMER's hmmbuild with optimized parameters."""
-    msa_files = sorted(Path(msa_input_dir).glob("*.fasta"))
-    setup_directories([profile_dir])
-
-    for msa_file in tqdm(msa_files, desc="Building HMM profiles"):
-        profile_name, profile_file_path = msa_file.stem, Path(profile_dir) / f"{msa_file.stem}.hmm"
-
-        hmmbuild_command = [
-            "hmmbuild",
-            "--amino",
-            "--cpu", "8",
-            "-n", profile_name,
-            "--wnone",
-            "--symfrac", "0.6",
-            "--fragthresh", "0.3",
-            "--plaplace",
-            str(profile_file_path),
-            str(msa_file)
-        ]
-
-        result = run_command(hmmbuild_command)
-        if result:
-            logging.info(f"✅ HMM profile generated: {profile_file_path}")
+        if run_command(cmd) is None:
+            return False
+    return True
+
+def msa_path(msa_output_dir, input_file):
+    """Returns the alignment path written by MAFFT for a clustered FASTA."""
+    return Path(msa_output_dir) / Path(input_file).name.replace(".fasta", "_mafft_msa.fasta")
+
+def read_fasta(fasta_file):
+    """Yields (header, sequence) pairs from a FASTA file, header without the leading '>'."""
+    header, chunks = None, []
+    with open(fasta_file, 'r') as handle:
+        for line in handle:
+            line = line.rstrip()
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(chunks)
+                header, chunks = line[1:], []
+            elif line:
+                chunks.append(line)
+    if header is not None:
+        yield header, "".join(chunks)
+
+def fasta_stats(fasta_file):
+    """Returns the number of sequences and the mean and maximum sequence length of a FASTA file."""
+    lengths = [len(sequence) for _, sequence in read_fasta(fasta_file)]
+    if not lengths:
+        return 0, 0, 0
+    return len(lengths), round(sum(lengths) / len(lengths)), max(lengths)
+
+def choose_alignment_strategy(sequence_count, max_length):
+    """
+    Picks the MAFFT strategy for an input of the given size.
+
+    L-INS-i is O(N²) in sequence count and grows quickly with length, so it is only used
+    for small sets; FFT-NS-2 handles a few tens of thousands of sequences, and PartTree
+    anything larger.
+
+    Args:
+        sequence_count (int): Number of sequences to align.
+        max_length (int): Length of the longest sequence.
+
+    Returns:
+        str: A key of `MAFFT_STRATEGIES`.
+    """
+    if sequence_count <= LINSI_MAX_SEQS and max_length <= LINSI_MAX_LENGTH:
+        return "linsi"
+    if sequence_count <= FFTNS_MAX_SEQS:
+        return "fftns2"
+    return "parttree"
+
+def record_build_event(event):
+    """Appends one alignment decision and its outcome to the JSONL build log."""
+    event["recorded_at"] = datetime.now().isoformat(timespec="seconds")
+    with BUILD_LOG_LOCK:
+        BUILD_LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(BUILD_LOG_FILE, 'a') as handle:
+            handle.write(json.dumps(event, default=str) + "\n")
+
+def run_mafft_command(options, input_file, output_file, threads):
+    """Runs MAFFT with the given options and writes its stdout alignment to `output_file`."""
+    result = run_command(["mafft", *options, "--quiet", "--thread", str(threads), str(input_file)])
+    if result:
+        Path(output_file).write_text(result)
+        return True
+    return False
+
+def align_seeded(input_file, output_file, threads=8):
+    """
+    Aligns cluster representatives first, then adds the remaining sequences with `--add`.
+
+    Representatives are picked by MMseqs2 at `SEED_IDENTITY`, aligned with the strategy
+    their own size allows, and every other sequence is then placed onto that seed alignment.
+    """
+    input_file, output_file = Path(input_file), Path(output_file)
+    # Seed clustering and alignment files are scratch; they are removed with the directory
+    with tempfile.TemporaryDirectory(prefix=f"{input_file.stem}_seeded_", dir=output_file.parent) as work_dir:
+        return _align_seeded_in(input_file, output_file, Path(work_dir), threads)
+
+def _align_seeded_in(input_file, output_file, work_dir, threads):
+    seed_basename = f"{input_file.stem}_seeds"
+    if not run_mmseqs_commands(input_file, seed_basename, work_dir, SEED_IDENTITY, threads):
+        return False
+
+    seeds_file = clustered_fasta_path(work_dir, seed_basename, SEED_IDENTITY)
+    seed_ids = {header.split()[0] for header, _ in read_fasta(seeds_file)}
+    members_file = work_dir / f"{input_file.stem}_members.fasta"
+    with open(members_file, 'w') as handle:
+        for header, sequence in read_fasta(input_file):
+            if header.split()[0] not in seed_ids:
+                handle.write(f">{header}\n{sequence}\n")
+
+    seed_count, _, seed_max_length = fasta_stats(seeds_file)
+    seed_strategy = choose_alignment_strategy(seed_count, seed_max_length)
+    seed_msa = work_dir / f"{input_file.stem}_seeds_msa.fasta"
+    if not run_mafft_command(MAFFT_STRATEGIES[seed_strategy], seeds_file, seed_msa, threads):
+        return False
+    logging.info(f"🌱 Aligned {seed_count} seed sequences with {seed_strategy} for {input_file.name}")
+
+    if members_file.stat().st_size == 0:
+        shutil.copy(seed_msa, output_file)
+        return True
+    return run_mafft_command(["--add", str(members_file), "--reorder"], seed_msa, output_file, threads)
+
+def align_sequences(input_file, output_file, threads=8, strategy="auto"):
+    """
+    Aligns one FASTA file with MAFFT, choosing the strategy from the input size.
+
+    Args:
+        input_file (Path): Sequences to align.
+        output_file (Path): Alignment to write.
+        threads (int): Threads passed to MAFFT.
+        strategy (str): "auto", "seeded" or a key of `MAFFT_STRATEGIES`.
+
+    Returns:
+        bool: True when the alignment was written.
+    """
+    sequence_count, mean_length, max_length = fasta_stats(input_file)
+    chosen = choose_alignment_strategy(sequence_count, max_length) if strategy == "auto" else strategy
+    logging.info(f"🧭 MAFFT strategy {chosen} for {Path(input_file).name} "
+                 f"({sequence_count} sequences, mean length {mean_length}, max length {max_length})")
+
+    start = time.perf_counter()
+    if chosen == "seeded":
+        succeeded = align_seeded(input_file, output_file, threads)
+    else:
+        succeeded = run_mafft_command(MAFFT_STRATEGIES[chosen], input_file, output_file, threads)
+    elapsed = time.perf_counter() - start
+
+    record_build_event({
+        "stage": "mafft", "input": input_file, "output": output_file, "requested_strategy": strategy,
+        "strategy": chosen, "sequences": sequence_count, "mean_length": mean_length, "max_length": max_length,
+        "threads": threads, "seconds": round(elapsed, 2), "succeeded": succeeded,
+    })
+    if succeeded:
+        logging.info(f"✅ MAFFT alignment saved: {output_file} ({elapsed:.1f}s)")
+    return succeeded
+
+def profile_path(profile_dir, msa_file):
+    """Returns the HMM profile path built from an alignment."""
+    return Path(profile_dir) / f"{Path(msa_file).stem}.hmm"
+
+def build_profile(msa_file, profile_file_path, threads=8):
+    """Builds one HMM profile with HMMER's hmmbuild using optimized parameters."""
+    hmmbuild_command = [
+        "hmmbuild",
+        "--amino",
+        "--cpu", str(threads),
+        "-n", Path(msa_file).stem,
+        "--wnone",
+        "--symfrac", "0.6",
+        "--fragthresh", "0.3",
+        "--plaplace",
+        str(profile_file_path),
+        str(msa_file)
+    ]
+
+    result = run_command(hmmbuild_command)
+    if result:
+        logging.info(f"✅ HMM profile generated: {profile_file_path}")
+    return result is not None
+
+class BuildState:
+    """Persistent record of the fingerprint that produced each stage output."""
+
+    def __init__(self, state_file):
+        self.state_file = Path(state_file)
+        self.fingerprints = json.loads(self.state_file.read_text()) if self.state_file.exists() else {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, stage_name, inputs, params):
+        """Hashes a stage's name, parameters and input file contents."""
+        digest = hashlib.sha256(json.dumps([stage_name, params], sort_keys=True, default=str).encode())
+        for input_file in inputs:
+            digest.update(file_digest(input_file).encode())
+        return digest.hexdigest()
+
+    def is_current(self, output_file, fingerprint):
+        with self._lock:
+            recorded = self.fingerprints.get(str(output_file))
+        return recorded == fingerprint and Path(output_file).exists()
+
+    def record(self, output_file, fingerprint):
+        with self._lock:
+            self.fingerprints[str(output_file)] = fingerprint
+            temp_file = self.state_file.with_suffix(".tmp")
+            temp_file.write_text(json.dumps(self.fingerprints, indent=2, sort_keys=True))
+            os.replace(temp_file, self.state_file)
+
+class ThreadBudget:
+    """Caps the total number of threads used by concurrently running tools."""
+
+    def __init__(self, total):
+        self.total = total
+        self.available = total
+        self._condition = threading.Condition()
+
+    def acquire(self, threads):
+        threads = min(threads, self.total)
+        with self._condition:
+            self._condition.wait_for(lambda: self.available >= threads)
+            self.available -= threads
+        return threads
+
+    def release(self, threads):
+        with self._condition:
+            self.available += threads
+            self._condition.notify_all()
+
+class Stage:
+    """One step of a subunit's profile build: inputs and parameters in, a single output file out."""
+
+    def __init__(self, name, inputs, output, params, action):
+        self.name = name
+        self.inputs = inputs
+        self.output = output
+        self.params = params
+        self.action = action  # Callable taking a thread count, returning True on success
+
+class ProfileBuildDAG:
+    """
+    Runs independent per-subunit stage chains concurrently within a thread budget.
+
+    Each chain is clustering → alignment → profile building. A stage is skipped when its
+    output exists and was produced from the same input contents and parameters; when a
+    stage reruns, every later stage in the chain sees new inputs and reruns too. Each tool
+    gets an equal share of the budget across the chains still running, so a single
+    remaining subunit can use every thread.
+    """
+
+    def __init__(self, state, total_threads):
+        self.state = state
+        self.budget = ThreadBudget(total_threads)
+        self.active_chains = 0
+        self._lock = threading.Lock()
+
+    def _run_stage(self, stage):
+        fingerprint = self.state.fingerprint(stage.name, stage.inputs, stage.params)
+        if self.state.is_current(stage.output, fingerprint):
+            logging.info(f"⏭️ Up to date: {stage.name} → {stage.output.name}")
+            return True
+
+        with self._lock:
+            share = max(1, self.budget.total // max(1, self.active_chains))
+        threads = self.budget.acquire(share)
+        try:
+            logging.info(f"▶️ Running {stage.name} with {threads} threads → {stage.output.name}")
+            succeeded = stage.action(threads)
+        finally:
+            self.budget.release(threads)
+
+        if succeeded and stage.output.exists():
+            self.state.record(stage.output, fingerprint)
+            return True
+        logging.error(f"❌ Stage failed: {stage.name} → {stage.output}")
+        return False
+
+    def _run_chain(self, chain):
+        try:
+            return all(self._run_stage(stage) for stage in chain)
+        finally:
+            with self._lock:
+                self.active_chains -= 1
+
+    def run(self, chains):
+        """Runs all chains concurrently; returns the number that completed successfully."""
+        with self._lock:
+            self.active_chains = len(chains)
+        succeeded = 0
+        with ThreadPoolExecutor(max_workers=max(1, len(chains))) as executor:
+            futures = [executor.submit(self._run_chain, chain) for chain in chains]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Building HMM profiles"):
+                succeeded += future.result()
+        return succeeded
+
+def subunit_chain(fasta_file, threshold=0.85, strategy="auto"):
+    """Defines the clustering → MAFFT → hmmbuild stages for one combined subunit FASTA."""
+    clustered = clustered_fasta_path(HMM_CLUST_SEQS_DIR, fasta_file.stem, threshold)
+    alignment = msa_path(HMM_MSA_SEQS_DIR, clustered)
+    profile = profile_path(HMM_PROFILES_DIR, alignment)
+    mafft_params = {
+        "strategy": strategy, "options": MAFFT_STRATEGIES, "seed_identity": SEED_IDENTITY,
+        "limits": [LINSI_MAX_SEQS, LINSI_MAX_LENGTH, FFTNS_MAX_SEQS],
+    }
+
+    return [
+        Stage("mmseqs_cluster", [fasta_file], clustered, {"min_seq_id": threshold},
+              lambda threads: run_mmseqs_commands(fasta_file, fasta_file.stem, HMM_CLUST_SEQS_DIR, threshold, threads)),
+        Stage("mafft", [clustered], alignment, mafft_params,
+              lambda threads: align_sequences(clustered, alignment, threads, strategy)),
+        Stage("hmmbuild", [alignment], profile,
+              {"name": alignment.stem, "flags": "--amino --wnone --symfrac 0.6 --fragthresh 0.3 --plaplace"},
+              lambda threads: build_profile(alignment, profile, threads)),
+    ]
+
+def split_sequences(fasta_file, train_file, test_fraction=0.2, seed=0):
+    """
+    Splits a FASTA file at random into a training file and held-out test sequences.
+
+    The split is reproducible for a given seed and file name. Both sides keep at least one
+    sequence when the file has two or more.
+
+    Returns:
+        list: The held-out (header, sequence) pairs; empty when the file has fewer than two sequences.
+    """
+    records = list(read_fasta(fasta_file))
+    if len(records) < 2:
+        return []
+    test_count = min(len(records) - 1, max(1, round(test_fraction * len(records))))
+    test_indices = set(random.Random(f"{seed}:{Path(fasta_file).name}").sample(range(len(records)), test_count))
+    with open(train_file, 'w') as handle:
+        for index, (header, sequence) in enumerate(records):
+            if index not in test_indices:
+                handle.write(f">{header}\n{sequence}\n")
+    return [records[index] for index in sorted(test_indices)]
+
+def benchmark_strategies(combined_files, strategies, benchmark_dir, threshold=0.85, threads=8, evalue=1e-10,
+                         test_fraction=0.2, seed=0):
+    """
+    Compares MAFFT strategies by the runtime and search sensitivity of the resulting profiles.
+
+    Each subunit's combined sequences are split into a training set and a held-out test set.
+    The training set is clustered, aligned with each strategy and built into a profile, which
+    is searched against the test sequences of all subunits, so sensitivity is measured on
+    sequences the profile was not built from. Test sequences of the profile's own subunit are
+    counted as true positives, those of other subunits as off-target hits. Tools run one at
+    a time with all threads so runtimes are comparable.
+
+    Args:
+        combined_files (list): Combined `combined_cds_interpro_<subunit>.faa` files.
+        strategies (list): Strategies to compare ("seeded" or keys of `MAFFT_STRATEGIES`).
+        benchmark_dir (Path): Directory for benchmark splits, alignments, profiles and results.
+        threshold (float): Clustering identity for the training sequences.
+        threads (int): Threads given to each tool.
+        evalue (float): Reporting E-value cutoff for the sensitivity search.
+        test_fraction (float): Share of each subunit's sequences held out for testing.
+        seed (int): Seed of the random train/test split.
+
+    Returns:
+        list: One result dict per (subunit, strategy).
+    """
+    benchmark_dir, split_dir = Path(benchmark_dir), Path(benchmark_dir) / "split"
+    setup_directories([benchmark_dir, split_dir])
+
+    target_file, subunit_sizes, train_files = benchmark_dir / "benchmark_targets.faa", {}, {}
+    with open(target_file, 'w') as handle:
+        for combined_file in combined_files:
+            subunit = combined_file.stem.split('_')[-1]
+            train_file = split_dir / f"{combined_file.stem}_train.fasta"
+            test_records = split_sequences(combined_file, train_file, test_fraction, seed)
+            if not test_records:
+                logging.warning(f"⚠️ Fewer than two sequences for {subunit}, skipping benchmark: {combined_file}")
+                continue
+            train_files[subunit] = train_file
+            subunit_sizes[subunit] = len(test_records)
+            for number, (header, sequence) in enumerate(test_records, 1):
+                handle.write(f">{subunit}__{number}_{header.split()[0]}\n{sequence}\n")
+
+    results = []
+    for subunit, train_file in train_files.items():
+        clustered = clustered_fasta_path(split_dir, train_file.stem, threshold)
+        succeeded = run_mmseqs_commands(train_file, train_file.stem, split_dir, threshold, threads)
+        shutil.rmtree(split_dir / "temp", ignore_errors=True)
+        if not succeeded:
+            logging.error(f"❌ Clustering the training sequences failed for {subunit}, skipping benchmark")
+            continue
+
+        for strategy in tqdm(strategies, desc=f"Benchmarking {subunit}"):
+            strategy_dir = benchmark_dir / strategy
+            alignment, tblout = msa_path(strategy_dir, clustered), strategy_dir / f"{subunit}_hits.tbl"
+            profile = profile_path(strategy_dir, alignment)
+            strategy_dir.mkdir(exist_ok=True)
+            result = {"subunit": subunit, "strategy": strategy, "training_sequences": fasta_stats(train_file)[0],
+                      "positives": subunit_sizes[subunit]}
+
+            timings = []
+            for step in (lambda: align_sequences(clustered, alignment, threads, strategy),
+                         lambda: build_profile(alignment, profile, threads),
+                         lambda: run_command(["hmmsearch", "--cpu", str(threads), "-E", str(evalue), "-o", os.devnull,
+                                              "--tblout", str(tblout), str(profile), str(target_file)]) is not None):
+                start = time.perf_counter()
+                if not step():
+                    break
+                timings.append(round(time.perf_counter() - start, 2))
+            if len(timings) < 3:
+                logging.error(f"❌ Benchmark failed for {subunit} with {strategy}")
+                continue
+
+            hit_subunits = [line.split(None, 1)[0].split("__", 1)[0]
+                            for line in tblout.read_text().splitlines() if line and not line.startswith("#")]
+            true_positives = sum(hit == subunit for hit in hit_subunits)
+            result.update({
+                "align_seconds": timings[0], "hmmbuild_seconds": timings[1], "search_seconds": timings[2],
+                "true_positives": true_positives, "off_target_hits": len(hit_subunits) - true_positives,
+                "sensitivity": round(true_positives / max(1, subunit_sizes[subunit]), 4),
+            })
+            logging.info(f"📊 {subunit} {strategy}: sensitivity {result['sensitivity']}, "
+                         f"alignment {timings[0]}s, {result['off_target_hits']} off-target hits")
+            results.append(result)
+
+    report_file = benchmark_dir / "mafft_strategy_benchmark.csv"
+    fieldnames = ["subunit", "strategy", "training_sequences", "positives", "true_positives", "off_target_hits", "sensitivity",
+                  "align_seconds", "hmmbuild_seconds", "search_seconds"]
+    with open(report_file, 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+    logging.info(f"✅ Benchmark report saved: {report_file}")
+    return results
 
 # **Workflow Execution**
 if __name__ == "__main__":
+    strategy_choices = ["auto", "seeded", *MAFFT_STRATEGIES]
+    parser = argparse.ArgumentParser(description="Build Complex I subunit HMM profiles.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(),
+                        help="Total thread budget shared by concurrently running tools")
+    parser.add_argument("--threshold", type=float, default=0.85, help="MMseqs2 --min-seq-id for clustering")
+    parser.add_argument("--force", action="store_true", help="Rebuild every stage, ignoring recorded fingerprints")
+    parser.add_argument("--mafft-strategy", choices=strategy_choices, default="auto",
+                        help="MAFFT strategy; 'auto' picks one per input from sequence count and length")
+    parser.add_argument("--benchmark", nargs="*", choices=strategy_choices[1:], metavar="STRATEGY",
+                        help="After building, compare profiles from these MAFFT strategies (default: all)")
+    parser.add_argument("--benchmark-evalue", type=float, default=1e-10,
+                        help="E-value cutoff for the benchmark sensitivity search")
+    parser.add_argument("--benchmark-test-fraction", type=float, default=0.2,
+                        help="Share of each subunit's sequences held out from profile building and searched in the benchmark")
+    parser.add_argument("--benchmark-seed", type=int, default=0, help="Seed of the benchmark train/test split")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+    report = start_run("08_hmm_pipeline", args.report_dir, args.profile)
+
     logging.info("🚀 HMM Pipeline Execution Started")
 
     setup_directories([HMM_COMBINED_SEQS_DIR, HMM_MSA_SEQS_DIR, HMM_CLUST_SEQS_DIR, HMM_PROFILES_DIR])
 
-    interpro_sequences, cds_sequences = gather_sequences(HMM_INTERPRO_SEQS_DIR), gather_sequences(HMM_CDS_SEQS_DIR)
-    combining_sequences(interpro_sequences, HMM_COMBINED_SEQS_DIR, HMM_INTERPRO_SEQS_DIR)
-    combining_sequences(cds_sequences, HMM_COMBINED_SEQS_DIR, HMM_CDS_SEQS_DIR)
-
-    concatenate_sequences(HMM_COMBINED_SEQS_DIR, HMM_CLUST_SEQS_DIR)
+    with report.stage("combine sequences") as stage:
+        interpro_sequences, cds_sequences = gather_sequences(HMM_INTERPRO_SEQS_DIR), gather_sequences(HMM_CDS_SEQS_DIR)
+        combining_sequences(interpro_sequences, HMM_COMBINED_SEQS_DIR, HMM_INTERPRO_SEQS_DIR)
+        combining_sequences(cds_sequences, HMM_COMBINED_SEQS_DIR, HMM_CDS_SEQS_DIR)
+        concatenate_sequences(HMM_COMBINED_SEQS_DIR, HMM_CLUST_SEQS_DIR)
+        stage['files'] = len(interpro_sequences) + len(cds_sequences)
 
-    for fasta_file in tqdm(sorted(Path(HMM_CLUST_SEQS_DIR).glob("*.faa")), desc="Running MMSeqs2 clustering"):
-        run_mmseqs_commands(fasta_file, fasta_file.stem, HMM_CLUST_SEQS_DIR, threshold=0.85)
+    if args.force:
+        BUILD_STATE_FILE.unlink(missing_ok=True)
+    dag = ProfileBuildDAG(BuildState(BUILD_STATE_FILE), args.threads)
+    combined_files = sorted(Path(HMM_CLUST_SEQS_DIR).glob("*.faa"))
+    with report.stage("build profiles", inputs=combined_files) as stage:
+        chains = [subunit_chain(fasta_file, args.threshold, args.mafft_strategy) for fasta_file in combined_files]
+        succeeded = dag.run(chains)
+        stage['profiles'] = succeeded
+    logging.info(f"📊 {succeeded}/{len(chains)} subunit profiles up to date")
 
-    run_mafft(HMM_CLUST_SEQS_DIR, HMM_MSA_SEQS_DIR)
-    run_hmmbuild(HMM_MSA_SEQS_DIR, HMM_PROFILES_DIR)
+    if args.benchmark is not None:
+        with report.stage("benchmark strategies", inputs=combined_files):
+            benchmark_strategies(combined_files, args.benchmark or strategy_choices[1:], HMM_ANALYSIS_DIR / "mafft_benchmark",
+                                 args.threshold, args.threads, args.benchmark_evalue, args.benchmark_test_fraction,
+                                 args.benchmark_seed)
 
     logging.info("✅ HMM Pipeline Execution Complete")
     print("✅ HMM pipeline execution complete! Logs saved to hmm_pipeline.log")
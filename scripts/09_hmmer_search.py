@@ -5,9 +5,21 @@ import subprocess
 import platform
 import logging
 import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 from tqdm import tqdm
-from config import HMM_PROFILES_DIR, HMM_PROTEOMES_DIR, HMM_RESULTS_DIR
+from config import (HMM_PROFILES_DIR, HMM_PROTEOMES_DIR, HMM_PROTEOME_SHARDS_DIR, HMM_RESULTS_DIR, HMM_HIT_TABLES_DIR,
+                    HMM_PREFILTERED_RESULTS_DIR, HMM_CLUST_SEQS_DIR, ASSEMBLY_DELTA_FILE, RUN_REPORTS_DIR)
+from dataset_delta import AssemblyDelta
+from file_utils import atomic_output, commit_output
+from instrumentation import add_report_arguments, run_subprocess, start_run
+from kmer_prefilter import (DEFAULT_KMER_SIZE, DEFAULT_MIN_SHARED, KmerIndex, profile_subunit, reference_files, select_candidates,
+                            write_candidates)
+from proteome_shards import DEFAULT_SHARD_SIZE_MB, append_tagged_proteome, ensure_shards, shard_members, untag_sequence_id
+from pyhmmer_search import (PYHMMER_AVAILABLE, HIT_TABLE_SUFFIX, hit_table_file, press_profiles, worker_profiles, write_hit_table,
+                            write_shard_hit_tables)
+from search_manifest import SearchManifest
 
 # Setup logging
 LOG_FILE = Path(__file__).parent / "hmmer_search.log"
@@ -21,10 +33,15 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 logging.getLogger().addHandler(console_handler)
 
-# Parse command-line arguments
-parser = argparse.ArgumentParser(description="Run HMMER searches with power-aware execution.")
-parser.add_argument("--force-run", action="store_true", help="Bypass laptop shutdown on battery")
-args = parser.parse_args()
+# Batched search settings
+REPORT_EVALUE = 10.0  # hmmsearch default reporting threshold (-E)
+
+# Record of completed searches, used to skip finished pairs on reruns
+MANIFEST_FILE = HMM_RESULTS_DIR / "search_manifest.jsonl"
+# Prefiltered searches may miss hits, so their results and manifest live in their own tree and
+# never count as, or overwrite, full searches
+PREFILTER_MANIFEST_FILE = HMM_PREFILTERED_RESULTS_DIR / "search_manifest.jsonl"
+PREFILTERED_HIT_TABLES_DIR = HMM_PREFILTERED_RESULTS_DIR / HMM_HIT_TABLES_DIR.name
 
 def detect_system_type():
     """Determines if the system is a laptop or a desktop."""
@@ -51,77 +68,652 @@ def shutdown_linux():
     os.system("shutdown -h now")
 
 def run_command(command):
-    """Runs a shell command, logs output and errors."""
+    """Runs a shell command, logs output and errors, and records its resource use in the run report."""
     try:
-        result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        result = run_subprocess(command, check=True)
         logging.info(f"✅ Command succeeded: {' '.join(command)}")
         return result.stdout
     except subprocess.CalledProcessError as e:
         logging.error(f"❌ Command failed: {' '.join(command)}\n{e.stderr}")
         return None
 
-# Detect system type
-system_type = detect_system_type()
-num_cpus = psutil.cpu_count(logical=True)
+def profile_results_dir(profile_stem, results_root=HMM_RESULTS_DIR):
+    """Returns (and creates) the results directory for a single HMM profile."""
+    results_dir = results_root / HMM_PROFILES_DIR.name / profile_stem
+    results_dir.mkdir(parents=True, exist_ok=True)
+    return results_dir
+
+def result_file(profile_file, proteome_file, results_root=HMM_RESULTS_DIR):
+    """Returns the tblout path for a (profile, proteome) pair."""
+    return profile_results_dir(profile_file.stem, results_root) / f"{proteome_file.stem}_results.txt"
+
+def current_cpu_temperature():
+    """Returns the hottest CPU sensor reading in °C, or None where sensors are unavailable."""
+    try:
+        sensors = psutil.sensors_temperatures()
+    except AttributeError:
+        return None  # Not supported on macOS/Windows
+    readings = [entry.current for entries in sensors.values() for entry in entries if entry.current]
+    return max(readings) if readings else None
+
+def wait_for_headroom(max_load=None, max_temp=None, poll_interval=30):
+    """
+    Blocks while the system is above the given load or temperature limits.
+
+    Args:
+        max_load (float): Maximum 1-minute load average per logical CPU, or None to ignore load.
+        max_temp (float): Maximum CPU temperature in °C, or None to ignore temperature.
+        poll_interval (int): Seconds to wait between checks.
+    """
+    num_cpus = psutil.cpu_count(logical=True)
+    while True:
+        load = psutil.getloadavg()[0] / num_cpus
+        temperature = current_cpu_temperature() if max_temp is not None else None
+
+        load_ok = max_load is None or load <= max_load
+        temperature_ok = temperature is None or temperature <= max_temp
+        if load_ok and temperature_ok:
+            return
+
+        logging.info(f"🌡️ Throttling: load {load:.2f}/CPU, temperature {temperature}°C. Waiting {poll_interval}s...")
+        time.sleep(poll_interval)
+
+def task_succeeded(future, function, task_args):
+    """Returns whether a finished search task succeeded, logging the task if it raised."""
+    try:
+        return bool(future.result())
+    except Exception as e:
+        task = ", ".join(arg.name if isinstance(arg, Path) else arg for arg in task_args if isinstance(arg, (str, Path)))
+        logging.error(f"❌ {function.__name__}({task}) raised {type(e).__name__}: {e}")
+        return False
+
+def run_scheduled(tasks, workers, desc, max_load=None, max_temp=None):
+    """
+    Runs search tasks concurrently and reports throughput and CPU utilisation.
 
-# Adjust CPU allocation
-if system_type == "laptop":
-    cpu_allocation = min(4, num_cpus)  # Use at most 4 CPUs on laptops
-else:
-    cpu_allocation = num_cpus  # Use all CPUs on desktops
+    Each task is a `(function, args)` tuple whose function runs one search and returns
+    True on success. A task that raises is logged and counted as failed, so the remaining
+    tasks still run. Workers are threads, since the actual work happens in the hmmsearch
+    subprocesses they launch or in pyhmmer, which releases the GIL while searching.
 
-logging.info(f"🖥️  Detected system: {system_type.upper()}")
-logging.info(f"🔢 Allocating {cpu_allocation} CPUs for HMMER")
+    Args:
+        tasks (list): `(function, args)` tuples to run.
+        workers (int): Number of concurrent hmmsearch jobs.
+        desc (str): Progress bar and report label.
+        max_load (float): Optional load-average throttle, see `wait_for_headroom`.
+        max_temp (float): Optional temperature throttle, see `wait_for_headroom`.
 
-# **Laptop Power Management: Shutdown unless `--force-run` is used**
-if system_type == "laptop" and not is_plugged_in():
-    if args.force_run:
-        logging.warning("⚠️ System is on battery, but `--force-run` is enabled. Continuing execution.")
+    Returns:
+        int: Number of tasks that completed successfully.
+    """
+    num_cpus = psutil.cpu_count(logical=True)
+    start_wall, start_times = time.monotonic(), os.times()
+    psutil.cpu_percent(interval=None)  # Reset the system-wide CPU counter
+
+    succeeded, pending, submitted = 0, set(), {}
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(total=len(tasks), desc=desc) as progress:
+        for function, task_args in tasks:
+            if len(pending) >= workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                succeeded += sum(task_succeeded(future, *submitted.pop(future)) for future in done)
+                progress.update(len(done))
+            wait_for_headroom(max_load, max_temp)
+            future = executor.submit(function, *task_args)
+            submitted[future] = (function, task_args)
+            pending.add(future)
+
+        done, _ = wait(pending)
+        succeeded += sum(task_succeeded(future, *submitted.pop(future)) for future in done)
+        progress.update(len(done))
+
+    elapsed = max(time.monotonic() - start_wall, 1e-9)
+    end_times = os.times()
+    # Subprocess searches run in reaped children, in-process ones in this process
+    search_cpu = sum(end - start for end, start in zip(end_times[:4], start_times[:4]))
+    logging.info(
+        f"📊 {desc}: {succeeded}/{len(tasks)} jobs succeeded in {elapsed:.1f}s "
+        f"({len(tasks) / elapsed:.2f} jobs/s), search CPU utilisation {100 * search_cpu / (elapsed * num_cpus):.1f}% "
+        f"of {num_cpus} CPUs, system CPU {psutil.cpu_percent(interval=None):.1f}%"
+    )
+    return succeeded
+
+def search_pair(profile_file, proteome_file, threads, manifest):
+    """Runs hmmsearch for a single (profile, proteome) pair and records it in the manifest."""
+    result_file_path = result_file(profile_file, proteome_file)
+
+    hmmer_command = [
+        "hmmsearch",
+        "--cpu", str(threads),
+        "--noali",
+        "--tblout", str(atomic_output(result_file_path)),
+        str(profile_file),
+        str(proteome_file)
+    ]
+
+    result = run_command(hmmer_command)
+    if result is not None:
+        commit_output(result_file_path)
+        logging.info(f"✅ HMMER search completed: {profile_file.name} → {proteome_file.name}")
     else:
-        logging.critical("⚠️ System is running on battery. Shutting down to prevent power loss.")
-        if platform.system() == "Darwin":
-            shutdown_mac()
-        elif platform.system() == "Linux":
-            shutdown_linux()
-        exit(1)  # Stop further execution
-
-# Ensure required directories exist
-HMM_PROFILES_DIR.mkdir(parents=True, exist_ok=True)
-HMM_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-
-# List all proteome files
-proteome_files = sorted(HMM_PROTEOMES_DIR.glob("*.faa"))
-logging.info(f"📂 Found {len(proteome_files)} proteome files to process.")
-
-# Run HMMER search for each profile
-if HMM_PROFILES_DIR.is_dir():
-    for profile_file in HMM_PROFILES_DIR.glob("*.hmm"):
-        profile_results_dir = HMM_RESULTS_DIR / HMM_PROFILES_DIR.name / profile_file.stem
-        profile_results_dir.mkdir(parents=True, exist_ok=True)
-
-        logging.info(f"🔍 Processing HMM profile: {profile_file.name}")
-
-        # Run HMMER for each proteome file
-        for proteome_file in tqdm(proteome_files, desc=f"{profile_file.name} Search"):
-            result_filename = f"{proteome_file.stem}_results.txt"
-            result_file_path = profile_results_dir / result_filename
-
-            hmmer_command = [
-                "hmmsearch",
-                "--cpu", str(cpu_allocation),
-                "--noali",
-                "--tblout", str(result_file_path),
-                str(profile_file),
-                str(proteome_file)
+        atomic_output(result_file_path).unlink(missing_ok=True)
+
+    manifest.record(profile_file, proteome_file, result_file_path, 0 if result is not None else 1)
+    return result is not None
+
+def pending_proteomes(profile_files, proteome_files, manifest, output_file):
+    """
+    Returns the proteomes with at least one (profile, proteome) pair not yet done in the manifest.
+
+    Args:
+        profile_files (list): HMM profiles to search.
+        proteome_files (list): Candidate proteome files.
+        manifest (SearchManifest): Record of completed searches.
+        output_file (callable): Maps `(profile_file, proteome_file)` to the pair's output path.
+    """
+    pending = [
+        proteome_file for proteome_file in tqdm(proteome_files, desc="Checking manifest")
+        if not all(manifest.is_done(profile_file, proteome_file, output_file(profile_file, proteome_file))
+                   for profile_file in profile_files)
+    ]
+    logging.info(f"⏭️ Skipping {len(proteome_files) - len(pending)} of {len(proteome_files)} proteomes already searched.")
+    return pending
+
+def search_per_pair(profile_files, proteome_files, threads, workers, manifest, max_load=None, max_temp=None):
+    """Runs one hmmsearch per pending (profile, proteome) pair across a pool of workers."""
+    pairs = [(profile_file, proteome_file) for profile_file in profile_files for proteome_file in proteome_files]
+    tasks = [
+        (search_pair, (profile_file, proteome_file, threads, manifest))
+        for profile_file, proteome_file in tqdm(pairs, desc="Checking manifest")
+        if not manifest.is_done(profile_file, proteome_file, result_file(profile_file, proteome_file))
+    ]
+    logging.info(f"⏭️ Skipping {len(pairs) - len(tasks)} of {len(pairs)} searches already recorded in the manifest.")
+    run_scheduled(tasks, workers, "HMMER Search", max_load, max_temp)
+
+def build_profile_database(profile_files, database_file):
+    """
+    Concatenates HMM profiles into a single multi-profile database.
+
+    Args:
+        profile_files (list): Paths to the individual `.hmm` profiles.
+        database_file (Path): Destination of the concatenated database.
+
+    Returns:
+        dict: Maps each profile NAME (the tblout query name) to its profile file stem.
+    """
+    name_to_stem = {}
+    with open(database_file, 'w') as outfile:
+        for profile_file in profile_files:
+            with open(profile_file, 'r') as infile:
+                for line in infile:
+                    if line.startswith("NAME "):
+                        name_to_stem[line.split()[1]] = profile_file.stem
+                    outfile.write(line)
+    logging.info(f"✅ Built profile database with {len(name_to_stem)} profiles: {database_file}")
+    return name_to_stem
+
+def write_sequence_chunk(proteome_files, chunk_file):
+    """
+    Concatenates proteomes into one FASTA file, tagging each sequence ID with its proteome index.
+
+    Args:
+        proteome_files (list): Proteome FASTA files in this chunk.
+        chunk_file (Path): Destination of the concatenated sequence database.
+
+    Returns:
+        list: Number of sequences in each proteome, in the same order as `proteome_files`.
+    """
+    with open(chunk_file, 'w') as outfile:
+        return [append_tagged_proteome(outfile, index, proteome_file) for index, proteome_file in enumerate(proteome_files)]
+
+def split_batched_tblout(tblout_file, proteome_files, sequence_counts, search_z, name_to_stem, results_root=HMM_RESULTS_DIR):
+    """
+    Splits a batched tblout into one tblout per (profile, proteome) pair.
+
+    The batched search runs with `-Z search_z`, so E-values are rescaled to the size of
+    each proteome to match what a per-pair search reports, and the default `-E 10`
+    reporting threshold is re-applied afterwards.
+
+    Args:
+        tblout_file (Path): tblout written by the batched hmmsearch.
+        proteome_files (list): Proteome FASTA files in this chunk.
+        sequence_counts (list): Number of sequences in each proteome.
+        search_z (int): Value passed to hmmsearch `-Z`.
+        name_to_stem (dict): Maps profile names to profile file stems.
+        results_root (Path): Results tree the per-pair tblouts are written to.
+    """
+    header, footer, rows = [], [], {}
+
+    with open(tblout_file, 'r') as handle:
+        for line in handle:
+            if line.startswith('#'):
+                (footer if rows or footer else header).append(line)
+                continue
+            if not line.strip():
+                continue
+
+            cols = line.split()
+            index, target_name = untag_sequence_id(cols[0])
+
+            scale = sequence_counts[index] / search_z
+            evalue = float(cols[4]) * scale
+            if evalue > REPORT_EVALUE:
+                continue
+
+            cols[0] = target_name
+            cols[4] = f"{evalue:.2g}"
+            cols[7] = f"{float(cols[7]) * scale:.2g}"
+            rows.setdefault((cols[2], index), []).append(" ".join(cols) + "\n")
+
+    for profile_name, profile_stem in name_to_stem.items():
+        results_dir = profile_results_dir(profile_stem, results_root)
+        for index, proteome_file in enumerate(proteome_files):
+            result_file_path = results_dir / f"{proteome_file.stem}_results.txt"
+            with open(atomic_output(result_file_path), 'w') as outfile:
+                outfile.writelines(header)
+                outfile.writelines(rows.get((profile_name, index), []))
+                outfile.writelines(footer)
+            commit_output(result_file_path)
+
+def search_concatenated(label, sequence_file, proteome_files, sequence_counts, profile_files, database_file,
+                        tblout_file, name_to_stem, threads, manifest, results_root=HMM_RESULTS_DIR):
+    """
+    Searches every profile against concatenated, ID-tagged proteomes and records each pair.
+
+    Args:
+        label (str): Name of the chunk or shard in log messages.
+        sequence_file (Path): FASTA of the tagged proteomes, see `proteome_shards.append_tagged_proteome`.
+        proteome_files (list): Proteome FASTA files in `sequence_file`, in tag order.
+        sequence_counts (list): Number of sequences in each proteome.
+        profile_files (list): HMM profiles in `database_file`.
+        database_file (Path): Concatenated profile database, see `build_profile_database`.
+        tblout_file (Path): Scratch path for the batched tblout, removed afterwards.
+        name_to_stem (dict): Maps profile names to profile file stems.
+        threads (int): hmmsearch --cpu value.
+        manifest (SearchManifest): Record of completed searches.
+        results_root (Path): Results tree the per-pair tblouts are written to.
+
+    Returns:
+        bool: True if the search succeeded (or there was nothing to search).
+    """
+    non_empty_counts = [count for count in sequence_counts if count]
+    if not non_empty_counts:
+        logging.warning(f"⚠️ {label.capitalize()} contains no sequences, skipping.")
+        return True
+    search_z = min(non_empty_counts)  # Smallest Z keeps every per-proteome hit under -E
+
+    hmmer_command = [
+        "hmmsearch",
+        "--cpu", str(threads),
+        "--noali",
+        "-o", os.devnull,
+        "-Z", str(search_z),
+        "--tblout", str(tblout_file),
+        str(database_file),
+        str(sequence_file)
+    ]
+
+    result = run_command(hmmer_command)
+    if result is not None:
+        split_batched_tblout(tblout_file, proteome_files, sequence_counts, search_z, name_to_stem, results_root)
+        logging.info(f"✅ HMMER batch completed: {label} ({len(proteome_files)} proteomes)")
+
+    for profile_file in profile_files:
+        for proteome_file in proteome_files:
+            manifest.record(profile_file, proteome_file, result_file(profile_file, proteome_file, results_root),
+                            0 if result is not None else 1)
+
+    tblout_file.unlink(missing_ok=True)
+    return result is not None
+
+def search_chunk(chunk_number, chunk, profile_files, database_file, temp_dir, name_to_stem, threads, manifest):
+    """Searches every profile against one chunk of concatenated proteomes and records each pair."""
+    chunk_file = temp_dir / f"chunk_{chunk_number}.faa"
+    tblout_file = temp_dir / f"chunk_{chunk_number}.tbl"  # Not *.txt, so result processing never picks it up
+
+    sequence_counts = write_sequence_chunk(chunk, chunk_file)
+    try:
+        return search_concatenated(f"chunk {chunk_number}", chunk_file, chunk, sequence_counts, profile_files,
+                                   database_file, tblout_file, name_to_stem, threads, manifest)
+    finally:
+        chunk_file.unlink(missing_ok=True)
+
+def search_batched(profile_files, proteome_files, threads, workers, chunk_size, manifest, max_load=None, max_temp=None):
+    """
+    Searches all profiles against chunks of concatenated proteomes.
+
+    One hmmsearch process handles every profile against `chunk_size` proteomes, so
+    process startup and profile parsing are paid once per chunk instead of once per pair.
+    Only proteomes with at least one pending pair in the manifest are searched.
+    """
+    pending = pending_proteomes(profile_files, proteome_files, manifest, result_file)
+
+    with tempfile.TemporaryDirectory(dir=HMM_RESULTS_DIR) as temp_dir:
+        temp_dir = Path(temp_dir)
+        database_file = temp_dir / "profiles_db.hmm"
+        name_to_stem = build_profile_database(profile_files, database_file)
+
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        tasks = [
+            (search_chunk, (chunk_number, chunk, profile_files, database_file, temp_dir, name_to_stem, threads, manifest))
+            for chunk_number, chunk in enumerate(chunks)
+        ]
+        run_scheduled(tasks, workers, "Batched HMMER Search", max_load, max_temp)
+
+def pair_hit_table_file(profile_file, proteome_file):
+    """Returns the hit table holding a (profile, proteome) pair; every profile of a proteome shares it."""
+    return hit_table_file(HMM_HIT_TABLES_DIR, proteome_file)
+
+def search_proteome_pyhmmer(proteome_file, profile_files, database_file, threads, manifest):
+    """Searches every profile against one proteome in-process, writing its hit table, and records each pair."""
+    output_file = hit_table_file(HMM_HIT_TABLES_DIR, proteome_file)
+    try:
+        hits = write_hit_table(worker_profiles(database_file), proteome_file, output_file, threads)
+        logging.info(f"✅ pyhmmer search completed: {proteome_file.name} ({hits} hits)")
+        exit_status = 0
+    except (OSError, ValueError) as e:
+        logging.error(f"❌ pyhmmer search failed for {proteome_file.name}: {e}")
+        atomic_output(output_file).unlink(missing_ok=True)
+        exit_status = 1
+
+    for profile_file in profile_files:
+        manifest.record(profile_file, proteome_file, output_file, exit_status)
+    return exit_status == 0
+
+def search_pyhmmer(profile_files, proteome_files, threads, workers, manifest, max_load=None, max_temp=None):
+    """
+    Searches all profiles against each proteome in-process with pyhmmer.
+
+    The profiles are pressed into one database that every worker thread loads once.
+    Each proteome is read as a digital sequence block and its hits are written straight
+    to a Parquet hit table (`<proteome>_hits.parquet` in HMM_HIT_TABLES_DIR), so no tblout
+    text is written or parsed. Ingest them with `10_process_hmmer_results.py --source hit-tables`.
+    Only proteomes with at least one pending pair in the manifest are searched.
+    """
+    HMM_HIT_TABLES_DIR.mkdir(parents=True, exist_ok=True)
+    pending = pending_proteomes(profile_files, proteome_files, manifest, pair_hit_table_file)
+
+    with tempfile.TemporaryDirectory(dir=HMM_RESULTS_DIR) as temp_dir:
+        database_file = Path(temp_dir) / "profiles_db.hmm"
+        logging.info(f"✅ Pressed {press_profiles(profile_files, database_file)} profiles into {database_file}")
+        tasks = [
+            (search_proteome_pyhmmer, (proteome_file, profile_files, database_file, threads, manifest))
+            for proteome_file in pending
+        ]
+        run_scheduled(tasks, workers, "pyhmmer Search", max_load, max_temp)
+
+def search_shard_pyhmmer(shard_file, proteome_files, sequence_counts, wanted, profile_files, database_file, threads, manifest):
+    """Searches every profile against the wanted proteomes of one shard in-process and records each pair."""
+    output_files = [
+        hit_table_file(HMM_HIT_TABLES_DIR, proteome_file) if proteome_file.name in wanted else None
+        for proteome_file in proteome_files
+    ]
+    try:
+        hits = write_shard_hit_tables(worker_profiles(database_file), shard_file, sequence_counts, output_files, threads)
+        logging.info(f"✅ pyhmmer search completed: {shard_file.name} ({hits} hits)")
+        exit_status = 0
+    except (OSError, ValueError) as e:
+        logging.error(f"❌ pyhmmer search failed for {shard_file.name}: {e}")
+        for output_file in filter(None, output_files):
+            atomic_output(output_file).unlink(missing_ok=True)
+        exit_status = 1
+
+    for proteome_file, output_file in zip(proteome_files, output_files):
+        if output_file is not None:
+            for profile_file in profile_files:
+                manifest.record(profile_file, proteome_file, output_file, exit_status)
+    return exit_status == 0
+
+def search_sharded(profile_files, proteome_files, threads, workers, manifest, backend, shard_size_mb=DEFAULT_SHARD_SIZE_MB,
+                   num_shards=None, max_load=None, max_temp=None):
+    """
+    Searches all profiles against size-balanced proteome shards (see `proteome_shards.py`).
+
+    Every proteome is packed into shards of similar size (at least one per worker) that
+    are reused across runs, with only the shards of added, removed or changed proteomes
+    rewritten, so each task is one shard of comparable cost. Only shards holding a pending proteome are searched. The subprocess
+    backend runs one hmmsearch per shard and splits its tblout per pair as in batched mode;
+    the pyhmmer backend reads each shard once and writes a hit table per pending proteome.
+    Outputs and manifest entries stay per proteome, so result processing and resumption
+    work as in the other modes.
+    """
+    shard_index = ensure_shards(sorted(HMM_PROTEOMES_DIR.glob("*.faa")), HMM_PROTEOME_SHARDS_DIR, shard_size_mb,
+                                num_shards, min_shards=workers)
+    pending = {proteome_file.name for proteome_file in pending_proteomes(
+        profile_files, proteome_files, manifest, pair_hit_table_file if backend == "pyhmmer" else result_file)}
+    shards = [
+        (HMM_PROTEOME_SHARDS_DIR / shard, [HMM_PROTEOMES_DIR / name for name in members], counts)
+        for shard, members, counts in shard_members(shard_index) if pending.intersection(members)
+    ]
+    logging.info(f"📦 Searching {len(shards)} of {shard_index['Shard'].nunique()} shards holding pending proteomes.")
+
+    with tempfile.TemporaryDirectory(dir=HMM_RESULTS_DIR) as temp_dir:
+        temp_dir = Path(temp_dir)
+        database_file = temp_dir / "profiles_db.hmm"
+        if backend == "pyhmmer":
+            HMM_HIT_TABLES_DIR.mkdir(parents=True, exist_ok=True)
+            logging.info(f"✅ Pressed {press_profiles(profile_files, database_file)} profiles into {database_file}")
+            tasks = [
+                (search_shard_pyhmmer, (shard_file, members, counts, pending, profile_files, database_file, threads, manifest))
+                for shard_file, members, counts in shards
+            ]
+        else:
+            name_to_stem = build_profile_database(profile_files, database_file)
+            tasks = [
+                (search_concatenated, (f"shard {shard_file.stem}", shard_file, members, counts, profile_files, database_file,
+                                       temp_dir / f"{shard_file.stem}.tbl", name_to_stem, threads, manifest))
+                for shard_file, members, counts in shards
+            ]
+        run_scheduled(tasks, workers, f"Sharded {'pyhmmer' if backend == 'pyhmmer' else 'HMMER'} Search", max_load, max_temp)
+
+def prefiltered_result_file(profile_file, proteome_file):
+    """Returns the tblout path of a prefiltered (profile, proteome) search."""
+    return result_file(profile_file, proteome_file, HMM_PREFILTERED_RESULTS_DIR)
+
+def prefiltered_hit_table_file(profile_file, proteome_file):
+    """Returns the hit table of a prefiltered proteome search; every profile of a proteome shares it."""
+    return hit_table_file(PREFILTERED_HIT_TABLES_DIR, proteome_file)
+
+def search_candidates(proteome_file, profile_files, database_file, temp_dir, name_to_stem, index, min_shared, threads, manifest):
+    """Searches every profile against the prefilter candidates of one proteome and records each pair."""
+    subunits = [profile_subunit(profile_file) for profile_file in profile_files]
+    sequence_count, candidate_ids = select_candidates(index, proteome_file, subunits, min_shared)
+    logging.info(f"🔎 Prefilter kept {len(candidate_ids)} of {sequence_count} proteins of {proteome_file.name}")
+
+    candidate_file = temp_dir / f"{proteome_file.stem}_candidates.faa"
+    tblout_file = temp_dir / f"{proteome_file.stem}_candidates.tbl"
+    if not candidate_ids:
+        tblout_file.touch()  # Nothing to search: write empty result files for every pair
+        split_batched_tblout(tblout_file, [proteome_file], [sequence_count], max(sequence_count, 1), name_to_stem,
+                             HMM_PREFILTERED_RESULTS_DIR)
+        for profile_file in profile_files:
+            manifest.record(profile_file, proteome_file, prefiltered_result_file(profile_file, proteome_file), 0)
+        tblout_file.unlink(missing_ok=True)
+        return True
+
+    # A single tagged proteome searched with -Z set to its full size keeps per-pair E-values
+    write_candidates(proteome_file, candidate_ids, candidate_file, tag=0)
+    try:
+        return search_concatenated(f"candidates of {proteome_file.name}", candidate_file, [proteome_file], [sequence_count],
+                                   profile_files, database_file, tblout_file, name_to_stem, threads, manifest,
+                                   HMM_PREFILTERED_RESULTS_DIR)
+    finally:
+        candidate_file.unlink(missing_ok=True)
+
+def search_candidates_pyhmmer(proteome_file, profile_files, database_file, index, min_shared, threads, manifest):
+    """Searches every profile against the prefilter candidates of one proteome in-process and records each pair."""
+    output_file = hit_table_file(PREFILTERED_HIT_TABLES_DIR, proteome_file)
+    subunits = [profile_subunit(profile_file) for profile_file in profile_files]
+    try:
+        sequence_count, candidate_ids = select_candidates(index, proteome_file, subunits, min_shared)
+        hits = write_hit_table(worker_profiles(database_file), proteome_file, output_file, threads, candidate_ids)
+        logging.info(f"✅ pyhmmer search completed: {proteome_file.name} "
+                     f"({hits} hits in {len(candidate_ids)} of {sequence_count} proteins)")
+        exit_status = 0
+    except (OSError, ValueError) as e:
+        logging.error(f"❌ pyhmmer search failed for {proteome_file.name}: {e}")
+        atomic_output(output_file).unlink(missing_ok=True)
+        exit_status = 1
+
+    for profile_file in profile_files:
+        manifest.record(profile_file, proteome_file, output_file, exit_status)
+    return exit_status == 0
+
+def search_prefiltered(profile_files, proteome_files, threads, workers, manifest, backend, kmer_size=DEFAULT_KMER_SIZE,
+                       min_shared=DEFAULT_MIN_SHARED, reduced_alphabet=False, max_load=None, max_temp=None):
+    """
+    Searches all profiles against only the candidate proteins of each proteome (see `kmer_prefilter.py`).
+
+    A k-mer index of each subunit's reference set (`combined_cds_interpro_<subunit>.faa`
+    from `08_hmm_pipeline.py`) picks the proteins that share k-mers with any subunit. One
+    search per proteome then scores them against every profile. E-values are computed
+    against the full proteome size, so every hit that is found matches the full search.
+    Hits in proteins the prefilter drops are lost; measure this with
+    `python kmer_prefilter.py`, which reports recall against a full search. Results go to
+    HMM_PREFILTERED_RESULTS_DIR, never over those of full searches; ingest them with
+    `10_process_hmmer_results.py --source prefiltered-tblout` (or `prefiltered-hit-tables`).
+    """
+    references = reference_files(profile_files, HMM_CLUST_SEQS_DIR)
+    missing = sorted({profile_subunit(profile_file) for profile_file in profile_files} - set(references))
+    if missing:
+        logging.warning(f"⚠️ No reference set in {HMM_CLUST_SEQS_DIR} for {', '.join(missing)}; proteomes are searched in full.")
+    index = KmerIndex.from_reference_files(references, kmer_size, reduced_alphabet)
+    logging.info(f"✅ Indexed {len(references)} reference sets for the k-mer prefilter (k={kmer_size}, min shared {min_shared})")
+
+    output_file = prefiltered_hit_table_file if backend == "pyhmmer" else prefiltered_result_file
+    pending = pending_proteomes(profile_files, proteome_files, manifest, output_file)
+
+    with tempfile.TemporaryDirectory(dir=HMM_PREFILTERED_RESULTS_DIR) as temp_dir:
+        temp_dir = Path(temp_dir)
+        database_file = temp_dir / "profiles_db.hmm"
+        if backend == "pyhmmer":
+            PREFILTERED_HIT_TABLES_DIR.mkdir(parents=True, exist_ok=True)
+            logging.info(f"✅ Pressed {press_profiles(profile_files, database_file)} profiles into {database_file}")
+            tasks = [
+                (search_candidates_pyhmmer, (proteome_file, profile_files, database_file, index, min_shared, threads, manifest))
+                for proteome_file in pending
             ]
+        else:
+            name_to_stem = build_profile_database(profile_files, database_file)
+            tasks = [
+                (search_candidates, (proteome_file, profile_files, database_file, temp_dir, name_to_stem, index, min_shared,
+                                     threads, manifest))
+                for proteome_file in pending
+            ]
+        run_scheduled(tasks, workers, f"Prefiltered {'pyhmmer' if backend == 'pyhmmer' else 'HMMER'} Search", max_load, max_temp)
+
+# **Workflow Execution**
+if __name__ == "__main__":
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description="Run HMMER searches with power-aware execution.")
+    parser.add_argument("--force-run", action="store_true", help="Bypass laptop shutdown on battery")
+    parser.add_argument("--mode", choices=["per-pair", "batched", "sharded"], default="per-pair",
+                        help="Run one hmmsearch per profile/proteome pair, all profiles against chunks of proteomes, "
+                             "or all profiles against size-balanced proteome shards")
+    parser.add_argument("--backend", choices=["subprocess", "pyhmmer"], default="subprocess",
+                        help="Run the hmmsearch binary and write tblout files, or search in-process with pyhmmer "
+                             "and write Parquet hit tables (per proteome, or per shard with --mode sharded)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Proteomes per hmmsearch call in batched mode")
+    parser.add_argument("--shard-size-mb", type=float, default=DEFAULT_SHARD_SIZE_MB,
+                        help="Target proteome shard size in MB when packing shards in sharded mode")
+    parser.add_argument("--num-shards", type=int, default=None,
+                        help="Exact number of shards when packing in sharded mode (overrides --shard-size-mb)")
+    parser.add_argument("--threads-per-job", type=int, default=2, help="hmmsearch --cpu value for each job")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Concurrent hmmsearch jobs (default: allocated CPUs / threads per job)")
+    parser.add_argument("--max-load", type=float, default=None,
+                        help="Pause dispatching jobs while the 1-minute load average per CPU exceeds this value")
+    parser.add_argument("--max-temp", type=float, default=None,
+                        help="Pause dispatching jobs while the CPU temperature (°C) exceeds this value")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore the search manifest and rerun every (profile, proteome) pair")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only search proteomes of added/updated assemblies; delete proteomes and results of removed/replaced ones")
+    parser.add_argument("--prefilter", choices=["none", "kmer"], default="none",
+                        help="Search only proteins sharing k-mers with a subunit's reference set (one search per proteome, "
+                             "ignores --mode; check recall with kmer_prefilter.py)")
+    parser.add_argument("--kmer-size", type=int, default=DEFAULT_KMER_SIZE, help="k-mer length of the prefilter")
+    parser.add_argument("--min-shared", type=int, default=DEFAULT_MIN_SHARED,
+                        help="k-mers a protein must share with a reference set to pass the prefilter")
+    parser.add_argument("--reduced-alphabet", action="store_true", help="Build prefilter k-mers over a reduced 10-letter alphabet")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+    if args.backend == "pyhmmer" and not PYHMMER_AVAILABLE:
+        parser.error("--backend pyhmmer requires the pyhmmer package")
+    report = start_run("09_hmmer_search", args.report_dir, args.profile)
+
+    # Detect system type
+    system_type = detect_system_type()
+    num_cpus = psutil.cpu_count(logical=True)
+
+    # Adjust CPU allocation
+    if system_type == "laptop":
+        cpu_allocation = min(4, num_cpus)  # Use at most 4 CPUs on laptops
+    else:
+        cpu_allocation = num_cpus  # Use all CPUs on desktops
+
+    threads_per_job = min(args.threads_per_job, cpu_allocation)
+    workers = args.workers or max(1, cpu_allocation // threads_per_job)
+
+    logging.info(f"🖥️  Detected system: {system_type.upper()}")
+    logging.info(f"🔢 Allocating {cpu_allocation} CPUs for HMMER: {workers} workers × {threads_per_job} threads")
+
+    # **Laptop Power Management: Shutdown unless `--force-run` is used**
+    if system_type == "laptop" and not is_plugged_in():
+        if args.force_run:
+            logging.warning("⚠️ System is on battery, but `--force-run` is enabled. Continuing execution.")
+        else:
+            logging.critical("⚠️ System is running on battery. Shutting down to prevent power loss.")
+            if platform.system() == "Darwin":
+                shutdown_mac()
+            elif platform.system() == "Linux":
+                shutdown_linux()
+            exit(1)  # Stop further execution
+
+    # Ensure required directories exist
+    HMM_PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    HMM_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    if args.prefilter == "kmer":
+        HMM_PREFILTERED_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Drop proteomes and results of assemblies that were removed or replaced by a new version
+    if args.delta:
+        delta = AssemblyDelta.from_file(ASSEMBLY_DELTA_FILE)
+        stale_files = list(HMM_PROTEOMES_DIR.glob("*.faa"))
+        for results_root, hit_tables_dir in ((HMM_RESULTS_DIR, HMM_HIT_TABLES_DIR),
+                                             (HMM_PREFILTERED_RESULTS_DIR, PREFILTERED_HIT_TABLES_DIR)):
+            stale_files += (list(results_root.glob(f"{HMM_PROFILES_DIR.name}/*/*_results.txt"))
+                            + list(hit_tables_dir.glob(f"*{HIT_TABLE_SUFFIX}")))
+        logging.info(f"🗑️ Removed {delta.remove_stale_files(stale_files)} proteome and result files of stale assemblies.")
+
+    # List all proteome and profile files
+    proteome_files = sorted(HMM_PROTEOMES_DIR.glob("*.faa"))
+    if args.delta:
+        proteome_files = [proteome_file for proteome_file in proteome_files if delta.is_fresh(proteome_file.name)]
+    profile_files = sorted(HMM_PROFILES_DIR.glob("*.hmm"))
+    logging.info(f"📂 Found {len(proteome_files)} proteome files to process.")
 
-            result = run_command(hmmer_command)
-            if result:
-                logging.info(f"✅ HMMER search completed: {profile_file.name} → {proteome_file.name}")
+    # Load the manifest of completed searches
+    manifest_file = PREFILTER_MANIFEST_FILE if args.prefilter == "kmer" else MANIFEST_FILE
+    if args.no_resume:
+        manifest_file.unlink(missing_ok=True)
+    manifest = SearchManifest(manifest_file)
 
-        # Cooling period after processing each profile
-        logging.info(f"🛑 Cooling period after processing {profile_file.name}. Waiting for 5 minutes...")
-        time.sleep(300)  # 5 minutes pause
+    # Run HMMER search
+    with report.stage(f"hmmsearch {args.backend} {'prefiltered' if args.prefilter == 'kmer' else args.mode}", inputs=proteome_files):
+        if args.prefilter == "kmer":
+            search_prefiltered(profile_files, proteome_files, threads_per_job, workers, manifest, args.backend, args.kmer_size,
+                               args.min_shared, args.reduced_alphabet, args.max_load, args.max_temp)
+        elif args.mode == "sharded":
+            search_sharded(profile_files, proteome_files, threads_per_job, workers, manifest, args.backend,
+                           args.shard_size_mb, args.num_shards, args.max_load, args.max_temp)
+        elif args.backend == "pyhmmer":
+            search_pyhmmer(profile_files, proteome_files, threads_per_job, workers, manifest, args.max_load, args.max_temp)
+        elif args.mode == "batched":
+            search_batched(profile_files, proteome_files, threads_per_job, workers, args.chunk_size, manifest,
+                           args.max_load, args.max_temp)
+        else:
+            search_per_pair(profile_files, proteome_files, threads_per_job, workers, manifest,
+                            args.max_load, args.max_temp)
 
-logging.info("✅ HMMER search completed successfully!")
-print("✅ HMMER search completed! Logs saved to hmmer_search.log")
+    logging.info("✅ HMMER search completed successfully!")
+    print("✅ HMMER search completed! Logs saved to hmmer_search.log")
@@ -1,12 +1,25 @@
 import os
-import re
+import sys
 import glob
+import shutil
+import argparse
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import logging
+from collections import defaultdict
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 from pathlib import Path
-from config import HMM_RESULTS_DIR
+from config import (HMM_RESULTS_DIR, HMM_HIT_TABLES_DIR, HMM_PREFILTERED_RESULTS_DIR, HIT_STORE_FILE, GENOME_METADATA_FILE, GENOME_DATASET_FILE,
+                    ASSEMBLY_DELTA_FILE, RUN_REPORTS_DIR)
+from hit_store import HitStore, load_replicon_metadata
+from dataset_delta import AssemblyDelta
+from instrumentation import add_report_arguments, start_run
+from pyhmmer_search import HIT_TABLE_SCHEMA, HIT_TABLE_SUFFIX
 
 # Setup logging
 LOG_FILE = Path(__file__).parent / "hmmer_results.log"
@@ -20,64 +33,208 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 logging.getLogger().addHandler(console_handler)
 
-def parse_results_tblout_output(file_fullpath):
+START_END_PATTERN = r'#\s*(\d+)\s*#\s*(\d+)\s*'
+RESULT_SUFFIX = "_results.txt"
+# Where each search backend of 09_hmmer_search.py leaves its results
+RESULT_SOURCES = {
+    "tblout": (HMM_RESULTS_DIR, "**/*.txt"),
+    "hit-tables": (HMM_HIT_TABLES_DIR, f"*{HIT_TABLE_SUFFIX}"),
+    # Outputs of `09_hmmer_search.py --prefilter kmer`, kept apart from full searches
+    "prefiltered-tblout": (HMM_PREFILTERED_RESULTS_DIR, "**/*.txt"),
+    "prefiltered-hit-tables": (HMM_PREFILTERED_RESULTS_DIR / HMM_HIT_TABLES_DIR.name, f"*{HIT_TABLE_SUFFIX}"),
+}
+COMPARED_COLUMNS = ['evalue', 'BitScore', 'Bias', 'SequenceDesc']
+# tblout E-values carry two significant digits, and batched searches round them twice after rescaling
+EVALUE_RTOL = 0.1
+
+def read_tblout_lines(file_paths):
     """
-    Parses an HMMER `.tblout` output file, extracting key information.
+    Reads the hit rows of one or more HMMER `.tblout` files.
 
     Args:
-        file_fullpath (str): Full path to the HMMER results file.
+        file_paths (list): Paths to HMMER results files.
+
+    Returns:
+        list: Non-comment, non-empty lines from all files.
+    """
+    lines = []
+    for file_fullpath in file_paths:
+        try:
+            with open(file_fullpath, 'r') as handle:
+                lines.extend(line for line in handle if line.strip() and not line.startswith('#'))
+        except OSError as e:
+            logging.error(f"❌ Error processing file {file_fullpath}: {str(e)}")
+    return lines
+
+def tblout_lines_to_frame(lines, sources=None):
+    """
+    Splits tblout rows into columns with vectorised string operations.
+
+    Rows with fewer than the 18 fixed tblout fields (e.g. a truncated last line) or with a
+    non-numeric E-value, score or bias are dropped and logged, so one damaged file cannot
+    abort the run or add bogus hits.
+
+    Args:
+        lines (list): Hit rows as returned by `read_tblout_lines`.
+        sources (list): File each row was read from, used to report dropped rows per file.
+
+    Returns:
+        pd.DataFrame: DataFrame containing parsed hit data, indexed by the rows' positions in `lines`.
+    """
+    if not lines:
+        return pd.DataFrame()
+
+    # The first 18 fields are whitespace separated; the 19th is the free-text description
+    cols = pd.Series(lines).str.rstrip('\n').str.split(n=18, expand=True).reindex(columns=range(19))
+    scores = cols[[4, 5, 6]].apply(pd.to_numeric, errors='coerce')
+    valid = cols[17].notna() & scores.notna().all(axis=1)
+    if not valid.all():
+        dropped = pd.Series(sources if sources is not None else ['<input>'] * len(lines))[~valid]
+        for source, count in dropped.value_counts(sort=False).items():
+            logging.error(f"❌ Skipped {count} malformed tblout rows in {source}")
+        cols, scores = cols[valid], scores[valid]
+
+    return pd.DataFrame({
+        'Accession': cols[0].str.replace(r'_[0-9]+$', '', regex=True),
+        'ProteinAccession': cols[0],
+        'Profile': cols[2],
+        'evalue': scores[4].astype(np.float64),
+        'BitScore': scores[5].astype(np.float64),
+        'Bias': scores[6].astype(np.float64),
+        'SequenceDesc': cols[18].fillna(''),
+    })
+
+def proteome_file_name(result_file):
+    """Returns the proteome FASTA a `<proteome>_results.txt` or `<proteome>_hits.parquet` file was searched against."""
+    name = Path(result_file).name
+    for suffix in (RESULT_SUFFIX, HIT_TABLE_SUFFIX):
+        if name.endswith(suffix):
+            return name[:-len(suffix)] + ".faa"
+    return Path(name).stem + ".faa"
+
+def read_tblout_files(file_paths):
+    """
+    Parses result files into one DataFrame, recording each hit's ProteomeFile.
+
+    Args:
+        file_paths (list): Paths to HMMER results files.
 
     Returns:
         pd.DataFrame: DataFrame containing parsed hit data.
     """
-    accession_pattern = re.compile(r'_[0-9]+$')
-    hits = []
+    lines, result_files, line_counts = [], [], []
+    for file_path in file_paths:
+        file_lines = read_tblout_lines([file_path])
+        lines.extend(file_lines)
+        result_files.append(str(file_path))
+        line_counts.append(len(file_lines))
 
-    try:
-        with open(file_fullpath, 'r') as handle:
-            lines = handle.readlines()[3:]  # Skip header lines
+    sources = np.repeat(result_files, line_counts)
+    hits = tblout_lines_to_frame(lines, sources)
+    if not hits.empty:
+        proteome_files = np.repeat([proteome_file_name(file_path) for file_path in result_files], line_counts)
+        hits.insert(1, 'ProteomeFile', proteome_files[hits.index])
+    return hits.reset_index(drop=True)
 
-        for line in lines:
-            if not line.strip() or line.startswith('#'):
-                continue  # Skip empty lines and comments
+def read_hit_tables(file_paths):
+    """
+    Reads Parquet hit tables written by the pyhmmer backend into the same frame as `read_tblout_files`.
 
-            cols = [x for x in line.strip().split() if x]
+    Args:
+        file_paths (list): Paths to `<proteome>_hits.parquet` files.
 
-            hit = {
-                'Accession': accession_pattern.sub('', cols[0]),
-                'ProteinAccession': cols[0],
-                'Profile': cols[2],
-                'evalue': np.float64(cols[4]),
-                'BitScore': np.float64(cols[5]),
-                'Bias': np.float64(cols[6]),
-                'SequenceDesc': " ".join(cols[18:])
-            }
+    Returns:
+        pd.DataFrame: DataFrame containing parsed hit data.
+    """
+    tables, proteome_files = [], []
+    for file_path in file_paths:
+        try:
+            tables.append(pq.read_table(file_path, columns=HIT_TABLE_SCHEMA.names).cast(HIT_TABLE_SCHEMA))
+            proteome_files.append(proteome_file_name(file_path))
+        except (OSError, pa.ArrowInvalid) as e:
+            logging.error(f"❌ Error processing file {file_path}: {str(e)}")
 
-            hits.append(hit)
+    if not tables or not sum(table.num_rows for table in tables):
+        return pd.DataFrame()
 
-        if not hits:
-            logging.warning(f"⚠️ No valid hits found in: {file_fullpath}")
-            return pd.DataFrame()  # Return empty DataFrame if no hits
+    hits = pa.concat_tables(tables).to_pandas()
+    hits.insert(0, 'ProteomeFile', np.repeat(proteome_files, [table.num_rows for table in tables]))
+    hits.insert(0, 'Accession', hits['ProteinAccession'].str.replace(r'_[0-9]+$', '', regex=True))
+    return hits
 
-        return pd.DataFrame(hits)
+def read_result_files(file_paths):
+    """Parses tblout files and hit tables alike into one DataFrame, recording each hit's ProteomeFile."""
+    file_paths = list(file_paths)
+    hit_tables = [file_path for file_path in file_paths if str(file_path).endswith(HIT_TABLE_SUFFIX)]
+    tblouts = [file_path for file_path in file_paths if not str(file_path).endswith(HIT_TABLE_SUFFIX)]
+    frames = [frame for frame in (read_tblout_files(tblouts), read_hit_tables(hit_tables)) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def parse_results_tblout_output(file_fullpath):
+    """
+    Parses an HMMER `.tblout` output file, extracting key information.
+
+    Args:
+        file_fullpath (str): Full path to the HMMER results file.
+
+    Returns:
+        pd.DataFrame: DataFrame containing parsed hit data.
+    """
+    try:
+        hits = tblout_lines_to_frame(read_tblout_lines([file_fullpath]))
+        if hits.empty:
+            logging.warning(f"⚠️ No valid hits found in: {file_fullpath}")
+        return hits
 
     except Exception as e:
         logging.error(f"❌ Error processing file {file_fullpath}: {str(e)}")
         return pd.DataFrame()
 
-def process_hmmer_results(result_dir, pattern_str=r'#\s*(\d+)\s*#\s*(\d+)\s*'):
+def format_hmmer_results(results, pattern_str=START_END_PATTERN):
+    """
+    Removes duplicate hits and derives Subunit, Start, End and log10evalue columns.
+
+    Args:
+        results (pd.DataFrame): Raw hits from `tblout_lines_to_frame`.
+        pattern_str (str): Regex pattern for extracting 'Start' and 'End' from 'SequenceDesc'.
+
+    Returns:
+        pd.DataFrame: Formatted hits.
+    """
+    # Sort by 'evalue' and remove duplicates
+    results = results.sort_values(by='evalue').drop_duplicates(subset=['Accession', 'ProteinAccession'], keep='first')
+
+    # The profile name is Subunit_SeqsClustThreshold_HMMParameter; only the subunit is kept
+    results['Subunit'] = results['Profile'].str.split('_', n=2, expand=True)[0]
+
+    # Extract 'Start' and 'End' from 'SequenceDesc' using regex
+    coordinates = results['SequenceDesc'].str.extract(pattern_str)
+    results['Start'] = coordinates[0].fillna(0).astype(np.int64)
+    results['End'] = coordinates[1].fillna(0).astype(np.int64)
+
+    # Apply log10 transformation to the 'evalue' column (avoid log(0) errors)
+    results['log10evalue'] = np.log10(results['evalue'].where(results['evalue'] > 0))
+
+    # Remove the 'Profile' column and reset index
+    return results.drop(columns=['Profile']).reset_index(drop=True)
+
+def process_hmmer_results(result_dir, pattern_str=START_END_PATTERN, delta=None, result_glob="**/*.txt"):
     """
     Processes all HMMER `.tblout` results in a directory, cleaning and formatting them.
 
     Args:
-        result_dir (str): Directory containing `.tblout` HMMER output files.
+        result_dir (str): Directory containing `.tblout` HMMER output files (or hit tables).
         pattern_str (str): Regex pattern for extracting 'Start' and 'End' from 'SequenceDesc'.
+        delta (AssemblyDelta): Only process results of added/updated assemblies.
+        result_glob (str): Pattern of the result files under `result_dir`, see RESULT_SOURCES.
 
     Returns:
         pd.DataFrame: Processed results from all `.tblout` files.
     """
     result_dir = Path(result_dir)
-    file_paths = list(result_dir.glob("**/*.txt"))  # Find all .txt results recursively
+    file_paths = list(result_dir.glob(result_glob))
+    if delta is not None:
+        file_paths = [file_path for file_path in file_paths if delta.is_fresh(file_path.name)]
 
     if not file_paths:
         logging.error(f"❌ No result files found in {result_dir}")
@@ -85,49 +242,303 @@ def process_hmmer_results(result_dir, pattern_str=r'#\s*(\d+)\s*#\s*(\d+)\s*'):
 
     logging.info(f"📂 Found {len(file_paths)} result files in {result_dir}")
 
-    all_dataframes = [parse_results_tblout_output(file) for file in tqdm(file_paths, desc="Processing HMMER results")]
-    results = pd.concat([df for df in all_dataframes if not df.empty], ignore_index=True)
+    results = read_result_files(tqdm(file_paths, desc="Processing HMMER results"))
 
     if results.empty:
         logging.warning("⚠️ No valid results found after processing all files.")
         return results
 
-    # Sort by 'evalue' and remove duplicates
-    results.sort_values(by='evalue', inplace=True)
-    results.drop_duplicates(subset=['Accession', 'ProteinAccession'], keep='first', inplace=True)
+    results = format_hmmer_results(results, pattern_str)
 
-    # Split the 'Profile' column into three new columns: Subunit, SeqsClustThreshold, HMMParameter
-    results[['Subunit', 'SeqsClustThreshold', 'HMMParameter']] = results['Profile'].str.split('_', expand=True)
+    logging.info("✅ HMMER results processing complete.")
+    return results
 
-    # Extract 'Start' and 'End' from 'SequenceDesc' using regex
-    pattern = re.compile(pattern_str)
-    matches = results['SequenceDesc'].apply(lambda x: pattern.search(x) if pd.notnull(x) else None)
+def group_result_files(file_paths, batch_size):
+    """
+    Groups result files into batches that each hold every profile's results for a set of proteomes.
 
-    results['Start'] = matches.apply(lambda m: int(m.group(1)) if m else 0)
-    results['End'] = matches.apply(lambda m: int(m.group(2)) if m else 0)
+    Duplicate hits only occur between profiles searched against the same proteome, so
+    de-duplicating within such a batch gives the same result as de-duplicating globally.
 
-    # Apply log10 transformation to the 'evalue' column (avoid log(0) errors)
-    results['log10evalue'] = results['evalue'].apply(lambda x: np.log10(x) if x > 0 else np.nan)
+    Args:
+        file_paths (list): Paths to HMMER results files.
+        batch_size (int): Number of proteomes per batch.
 
-    # Remove the 'Profile' column
-    results.drop(columns=['Profile', 'HMMParameter', 'SeqsClustThreshold'], inplace=True)
+    Returns:
+        list: Lists of result files, one per batch.
+    """
+    files_by_proteome = defaultdict(list)
+    for file_path in file_paths:
+        files_by_proteome[file_path.name].append(file_path)
 
-    # Reset index
-    results.reset_index(drop=True, inplace=True)
+    proteome_groups = list(files_by_proteome.values())
+    return [
+        [file_path for group in proteome_groups[i:i + batch_size] for file_path in group]
+        for i in range(0, len(proteome_groups), batch_size)
+    ]
 
-    logging.info("✅ HMMER results processing complete.")
-    return results
+def ingest_batch(batch_number, file_paths, output_dir, pattern_str=START_END_PATTERN, part_prefix="part"):
+    """
+    Parses one batch of result files and writes it as Subunit-partitioned Parquet.
+
+    Returns:
+        int: Number of hits written.
+    """
+    results = read_result_files(file_paths)
+    if results.empty:
+        return 0
+
+    results = format_hmmer_results(results, pattern_str)
+    results.to_parquet(
+        output_dir,
+        partition_cols=['Subunit'],
+        index=False,
+        basename_template=f"{part_prefix}-{batch_number:05d}-{{i}}.parquet"
+    )
+    return len(results)
+
+def supports_delta_update(output_path):
+    """
+    Checks whether existing processed results can be updated for a delta.
+
+    Delta updates match hits to assemblies on the ProteomeFile column, which results
+    written by earlier versions of this script do not have.
+
+    Args:
+        output_path (Path): The processed results CSV or Parquet dataset directory.
+
+    Returns:
+        bool: True if the results exist and record each hit's ProteomeFile.
+    """
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return False
+    if output_path.is_dir():
+        columns = ds.dataset(output_path, format="parquet", partitioning="hive").schema.names
+    else:
+        columns = pd.read_csv(output_path, nrows=0).columns
+    return 'ProteomeFile' in columns
+
+def prune_parquet_dataset(dataset_dir, delta):
+    """
+    Removes the hits of stale and fresh assemblies from an existing Parquet dataset.
+
+    Only the ProteomeFile column is read to find affected part files; those are rewritten
+    without the affected rows (or deleted when nothing remains), the rest are untouched.
+
+    Returns:
+        int: Number of hits removed.
+    """
+    removed = 0
+    for part_file in Path(dataset_dir).rglob("*.parquet"):
+        proteomes = pq.ParquetFile(part_file).read(columns=['ProteomeFile']).column('ProteomeFile').to_pandas()
+        affected_proteomes = [proteome for proteome in proteomes.unique() if delta.is_affected(proteome)]
+        if not affected_proteomes:
+            continue
+
+        keep = ~proteomes.isin(affected_proteomes).to_numpy()
+        removed += int((~keep).sum())
+        if keep.any():
+            temp_file = part_file.with_name(part_file.name + ".tmp")
+            pq.write_table(pq.ParquetFile(part_file).read().filter(keep), temp_file)
+            os.replace(temp_file, part_file)
+        else:
+            part_file.unlink()
+    return removed
+
+def ingest_hmmer_results(result_dir, output_dir, workers=None, batch_size=500, pattern_str=START_END_PATTERN, delta=None,
+                         result_glob="**/*.txt"):
+    """
+    Parses all HMMER `.tblout` results across a process pool into a Parquet dataset.
+
+    Each worker parses a batch of proteomes and writes its own part files under
+    `output_dir/Subunit=<subunit>/`, so hits are never collected in the parent process.
+    Read the dataset back with `pd.read_parquet(output_dir)`.
+
+    With a delta, the existing dataset is kept: hits of removed and updated assemblies are
+    pruned from it and only the results of added and updated assemblies are parsed and
+    appended as new part files.
+
+    Args:
+        result_dir (str): Directory containing `.tblout` HMMER output files.
+        output_dir (str): Directory for the partitioned Parquet dataset (replaced if present).
+        workers (int): Number of worker processes (default: number of CPUs).
+        batch_size (int): Number of proteomes parsed per task.
+        pattern_str (str): Regex pattern for extracting 'Start' and 'End' from 'SequenceDesc'.
+        delta (AssemblyDelta): Update the existing dataset for this delta instead of rebuilding it.
+        result_glob (str): Pattern of the result files under `result_dir`, see RESULT_SOURCES.
+
+    Returns:
+        int: Total number of hits written.
+    """
+    result_dir, output_dir = Path(result_dir), Path(output_dir)
+    file_paths = list(result_dir.glob(result_glob))
+    part_prefix = "part"
+
+    if delta is not None:
+        file_paths = [file_path for file_path in file_paths if delta.is_fresh(file_path.name)]
+        output_dir.mkdir(parents=True, exist_ok=True)
+        removed = prune_parquet_dataset(output_dir, delta)
+        logging.info(f"🔁 Removed {removed} hits of removed/updated assemblies from {output_dir}")
+        # Unique part names keep earlier part files from being overwritten
+        part_prefix = f"delta-{datetime.now():%Y%m%d%H%M%S}"
+    elif output_dir.exists():
+        shutil.rmtree(output_dir)
+
+    if not file_paths:
+        if delta is not None:
+            logging.info("⏭️ No result files of added or updated assemblies to ingest.")
+        else:
+            logging.error(f"❌ No result files found in {result_dir}")
+        return 0
+
+    logging.info(f"📂 Found {len(file_paths)} result files in {result_dir}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    batches = group_result_files(file_paths, batch_size)
+    total_hits = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(ingest_batch, batch_number, batch, output_dir, pattern_str, part_prefix)
+            for batch_number, batch in enumerate(batches)
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing HMMER results"):
+            total_hits += future.result()
+
+    logging.info(f"✅ HMMER results processing complete: {total_hits} hits written to {output_dir}")
+    return total_hits
+
+def parquet_hit_chunks(dataset_dir, batch_size=1_000_000):
+    """Yields the hits of a Subunit-partitioned Parquet dataset as DataFrames of up to `batch_size` rows."""
+    dataset = ds.dataset(dataset_dir, format="parquet", partitioning="hive")
+    for batch in dataset.to_batches(batch_size=batch_size):
+        hits = batch.to_pandas()
+        hits['Subunit'] = hits['Subunit'].astype(str)
+        yield hits
+
+def build_hit_store(hit_chunks, store_file=HIT_STORE_FILE):
+    """
+    Writes processed hits into the indexed SQLite hit store used by the notebooks.
+
+    Args:
+        hit_chunks (iterable): DataFrames of formatted hits.
+        store_file (Path): SQLite file to write.
+
+    Returns:
+        int: Number of hits stored.
+    """
+    replicons = load_replicon_metadata(GENOME_METADATA_FILE, GENOME_DATASET_FILE)
+    return HitStore.build(tqdm(hit_chunks, desc="Building hit store"), store_file, replicons)
+
+def compare_backends(tblout_dir=HMM_RESULTS_DIR, hit_tables_dir=HMM_HIT_TABLES_DIR):
+    """
+    Compares the hits of the subprocess (tblout) and pyhmmer (hit table) search backends.
+
+    Only proteomes with results from both backends are compared, hit by hit on
+    (ProteomeFile, ProteinAccession, Profile). E-values may differ by EVALUE_RTOL.
+
+    Args:
+        tblout_dir (Path): Directory containing `.tblout` HMMER output files.
+        hit_tables_dir (Path): Directory containing `<proteome>_hits.parquet` hit tables.
+
+    Returns:
+        pd.DataFrame: Hits found by one backend only or with differing COMPARED_COLUMNS,
+            described in a Mismatch column; empty when the backends agree.
+    """
+    tblout_files = list(Path(tblout_dir).glob(RESULT_SOURCES["tblout"][1]))
+    table_files = list(Path(hit_tables_dir).glob(RESULT_SOURCES["hit-tables"][1]))
+    common = {proteome_file_name(file_path) for file_path in tblout_files} & {proteome_file_name(file_path) for file_path in table_files}
+    logging.info(f"🔍 Comparing search backends on {len(common)} proteomes searched by both")
+
+    keys = ['ProteomeFile', 'ProteinAccession', 'Profile']
+    frames = []
+    for reader, files in ((read_tblout_files, tblout_files), (read_hit_tables, table_files)):
+        hits = reader([file_path for file_path in files if proteome_file_name(file_path) in common])
+        frames.append(hits[keys + COMPARED_COLUMNS] if not hits.empty else pd.DataFrame(columns=keys + COMPARED_COLUMNS))
+
+    merged = frames[0].merge(frames[1], on=keys, how='outer', suffixes=('_tblout', '_pyhmmer'), indicator=True)
+    mismatch = merged['_merge'].map({'left_only': 'tblout only', 'right_only': 'pyhmmer only', 'both': ''}).astype(str)
+    both = merged['_merge'] == 'both'
+    for column in COMPARED_COLUMNS:
+        left, right = merged[f"{column}_tblout"], merged[f"{column}_pyhmmer"]
+        if column == 'evalue':
+            differs = both & ~np.isclose(left.astype(np.float64), right.astype(np.float64), rtol=EVALUE_RTOL, atol=0)
+        else:
+            differs = both & (left != right)
+        mismatch[differs] = mismatch[differs] + np.where(mismatch[differs] == '', '', ', ') + column
+
+    merged['Mismatch'] = mismatch
+    mismatches = merged[mismatch != ''].drop(columns=['_merge']).reset_index(drop=True)
+    logging.info(f"📊 {int(both.sum())} hits found by both backends, {len(mismatches)} mismatches")
+    return mismatches
 
 # **Execution**
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combine HMMER tblout results into a single table.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Write a single CSV or a Subunit-partitioned Parquet dataset (parallel)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for Parquet ingestion")
+    parser.add_argument("--batch-size", type=int, default=500, help="Proteomes parsed per worker task")
+    parser.add_argument("--store", action="store_true",
+                        help="Also write the indexed SQLite hit store with genome metadata joined in")
+    parser.add_argument("--delta", action="store_true",
+                        help="Update the existing results for the refresh delta instead of reprocessing everything")
+    parser.add_argument("--source", choices=list(RESULT_SOURCES), default="tblout",
+                        help="Read the tblout files of the subprocess backend or the hit tables of the pyhmmer backend, "
+                             "of full or prefiltered searches")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="Only compare the results of both search backends and exit (status 1 on mismatches)")
+    add_report_arguments(parser, RUN_REPORTS_DIR)
+    args = parser.parse_args()
+    report = start_run("10_process_hmmer_results", args.report_dir, args.profile)
+
+    if args.compare_backends:
+        with report.stage("compare backends"):
+            mismatches = compare_backends()
+        if not mismatches.empty:
+            comparison_file = HMM_RESULTS_DIR / "backend_comparison.csv"
+            mismatches.to_csv(comparison_file, index=False)
+            logging.error(f"❌ Search backends disagree on {len(mismatches)} hits, see {comparison_file}")
+            sys.exit(1)
+        logging.info("✅ Search backends agree on every hit.")
+        sys.exit(0)
+
     logging.info("🚀 Starting HMMER results processing...")
-    processed_results = process_hmmer_results(HMM_RESULTS_DIR)
+    delta = AssemblyDelta.from_file(ASSEMBLY_DELTA_FILE) if args.delta else None
+    result_dir, result_glob = RESULT_SOURCES[args.source]
+    output_path = HMM_RESULTS_DIR / ("processed_hmmer_results" if args.format == "parquet" else "processed_hmmer_results.csv")
+    if delta is not None and not supports_delta_update(output_path):
+        logging.warning(f"⚠️ {output_path} is missing or has no ProteomeFile column; processing all results instead of the delta")
+        delta = None
 
-    if not processed_results.empty:
-        output_file = HMM_RESULTS_DIR / "processed_hmmer_results.csv"
-        processed_results.to_csv(output_file, index=False)
-        logging.info(f"✅ Processed results saved to {output_file}")
+    if args.format == "parquet":
+        output_dir = output_path
+        with report.stage("ingest results") as stage:
+            total_hits = ingest_hmmer_results(result_dir, output_dir, args.workers, args.batch_size, delta=delta,
+                                              result_glob=result_glob)
+            stage['hits'] = total_hits
+        if not total_hits and delta is None:
+            logging.warning("⚠️ No results were processed successfully.")
+        elif args.store:
+            with report.stage("build hit store"):
+                build_hit_store(parquet_hit_chunks(output_dir))
     else:
-        logging.warning("⚠️ No results were processed successfully.")
+        with report.stage("process results") as stage:
+            processed_results = process_hmmer_results(result_dir, delta=delta, result_glob=result_glob)
+            output_file = output_path
+            # A delta update is written even when empty, so hits of removed assemblies do not linger
+            updating = delta is not None
+            if updating:
+                processed_results = delta.apply(pd.read_csv(output_file), processed_results, 'ProteomeFile')
+            stage['hits'] = len(processed_results)
+
+        if updating or not processed_results.empty:
+            processed_results.to_csv(output_file, index=False)
+            logging.info(f"✅ Processed results saved to {output_file}")
+            if args.store:
+                with report.stage("build hit store"):
+                    build_hit_store([processed_results])
+        else:
+            logging.warning("⚠️ No results were processed successfully.")
 
     print("✅ HMMER results processing complete! Logs saved to hmmer_results.log")
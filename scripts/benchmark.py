@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import logging
+import argparse
+import importlib
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+import psutil
+import pandas as pd
+from instrumentation import tree_rss
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+# Kept in `<workdir>/benchmark/` next to the dataset they were measured on, unless given explicitly
+HISTORY_FILE_NAME = "benchmark_history.jsonl"
+BASELINE_FILE_NAME = "benchmark_baseline.json"
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / "nuohmmer_benchmark"
+BASE_DIR_VARIABLE = "NUOHMMER_BASE_DIR"
+
+RSS_POLL_INTERVAL = 0.1  # Seconds between peak RSS samples of a stage's process tree
+# Changes smaller than these are treated as noise, whatever the relative tolerance
+MIN_SECONDS_DELTA = 0.5
+MIN_RSS_MB_DELTA = 20
+
+# Stage name -> script and arguments (relative to scripts/), throughput unit, and the
+# dataset count (or analysis report field) used as the number of items processed
+STAGES = {
+    '04': {'command': ["04_prescreen_cds.py"], 'workers': True, 'unit': "CDS records", 'items': 'cds_records'},
+    '05': {'command': ["05_extract_genome_metadata.py"], 'workers': True, 'unit': "Mb", 'items': 'genome_mb'},
+    '06': {'command': ["06_extract_seqs_cds.py"], 'workers': False, 'unit': "Nuo CDS", 'items': 'chromosome_nuo_cds'},
+    '09': {'command': ["09_hmmer_search.py", "--force-run", "--no-resume", "--threads-per-job", "1"],
+           'workers': True, 'unit': "searches", 'items': 'searches'},
+    '10': {'command': ["10_process_hmmer_results.py", "--store"], 'workers': True, 'unit': "result files", 'items': 'searches'},
+    'clustering': {'command': ["benchmark.py", "--run-analysis", "clustering"], 'workers': False, 'unit': "hits", 'items': 'report'},
+    'classification': {'command': ["benchmark.py", "--run-analysis", "classification"], 'workers': False,
+                       'unit': "clusters", 'items': 'report'},
+}
+
+def load_config(workdir):
+    """Points `config.py` at the benchmark directory through NUOHMMER_BASE_DIR and returns it."""
+    os.environ[BASE_DIR_VARIABLE] = str(workdir)
+    if 'config' in sys.modules:
+        return importlib.reload(sys.modules['config'])
+    return importlib.import_module('config')
+
+def scale_settings(args):
+    """Returns the settings that determine the synthetic dataset."""
+    return {'genomes': args.genomes, 'genes_per_genome': args.genes_per_genome,
+            'genome_length': args.genome_length, 'seed': args.seed}
+
+def prepare_dataset(config, workdir, scale, regenerate=False, workers=None):
+    """
+    Generates the synthetic dataset unless one of the same scale already exists.
+
+    Returns:
+        dict: Dataset counts from `synthetic_data.generate_dataset`.
+    """
+    from synthetic_data import generate_dataset
+
+    dataset_file = workdir / "benchmark" / "dataset.json"
+    if dataset_file.exists() and not regenerate:
+        with open(dataset_file, 'r') as handle:
+            dataset = json.load(handle)
+        if dataset['scale'] == scale:
+            logging.info(f"♻️ Reusing synthetic dataset in {workdir}")
+            return dataset['counts']
+
+    if (workdir / "data").exists():
+        shutil.rmtree(workdir / "data")
+    for name, value in vars(config).items():
+        if name.endswith('_DIR') and isinstance(value, Path):
+            value.mkdir(parents=True, exist_ok=True)
+
+    logging.info(f"🧪 Generating synthetic dataset in {workdir}: {scale}")
+    counts = generate_dataset(
+        config.GENOMES_DIR, config.CDS_DIR, config.HMM_PROTEOMES_DIR, config.HMM_PROFILES_DIR,
+        config.HMM_RESULTS_DIR / config.HMM_PROFILES_DIR.name, config.GENOME_DATASET_FILE,
+        workdir / "benchmark" / "truth.csv", workers=workers, **scale
+    )
+    counts['genome_mb'] = counts['genome_bp'] / 1_000_000
+    with open(dataset_file, 'w') as handle:
+        json.dump({'scale': scale, 'counts': counts}, handle, indent=2)
+    return counts
+
+def attach_replicons(config):
+    """Adds the Replicon column `06_extract_seqs_cds.py` filters on to the step 04 output, from the step 05 metadata."""
+    nuo_file = config.CDS_METADATA_DIR / "nuo_cds_prescreened.csv"
+    if not nuo_file.exists() or not config.GENOME_METADATA_FILE.exists():
+        return
+    cds = pd.read_csv(nuo_file).drop(columns=['Replicon'], errors='ignore')
+    replicons = pd.read_csv(config.GENOME_METADATA_FILE, usecols=['Accession', 'Replicon'])
+    cds.merge(replicons, on='Accession', how='left').to_csv(nuo_file, index=False)
+
+def run_stage(command, env, log_file):
+    """
+    Runs a stage as a subprocess, sampling the peak RSS of its process tree.
+
+    Returns:
+        dict: seconds (wall), cpu_seconds (user + system of all descendants), peak_rss_mb
+            and returncode.
+    """
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    peak_rss = 0
+    with open(log_file, 'w') as log:
+        process = subprocess.Popen(command, cwd=SCRIPTS_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        monitored = psutil.Process(process.pid)
+        while process.poll() is None:
+            peak_rss = max(peak_rss, tree_rss(monitored))
+            time.sleep(RSS_POLL_INTERVAL)
+    seconds = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        'seconds': round(seconds, 3),
+        'cpu_seconds': round((usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime), 3),
+        'peak_rss_mb': round(peak_rss / 2**20, 1),
+        'returncode': process.returncode,
+    }
+
+def mock_environment(workdir):
+    """Returns the environment for stage subprocesses, with the mock `hmmsearch` first on PATH."""
+    bin_dir = workdir / "benchmark" / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    mock = bin_dir / "hmmsearch"
+    mock.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{SCRIPTS_DIR / "mock_hmmsearch.py"}" "$@"\n')
+    mock.chmod(0o755)
+
+    env = dict(os.environ)
+    env[BASE_DIR_VARIABLE] = str(workdir)
+    env['PATH'] = f"{bin_dir}{os.pathsep}{env.get('PATH', '')}"
+    return env
+
+def run_benchmark(config, workdir, stages, counts, workers=None):
+    """
+    Times every requested stage against the synthetic dataset.
+
+    Returns:
+        dict: Per-stage results (seconds, cpu_seconds, peak_rss_mb, items, unit, throughput, returncode).
+    """
+    env = mock_environment(workdir)
+    log_dir = workdir / "benchmark" / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for stage in stages:
+        spec = STAGES[stage]
+        if stage == '06':
+            attach_replicons(config)
+        command = [sys.executable] + spec['command']
+        if stage in ('clustering', 'classification'):
+            command += ["--workdir", str(workdir)]
+        if spec['workers'] and workers:
+            command += ["--workers", str(workers)]
+
+        report_file = workdir / "benchmark" / f"{stage}.json"
+        report_file.unlink(missing_ok=True)
+
+        logging.info(f"⏱️ Running stage {stage}: {' '.join(spec['command'])}")
+        result = run_stage(command, env, log_dir / f"{stage}.log")
+
+        if spec['items'] == 'report':
+            report = json.loads(report_file.read_text()) if report_file.exists() else {}
+            items = report.pop('items', 0)
+            result.update(report)
+        else:
+            items = counts[spec['items']]
+        result.update(items=items, unit=spec['unit'], throughput=round(items / max(result['seconds'], 1e-9), 2))
+
+        if result['returncode'] != 0:
+            logging.error(f"❌ Stage {stage} failed with exit code {result['returncode']}; see {log_dir / f'{stage}.log'}")
+        results[stage] = result
+    return results
+
+def compare_runs(run, baseline, tolerance):
+    """
+    Flags stages that got slower or used more memory than in the baseline run.
+
+    A stage regresses when its wall time or peak RSS exceeds the baseline by more than
+    `tolerance` (relative) and by more than MIN_SECONDS_DELTA / MIN_RSS_MB_DELTA (absolute).
+
+    Returns:
+        list: Regression messages; empty when the runs are not comparable or nothing regressed.
+    """
+    if baseline['scale'] != run['scale'] or baseline.get('workers') != run.get('workers'):
+        logging.warning("⚠️ Baseline was recorded at a different scale or worker count; skipping regression checks.")
+        return []
+
+    regressions = []
+    for stage, result in run['stages'].items():
+        reference = baseline['stages'].get(stage)
+        if reference is None or result['returncode'] != 0:
+            continue
+        for metric, floor in (('seconds', MIN_SECONDS_DELTA), ('peak_rss_mb', MIN_RSS_MB_DELTA)):
+            current, previous = result[metric], reference[metric]
+            if current > previous * (1 + tolerance) and current - previous > floor:
+                regressions.append(f"{stage}: {metric} {previous} → {current} (+{100 * (current / previous - 1):.0f}%)")
+    return regressions
+
+def summary_table(run, baseline=None):
+    """Returns the per-stage results as a printable table, with baseline times when available."""
+    table = pd.DataFrame.from_dict(run['stages'], orient='index')
+    columns = ['seconds', 'cpu_seconds', 'peak_rss_mb', 'items', 'unit', 'throughput', 'returncode']
+    table = table[columns + [column for column in table.columns if column not in columns]]
+    if baseline is not None:
+        table['baseline_seconds'] = [baseline['stages'].get(stage, {}).get('seconds') for stage in table.index]
+        table['baseline_rss_mb'] = [baseline['stages'].get(stage, {}).get('peak_rss_mb') for stage in table.index]
+    return table.to_string()
+
+def git_commit():
+    """Returns the current commit of the repository, or None outside a git checkout."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_analysis(stage, workdir):
+    """
+    Runs the in-notebook analysis stages on the hit store of a benchmark dataset.
+
+    `clustering` clusters all hits and writes the subunit presence table; `classification`
+    classifies it and scores the result against the planted operons. A small JSON report
+    with the number of items processed is written for `run_benchmark`.
+    """
+    config = load_config(workdir)
+    from hit_store import load_hits
+    from complex_i_analysis import VariantClassifier, assign_clusters, generate_subunit_data
+
+    classifier = VariantClassifier.from_config()
+    presence_file = workdir / "benchmark" / "presence.parquet"
+
+    if stage == 'clustering':
+        hits = load_hits(config.HIT_STORE_FILE, columns=['Accession', 'Subunit', 'Start', 'End', 'Strand'])
+        _, bool_table = generate_subunit_data(assign_clusters(hits), classifier.subunits)
+        bool_table['Accession'] = bool_table['Accession'].astype(str)
+        bool_table.to_parquet(presence_file, index=False)
+        report = {'items': len(hits)}
+    else:
+        bool_table = classifier.classify(pd.read_parquet(presence_file))
+        truth = pd.read_csv(workdir / "benchmark" / "truth.csv")
+        keys = ['Accession', 'Strand']
+        predicted = bool_table.rename(columns={'Variation': 'Variant'}).value_counts(keys + ['Variant'])
+        expected = truth.value_counts(keys + ['Variant'])
+        matched = pd.concat([predicted, expected], axis=1).fillna(0).min(axis=1).sum()
+        report = {'items': len(bool_table), 'accuracy': round(float(matched / max(len(truth), 1)), 4)}
+
+    with open(workdir / "benchmark" / f"{stage}.json", 'w') as handle:
+        json.dump(report, handle)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic genomes, proteomes and HMMER results.")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR,
+                        help="Benchmark project root; becomes NUOHMMER_BASE_DIR for every stage")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES), help="Stages to run, in order")
+    parser.add_argument("--genomes", type=int, default=50, help="Number of synthetic genomes")
+    parser.add_argument("--genes-per-genome", type=int, default=1000, help="Background genes per genome")
+    parser.add_argument("--genome-length", type=int, default=1_000_000, help="Nominal genome length in bp")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic dataset")
+    parser.add_argument("--workers", type=int, default=None, help="--workers passed to the stages that take it")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the dataset even if one of the same scale exists")
+    parser.add_argument("--label", default="", help="Free-text label stored with the run (e.g. the optimisation tested)")
+    parser.add_argument("--history", type=Path, default=None,
+                        help=f"JSONL file every run is appended to (default: <workdir>/benchmark/{HISTORY_FILE_NAME})")
+    parser.add_argument("--baseline", type=Path, default=None,
+                        help=f"Run that regressions are checked against (default: <workdir>/benchmark/{BASELINE_FILE_NAME})")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown or memory growth flagged as a regression (default: 0.2 = 20%%)")
+    parser.add_argument("--run-analysis", choices=['clustering', 'classification'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir.resolve()
+    if args.run_analysis:
+        run_analysis(args.run_analysis, workdir)
+        sys.exit(0)
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    config = load_config(workdir)
+    (workdir / "benchmark").mkdir(parents=True, exist_ok=True)
+    history_file = args.history or workdir / "benchmark" / HISTORY_FILE_NAME
+    baseline_file = args.baseline or workdir / "benchmark" / BASELINE_FILE_NAME
+
+    scale = scale_settings(args)
+    counts = prepare_dataset(config, workdir, scale, args.regenerate, args.workers)
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'commit': git_commit(),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'scale': scale,
+        'workers': args.workers,
+        'dataset': counts,
+        'stages': run_benchmark(config, workdir, args.stages, counts, args.workers),
+    }
+
+    with open(history_file, 'a') as handle:
+        handle.write(json.dumps(run) + "\n")
+    logging.info(f"📝 Appended run to {history_file}")
+
+    baseline = None
+    if baseline_file.exists():
+        with open(baseline_file, 'r') as handle:
+            baseline = json.load(handle)
+    print(summary_table(run, baseline))
+
+    regressions = compare_runs(run, baseline, args.tolerance) if baseline is not None else []
+    for regression in regressions:
+        logging.warning(f"🐢 Regression in {regression}")
+
+    if args.save_baseline:
+        with open(baseline_file, 'w') as handle:
+            json.dump(run, handle, indent=2)
+        logging.info(f"📌 Saved this run as the baseline: {baseline_file}")
+
+    failed = [stage for stage, result in run['stages'].items() if result['returncode'] != 0]
+    sys.exit(1 if regressions or failed else 0)
@@ -0,0 +1,293 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Default subunit list and Complex I variant definitions
+VARIANTS_FILE = Path(__file__).parent / "complex_i_variants.json"
+
+# Prodigal headers: "# start # end # strand # ID=..."
+STRAND_PATTERN = r'^\s*#\s*\d+\s*#\s*\d+\s*#\s*(-?1)\s*#'
+
+def extract_strand(sequence_desc):
+    """
+    Parses the coding strand (1 or -1) from prodigal sequence descriptions.
+
+    Args:
+        sequence_desc (pd.Series): `SequenceDesc` values from the HMMER results.
+
+    Returns:
+        pd.Series: int64 strand per hit, 0 where the description carries no strand.
+    """
+    strand = sequence_desc.astype(str).str.extract(STRAND_PATTERN, expand=False)
+    return pd.to_numeric(strand, errors='coerce').fillna(0).astype(np.int64)
+
+def cluster_hits_with_strand(df, intergenic_distance=250):
+    """
+    Groups the hits of one replicon into gene clusters (reference implementation).
+
+    Hits are walked in order of start position; a new cluster starts whenever the strand
+    changes or the gap between a hit's start and the previous hit's end exceeds
+    `intergenic_distance`. Clusters are numbered from 0 within the replicon. Intended for
+    `results.groupby('Accession', group_keys=False).apply(...)`; use `assign_clusters`
+    for whole tables.
+
+    Args:
+        df (pd.DataFrame): Hits of a single Accession with Start, End and SequenceDesc.
+        intergenic_distance (int): Largest gap (bp) between neighbouring hits of a cluster.
+
+    Returns:
+        pd.DataFrame: The hits sorted by Start with `Strand` and `Cluster` columns.
+    """
+    df = df.sort_values('Start', kind='stable').copy()
+    if 'Strand' not in df.columns:
+        df['Strand'] = extract_strand(df['SequenceDesc'])
+
+    clusters, cluster = [], 0
+    previous_end, previous_strand = None, None
+    for start, end, strand in zip(df['Start'], df['End'], df['Strand']):
+        if previous_end is not None and (strand != previous_strand or start - previous_end > intergenic_distance):
+            cluster += 1
+        clusters.append(cluster)
+        previous_end, previous_strand = end, strand
+
+    df['Cluster'] = clusters
+    return df
+
+def _sorted_hits(results):
+    """Sorts hits by (Accession, Start), keeping input order for ties; returns the frame and its accession codes."""
+    accession_codes, _ = pd.factorize(results['Accession'], sort=True)
+    order = np.lexsort((results['Start'].to_numpy(), accession_codes))
+    hits = results.iloc[order].reset_index(drop=True)
+    if 'Strand' not in hits.columns:
+        hits['Strand'] = extract_strand(hits['SequenceDesc'])
+    return hits, accession_codes[order]
+
+def assign_clusters(results, intergenic_distance=250):
+    """
+    Vectorised `cluster_hits_with_strand` over all replicons at once.
+
+    Sorts the table once by (Accession, Start) and derives cluster boundaries from NumPy
+    differences between neighbouring rows, then numbers clusters with a cumulative sum
+    that restarts at 0 for every Accession. Labels and row order match
+    `results.groupby('Accession', group_keys=False).apply(cluster_hits_with_strand, ...)
+    .reset_index(drop=True)`.
+
+    Args:
+        results (pd.DataFrame): HMMER hits with Accession, Start, End and SequenceDesc.
+        intergenic_distance (int): Largest gap (bp) between neighbouring hits of a cluster.
+
+    Returns:
+        pd.DataFrame: The hits sorted by (Accession, Start) with `Strand` and `Cluster` columns.
+    """
+    clustered, accession = _sorted_hits(results)
+    strand = clustered['Strand'].to_numpy()
+    start, end = clustered['Start'].to_numpy(np.int64), clustered['End'].to_numpy(np.int64)
+
+    new_accession = np.ones(len(clustered), dtype=bool)
+    new_accession[1:] = accession[1:] != accession[:-1]
+    boundary = np.zeros(len(clustered), dtype=bool)
+    boundary[1:] = (strand[1:] != strand[:-1]) | (start[1:] - end[:-1] > intergenic_distance)
+    boundary &= ~new_accession
+
+    cluster_ids = np.cumsum(boundary)
+    clustered['Cluster'] = cluster_ids - cluster_ids[np.flatnonzero(new_accession)][np.cumsum(new_accession) - 1]
+    return clustered
+
+def generate_subunit_data(results, subunits):
+    """
+    Counts subunit hits per gene cluster.
+
+    Args:
+        results (pd.DataFrame): Clustered hits with Accession, Cluster, Strand and Subunit.
+        subunits (list): Subunit columns to report, in order.
+
+    Returns:
+        tuple: (count table, boolean presence table), both keyed by Accession, Cluster and Strand.
+    """
+    count_table = (
+        results.groupby(['Accession', 'Cluster', 'Strand', 'Subunit'], observed=True)
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=subunits, fill_value=0)
+        .reset_index()
+    )
+    count_table.columns.name = None
+
+    bool_table = count_table.copy()
+    bool_table[subunits] = bool_table[subunits].ge(1)
+    return count_table, bool_table
+
+class VariantClassifier:
+    """
+    Classifies subunit presence into Complex I variants through a bitmask lookup table.
+
+    Each row's presence across `subunits` is encoded as an integer with bit i set when
+    subunit i is present (16 bits for the full Nuo set). A table indexed by every possible
+    mask holds the matching variant, so classification is a few column-wise shifts and one array
+    lookup, independent of the number of variants. A row matches a variant when exactly the
+    variant's subunits are present; a later definition with the same subunits wins, as it
+    did in the column-mask implementation.
+    """
+
+    MAX_SUBUNITS = 24  # Lookup table of 2**24 one-byte entries
+
+    def __init__(self, variants, subunits, default='Nuo-Partial'):
+        if len(subunits) > self.MAX_SUBUNITS:
+            raise ValueError(f"At most {self.MAX_SUBUNITS} subunits can be encoded, got {len(subunits)}")
+        if len(variants) > 254:
+            raise ValueError("At most 254 variants are supported")
+
+        self.subunits = list(subunits)
+        self.labels = np.array(list(variants) + [default], dtype=object)
+        self.default_code = len(variants)
+        self.bits = {subunit: 1 << i for i, subunit in enumerate(self.subunits)}
+
+        self.lookup = np.full(1 << len(self.subunits), self.default_code, dtype=np.uint8)
+        for code, (name, variant_subunits) in enumerate(variants.items()):
+            if set(variant_subunits) <= set(self.subunits):  # Variants needing unknown subunits never match
+                self.lookup[self.encode_subunits(variant_subunits)] = code
+
+    @classmethod
+    def from_config(cls, config_file=VARIANTS_FILE, subunits=None):
+        """
+        Builds a classifier from a JSON file with "subunits", "variants" and "default" keys.
+
+        Args:
+            config_file (Path): Variant definition file.
+            subunits (list): Overrides the file's subunit list, e.g. with the columns of a table.
+        """
+        with open(config_file, 'r') as handle:
+            config = json.load(handle)
+        return cls(config["variants"], subunits or config["subunits"], config.get("default", 'Nuo-Partial'))
+
+    def encode_subunits(self, subunits):
+        """Returns the presence mask of a collection of subunit names."""
+        return sum(self.bits[subunit] for subunit in set(subunits))
+
+    def encode(self, presence_table):
+        """
+        Encodes subunit presence per row as integer bitmasks.
+
+        Args:
+            presence_table (pd.DataFrame): Boolean or count columns for every classifier subunit.
+
+        Returns:
+            np.ndarray: One uint32 presence mask per row.
+        """
+        masks = np.zeros(len(presence_table), dtype=np.uint32)
+        for i, subunit in enumerate(self.subunits):
+            masks |= (presence_table[subunit].to_numpy() != 0).astype(np.uint32) << i
+        return masks
+
+    def classify_masks(self, masks):
+        """Returns the variant name for each presence mask."""
+        return self.labels[self.lookup[masks]]
+
+    def classify(self, presence_table, column='Variation'):
+        """Adds the variant of every row as `column` and returns the table."""
+        presence_table[column] = self.classify_masks(self.encode(presence_table))
+        return presence_table
+
+    def classify_chunks(self, chunks, column='Variation'):
+        """
+        Classifies an iterable of tables one at a time, for out-of-core inputs.
+
+        Args:
+            chunks (iterable): DataFrames, e.g. from `pd.read_csv(..., chunksize=...)` or
+                Parquet record batches converted with `to_pandas()`.
+
+        Yields:
+            pd.DataFrame: Each chunk with its `column` added.
+        """
+        for chunk in chunks:
+            yield self.classify(chunk, column)
+
+def classify_complex_types(bool_table, combinations, all_subunits):
+    """
+    Labels each row with the Complex I variant whose subunits it has exactly.
+
+    Args:
+        bool_table (pd.DataFrame): Subunit presence table.
+        combinations (dict): Variant name -> list of its subunits.
+        all_subunits (list): Every subunit column in `bool_table`.
+
+    Returns:
+        pd.DataFrame: `bool_table` with a `Variation` column ('Nuo-Partial' if nothing matches).
+    """
+    return VariantClassifier(combinations, all_subunits).classify(bool_table)
+
+def intergenic_distance_sweep(results, intergenic_distances, combinations, all_subunits, species_column='Species'):
+    """
+    Counts species per Complex I variation for every intergenic distance in one pass.
+
+    Equivalent to running `assign_clusters`, `generate_subunit_data`,
+    `classify_complex_types` and the species counts once per distance, but the hits are
+    sorted and their gaps computed only once. Clusters only merge as the distance grows, so
+    distances are processed in increasing order and each step OR-reduces the previous
+    step's per-cluster subunit bitmasks across the boundaries whose gap no longer exceeds
+    the distance. The work per step shrinks with the number of clusters left.
+
+    Args:
+        results (pd.DataFrame): HMMER hits with Accession, Start, End, SequenceDesc, Subunit
+            and `species_column`.
+        intergenic_distances (iterable): Distances (bp) to evaluate.
+        combinations (dict): Variant name -> list of its subunits.
+        all_subunits (list): Subunits considered when matching variants.
+        species_column (str): Column identifying the species of each Accession.
+
+    Returns:
+        pd.DataFrame: One row per distance with `Intergenic_Distance`, the number of species
+            having each variant, `NuoCore` (species with any complete variant) and
+            `Nuo-Partial` (species with hits but no complete variant).
+    """
+    if len(combinations) > 62:
+        raise ValueError("At most 62 variants can be counted per species bitmask")
+
+    classifier = VariantClassifier(combinations, all_subunits)
+    results = results[results['Accession'].notna()]
+    hits, accession = _sorted_hits(results)
+    unit_mask = hits['Subunit'].astype(object).map(classifier.bits).fillna(0).to_numpy(np.int64)
+    unit_has_subunit = hits['Subunit'].notna().to_numpy()
+    unit_accession = accession
+
+    # Gap before each hit; replicon and strand changes always separate clusters
+    strand = hits['Strand'].to_numpy()
+    start, end = hits['Start'].to_numpy(np.int64), hits['End'].to_numpy(np.int64)
+    boundary_gap = start[1:] - end[:-1]
+    boundary_gap[(accession[1:] != accession[:-1]) | (strand[1:] != strand[:-1])] = np.iinfo(np.int64).max
+
+    variant_names, partial_code = list(combinations), classifier.default_code
+
+    # Accession -> species pairs; an Accession may belong to several species
+    pairs = results[['Accession', species_column]].dropna().drop_duplicates()
+    accession_labels = np.sort(results['Accession'].dropna().astype(object).unique())
+    pair_accession = np.searchsorted(accession_labels, pairs['Accession'].to_numpy(dtype=object))
+    pair_species, species_labels = pd.factorize(pairs[species_column])
+
+    counts_by_distance = {}
+    for distance in sorted(set(intergenic_distances)):
+        keep = boundary_gap > distance
+        starts = np.concatenate(([0], np.flatnonzero(keep) + 1))
+        unit_mask = np.bitwise_or.reduceat(unit_mask, starts)
+        unit_has_subunit = np.logical_or.reduceat(unit_has_subunit, starts)
+        unit_accession, boundary_gap = unit_accession[starts], boundary_gap[keep]
+
+        # Clusters without any subunit hit are not rows of the bool table
+        codes = classifier.lookup[unit_mask].astype(np.int64)
+        variant_bits = np.where(unit_has_subunit, np.left_shift(1, codes), 0)
+
+        accession_bits = np.zeros(len(accession_labels), dtype=np.int64)
+        np.bitwise_or.at(accession_bits, unit_accession, variant_bits)
+        species_bits = np.zeros(len(species_labels), dtype=np.int64)
+        np.bitwise_or.at(species_bits, pair_species, accession_bits[pair_accession])
+
+        complete_bits = (1 << partial_code) - 1
+        row = {name: int(np.count_nonzero(species_bits & (1 << code))) for code, name in enumerate(variant_names)}
+        row['NuoCore'] = int(np.count_nonzero(species_bits & complete_bits))
+        row['Nuo-Partial'] = int(np.count_nonzero((species_bits != 0) & (species_bits & complete_bits == 0)))
+        counts_by_distance[distance] = row
+
+    return pd.DataFrame([
+        {'Intergenic_Distance': distance, **counts_by_distance[distance]} for distance in intergenic_distances
+    ])
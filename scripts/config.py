@@ -1,12 +1,15 @@
+import os
 from pathlib import Path
 
-BASE_DIR = Path("/Users/akshayonly/Work/Submission-Data/demo")
+# NUOHMMER_BASE_DIR overrides the project root, e.g. to run against synthetic benchmark data
+BASE_DIR = Path(os.environ.get("NUOHMMER_BASE_DIR", "/Users/akshayonly/Work/Submission-Data/demo"))
 
 # Data directories
 SEQUENCE_DATA_DIR = BASE_DIR / "data/sequence_data"
 GENOMES_DIR = SEQUENCE_DATA_DIR / "genomes"
 CDS_DIR = SEQUENCE_DATA_DIR / "cds"
 PROTEOMES_DIR = SEQUENCE_DATA_DIR / "proteomes"
+PROTEOME_INDEX_FILE = SEQUENCE_DATA_DIR / "proteome_index.sqlite"
 
 # Metadata directories
 GENOMIC_METADATA_DIR = BASE_DIR / "data/genomic_metadata"
@@ -14,6 +17,9 @@ GENOME_METADATA_DIR = GENOMIC_METADATA_DIR / "genome_metadata"
 NCBI_GENOME_RECORDS_DIR = GENOMIC_METADATA_DIR / "ncbi_genome_records"
 CDS_METADATA_DIR = BASE_DIR / "data/cds_metadata"
 
+# External metadata directory
+EXTERNAL_METADATA_DIR = BASE_DIR / "data/external_metadata"
+
 # HMM analysis
 HMM_ANALYSIS_DIR = BASE_DIR / "data/hmm_data"
 HMM_PROFILES_DIR = HMM_ANALYSIS_DIR / "profiles"
@@ -22,11 +28,31 @@ HMM_CDS_SEQS_DIR = HMM_ANALYSIS_DIR / "cds_prot_seqs"
 HMM_CLUST_SEQS_DIR = HMM_ANALYSIS_DIR / "clustered_prot_seqs"
 HMM_MSA_SEQS_DIR = HMM_ANALYSIS_DIR / "clustered_msa_seqs"
 HMM_COMBINED_SEQS_DIR = HMM_ANALYSIS_DIR / "combined_interpro_cds_seqs"
+HMM_PROTEOMES_DIR = PROTEOMES_DIR
+HMM_PROTEOME_SHARDS_DIR = SEQUENCE_DATA_DIR / "proteome_shards"
+HMM_RESULTS_DIR = HMM_ANALYSIS_DIR / "results"
+HMM_HIT_TABLES_DIR = HMM_RESULTS_DIR / "hit_tables"
+HMM_PREFILTERED_RESULTS_DIR = HMM_ANALYSIS_DIR / "prefiltered_results"
+HIT_STORE_FILE = HMM_RESULTS_DIR / "hit_store.sqlite"
+PAIRWISE_CACHE_FILE = HMM_ANALYSIS_DIR / "pairwise_alignment_cache.sqlite"
 
 # Output directories
 OUTPUT_DIR = SEQUENCE_DATA_DIR / "clustered_protein_sequences"
+# Per-run resource reports (JSON) and profiler dumps of the pipeline scripts
+RUN_REPORTS_DIR = BASE_DIR / "run_reports"
 
 # Specific file paths
 PROKARYOTES_FILE = NCBI_GENOME_RECORDS_DIR / "prokaryotes.txt"
 GENOME_DATASET_FILE = GENOME_METADATA_DIR / "genomes_dataset.csv"
+TAXONOMY_FILE = NCBI_GENOME_RECORDS_DIR / "taxonomy.csv"
+TAXONOMY_CACHE_DIR = NCBI_GENOME_RECORDS_DIR / "taxonomy_cache"
+ASSEMBLY_SNAPSHOT_FILE = NCBI_GENOME_RECORDS_DIR / "assemblies_snapshot.csv"
+ASSEMBLY_DELTA_FILE = NCBI_GENOME_RECORDS_DIR / "assembly_delta.csv"
+GENOME_METADATA_FILE = GENOME_METADATA_DIR / "genomes_metadata.csv"
 NUO_CDS_FILE = CDS_METADATA_DIR / "cds_subunits_metadata/nuo_cds_prescreened.csv"
+
+# InterPro classification file
+INTERPRO_CSV = EXTERNAL_METADATA_DIR / "nuo_interpro_classification_accessions.csv"
+
+# Local NCBI taxdump (nodes.dmp, names.dmp, merged.dmp); used instead of taxonkit when present
+TAXDUMP_DIR = EXTERNAL_METADATA_DIR / "taxdump"
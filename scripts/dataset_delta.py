@@ -0,0 +1,133 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Columns kept per assembly in the snapshot that the next refresh is diffed against
+SNAPSHOT_COLUMNS = ['Assembly Accession', 'Assembly', 'GenomePath', 'CDSPath']
+DELTA_COLUMNS = ['Change', 'Assembly Accession', 'PreviousAccession', 'Assembly', 'PreviousAssembly',
+                 'GenomePath', 'CDSPath']
+
+def assembly_from_file(file_name):
+    """
+    Returns the versioned assembly accession an NCBI-derived file or URL name starts with.
+
+    Genome, CDS and proteome files and their HMMER results all carry the assembly directory
+    name as prefix (`GCA_000504565.2_ASM50456v2_cds_proteins.faa` -> `GCA_000504565.2`).
+    """
+    return "_".join(Path(file_name).name.split("_", 2)[:2])
+
+def split_accession(accessions):
+    """Splits `GCA_000504565.2` style accessions into (unversioned accession, integer version) Series."""
+    parts = accessions.str.split(".", n=1, expand=True).reindex(columns=[0, 1])
+    return parts[0], pd.to_numeric(parts[1], errors='coerce').fillna(0).astype(np.int64)
+
+def snapshot_assemblies(records):
+    """
+    Reduces processed prokaryotes.txt rows to one row per assembly for the refresh snapshot.
+
+    Args:
+        records (pd.DataFrame): Rows with Assembly Accession, GenomePath and CDSPath.
+
+    Returns:
+        pd.DataFrame: SNAPSHOT_COLUMNS, where Assembly is the accession the downloaded
+            files are named by.
+    """
+    snapshot = records[['Assembly Accession', 'GenomePath', 'CDSPath']].drop_duplicates('Assembly Accession').copy()
+    snapshot['Assembly'] = snapshot['GenomePath'].map(assembly_from_file)
+    return snapshot[SNAPSHOT_COLUMNS].reset_index(drop=True)
+
+def diff_assemblies(previous, current):
+    """
+    Compares two assembly snapshots by unversioned accession and version.
+
+    Args:
+        previous (pd.DataFrame): Snapshot from the last run.
+        current (pd.DataFrame): Snapshot from this run.
+
+    Returns:
+        pd.DataFrame: DELTA_COLUMNS with one row per added, removed or updated (new
+            version) assembly.
+    """
+    frames = []
+    for snapshot in (previous, current):
+        base, version = split_accession(snapshot['Assembly Accession'])
+        frames.append(snapshot.assign(Base=base, Version=version).drop_duplicates('Base', keep='last'))
+
+    merged = frames[0].merge(frames[1], on='Base', how='outer', suffixes=('Previous', ''), indicator=True)
+    merged['Change'] = np.select(
+        [merged['_merge'].eq('right_only'), merged['_merge'].eq('left_only'),
+         merged['Version'].ne(merged['VersionPrevious'])],
+        ['added', 'removed', 'updated'],
+        default=''
+    )
+    delta = merged[merged['Change'] != ''].rename(
+        columns={'Assembly AccessionPrevious': 'PreviousAccession', 'AssemblyPrevious': 'PreviousAssembly'}
+    )
+    return delta[DELTA_COLUMNS].sort_values(['Change', 'Assembly Accession']).reset_index(drop=True)
+
+class AssemblyDelta:
+    """
+    Added, removed and updated assemblies between two prokaryotes.txt snapshots.
+
+    Downstream steps run with `--delta` use it to process only the files of fresh
+    (added or updated) assemblies and to drop everything derived from stale ones
+    (removed assemblies and the previous version of updated ones). Files are matched on
+    the versioned assembly accession their names start with.
+    """
+
+    def __init__(self, delta):
+        self.delta = delta
+        fresh = delta[delta['Change'].isin(['added', 'updated'])]
+        stale = delta[delta['Change'].isin(['removed', 'updated'])]
+        self.fresh = set(fresh['Assembly'])
+        self.stale = set(stale['PreviousAssembly'])
+
+    @classmethod
+    def from_file(cls, delta_file):
+        delta_file = Path(delta_file)
+        if not delta_file.exists():
+            raise FileNotFoundError(f"No assembly delta at {delta_file}; run 02_fetch_taxonomy_prepare_downloads.py --refresh")
+        return cls(pd.read_csv(delta_file, dtype=str).fillna(''))
+
+    def counts(self):
+        """Returns the number of assemblies per change type."""
+        return self.delta['Change'].value_counts().reindex(['added', 'removed', 'updated'], fill_value=0).to_dict()
+
+    def is_fresh(self, file_name):
+        return assembly_from_file(file_name) in self.fresh
+
+    def is_affected(self, file_name):
+        """True for files whose existing rows are replaced by the delta (stale or fresh assemblies)."""
+        assembly = assembly_from_file(file_name)
+        return assembly in self.stale or assembly in self.fresh
+
+    def urls(self, column):
+        """Returns the download URLs of fresh assemblies from GenomePath or CDSPath."""
+        return [url for url in self.delta.loc[self.delta['Change'].isin(['added', 'updated']), column] if url]
+
+    def remove_stale_files(self, paths):
+        """Deletes files that belong to stale assemblies; returns how many were removed."""
+        removed = 0
+        for path in paths:
+            if assembly_from_file(path.name) in self.stale:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def apply(self, existing, fresh_rows, file_column):
+        """
+        Replaces the rows of affected assemblies in an existing table with freshly computed ones.
+
+        Args:
+            existing (pd.DataFrame): Table from the previous run.
+            fresh_rows (pd.DataFrame): Rows computed for the fresh assemblies only.
+            file_column (str): Column naming the source file of each row (e.g. GenomeFile).
+
+        Returns:
+            pd.DataFrame: The updated table.
+        """
+        affected = existing[file_column].map(self.is_affected).astype(bool)
+        logging.info(f"🔁 Delta update: {affected.sum()} rows replaced by {len(fresh_rows)} fresh rows")
+        return pd.concat([existing[~affected], fresh_rows], ignore_index=True)
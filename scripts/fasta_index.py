@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tqdm import tqdm
+
+try:
+    from isal import igzip as gzip  # ISA-L decompression is several times faster than zlib
+except ImportError:
+    import gzip
+
+READ_BUFFER_SIZE = 16 << 20
+
+def open_binary(fasta_path):
+    """Opens a plain or gzip-compressed FASTA file for binary reading."""
+    if str(fasta_path).endswith(".gz"):
+        return gzip.open(fasta_path, "rb")
+    return open(fasta_path, "rb")
+
+def scan_record_offsets(fasta_path):
+    """
+    Scans a FASTA file for record boundaries.
+
+    Offsets are positions in the uncompressed stream, so they are valid for `.gz` files
+    read through `gzip.open` as well.
+
+    Args:
+        fasta_path (Path): FASTA file to scan.
+
+    Returns:
+        list: (sequence ID, offset, length in bytes) for every record.
+    """
+    records = []
+    key, start, offset = None, 0, 0
+    with open_binary(fasta_path) as handle:
+        for line in handle:
+            if line.startswith(b">"):
+                if key is not None:
+                    records.append((key, start, offset - start))
+                key, start = line[1:].split(None, 1)[0].decode(), offset
+            offset += len(line)
+    if key is not None:
+        records.append((key, start, offset - start))
+    return records
+
+def scan_record_lengths(fasta_path, buffer_size=READ_BUFFER_SIZE):
+    """
+    Streams a FASTA file and measures every record without building sequence objects.
+
+    The file is read in large blocks; residues are counted as block bytes minus line
+    breaks, so memory use stays at one block however long the sequences are.
+
+    Args:
+        fasta_path (Path): Plain or gzip-compressed FASTA file.
+        buffer_size (int): Bytes per read.
+
+    Returns:
+        list: (header, sequence length) for every record, the header without the `>`.
+    """
+    records = []
+    header, length, in_header = None, 0, False
+    with open_binary(fasta_path) as handle:
+        while block := handle.read(buffer_size):
+            position, block_end = 0, len(block)
+            while position < block_end:
+                if in_header:
+                    newline = block.find(b"\n", position)
+                    if newline == -1:
+                        header += block[position:]
+                        break
+                    header += block[position:newline]
+                    in_header, position = False, newline + 1
+                else:
+                    next_header = block.find(b">", position)
+                    segment_end = block_end if next_header == -1 else next_header
+                    length += (segment_end - position) - block.count(b"\n", position, segment_end) \
+                        - block.count(b"\r", position, segment_end)
+                    if next_header == -1:
+                        break
+                    if header is not None:
+                        records.append((header.decode().rstrip(), length))
+                    header, length, in_header = bytearray(), 0, True
+                    position = next_header + 1
+    if header is not None:
+        records.append((header.decode().rstrip(), length))
+    return records
+
+def read_fai_lengths(fasta_path):
+    """
+    Reads record headers and lengths using a samtools `.fai` index next to the file.
+
+    Lengths come from the index; headers are read by seeking to the line that precedes
+    each record's first residue, so the sequence itself is never read. Only uncompressed
+    files are supported, since seeking in a gzip stream means decompressing up to it.
+
+    Args:
+        fasta_path (Path): Uncompressed FASTA file with a `<file>.fai` index.
+
+    Returns:
+        list: (header, sequence length) for every record, or None if no usable index exists.
+    """
+    fai_path = Path(f"{fasta_path}.fai")
+    if str(fasta_path).endswith(".gz") or not fai_path.exists() \
+            or fai_path.stat().st_mtime_ns < os.stat(fasta_path).st_mtime_ns:
+        return None
+
+    records = []
+    with open(fai_path) as index, open(fasta_path, "rb") as handle:
+        for line in index:
+            name, length, offset = line.split("\t")[:3]
+            offset, window = int(offset), 4096
+            # The header line ends just before the first residue; widen the window until it is covered
+            while True:
+                start = max(0, offset - window)
+                handle.seek(start)
+                text = handle.read(offset - start).rstrip(b"\r\n")
+                header_start = text.rfind(b">")
+                if header_start != -1 or start == 0:
+                    break
+                window *= 4
+            header = text[header_start + 1:].decode().rstrip()
+            if header.split(None, 1)[:1] != [name]:
+                return None
+            records.append((header, int(length)))
+    return records
+
+def record_lengths(fasta_path):
+    """Returns (header, sequence length) per record, from the `.fai` index when possible."""
+    return read_fai_lengths(fasta_path) or scan_record_lengths(fasta_path)
+
+def parse_record(raw):
+    """Splits raw FASTA record bytes into (description, sequence)."""
+    lines = raw.decode().splitlines()
+    return lines[0][1:].rstrip(), "".join(line.strip() for line in lines[1:])
+
+class FastaIndex:
+    """
+    Persistent SQLite index of record offsets across many FASTA files.
+
+    Each record is keyed on its sequence ID (the first word of the header) and stored with
+    its file, byte offset and length, so records can be fetched by direct seek instead of
+    re-parsing whole files. Files are re-indexed only when their size or mtime changes.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.index_file)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                key TEXT NOT NULL,
+                file_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_key ON records (key);
+            CREATE INDEX IF NOT EXISTS records_file ON records (file_id);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stale_files(self, fasta_paths):
+        """Returns the files that are missing from the index or changed since they were indexed."""
+        indexed = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.connection.execute("SELECT path, size, mtime_ns FROM files")
+        }
+        stale = []
+        for fasta_path in fasta_paths:
+            stat = os.stat(fasta_path)
+            if indexed.get(str(fasta_path)) != (stat.st_size, stat.st_mtime_ns):
+                stale.append(Path(fasta_path))
+        return stale
+
+    def update(self, fasta_paths, workers=None):
+        """
+        Indexes new or changed FASTA files, scanning them across a process pool.
+
+        Args:
+            fasta_paths (list): FASTA files that should be covered by the index.
+            workers (int): Number of worker processes (default: number of CPUs).
+        """
+        stale = self.stale_files(fasta_paths)
+        if not stale:
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            scans = executor.map(scan_record_offsets, stale, chunksize=16)
+            for fasta_path, records in tqdm(zip(stale, scans), total=len(stale), desc="Indexing FASTA files"):
+                stat = os.stat(fasta_path)
+                with self.connection:
+                    row = self.connection.execute("SELECT file_id FROM files WHERE path = ?", (str(fasta_path),)).fetchone()
+                    if row:
+                        self.connection.execute("DELETE FROM records WHERE file_id = ?", row)
+                        self.connection.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE file_id = ?",
+                                                (stat.st_size, stat.st_mtime_ns, row[0]))
+                        file_id = row[0]
+                    else:
+                        file_id = self.connection.execute(
+                            "INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)",
+                            (str(fasta_path), stat.st_size, stat.st_mtime_ns)
+                        ).lastrowid
+                    self.connection.executemany(
+                        "INSERT INTO records (key, file_id, offset, length) VALUES (?, ?, ?, ?)",
+                        ((key, file_id, offset, length) for key, offset, length in records)
+                    )
+
+        logging.info(f"✅ Indexed {len(stale)} FASTA files into {self.index_file}")
+
+    def locate(self, keys, fasta_path=None):
+        """
+        Looks up where records are stored.
+
+        Args:
+            keys (iterable): Sequence IDs to look up.
+            fasta_path (Path): Restrict the lookup to one file.
+
+        Returns:
+            dict: Maps each found key to a list of (path, offset, length) locations.
+        """
+        query = """
+            SELECT records.key, files.path, records.offset, records.length
+            FROM records JOIN files USING (file_id)
+            WHERE records.key = ?
+        """
+        params = ()
+        if fasta_path is not None:
+            query += " AND files.path = ?"
+            params = (str(fasta_path),)
+
+        locations = defaultdict(list)
+        for key in keys:
+            for found_key, path, offset, length in self.connection.execute(query, (key,) + params):
+                locations[found_key].append((path, offset, length))
+        return dict(locations)
+
+    def fetch(self, requests):
+        """
+        Reads records by direct seek, opening each file once and reading in offset order.
+
+        Args:
+            requests (iterable): (fasta_path, key) pairs to fetch.
+
+        Yields:
+            tuple: (fasta_path, key, description, sequence) for every request found in the
+                index, grouped by file in order of first appearance and in file order within
+                each file.
+        """
+        keys_by_file = defaultdict(set)
+        for fasta_path, key in requests:
+            keys_by_file[str(fasta_path)].add(key)
+
+        for fasta_path, keys in keys_by_file.items():
+            locations = sorted(
+                (offset, length, key)
+                for key, found in self.locate(keys, fasta_path).items()
+                for _, offset, length in found
+            )
+            missing = len(keys) - len({key for _, _, key in locations})
+            if missing:
+                logging.warning(f"⚠️ {missing} requested records not found in index for {fasta_path}")
+            if not locations:
+                continue
+
+            with open_binary(fasta_path) as handle:
+                for offset, length, key in locations:
+                    handle.seek(offset)
+                    description, sequence = parse_record(handle.read(length))
+                    yield Path(fasta_path), key, description, sequence
@@ -0,0 +1,20 @@
+import os
+import hashlib
+from pathlib import Path
+
+def file_digest(path, block_size=1 << 20):
+    """Returns a BLAKE2b content digest of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as handle:
+        while block := handle.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+def atomic_output(path):
+    """Returns the temporary path a result is written to before being renamed into place."""
+    path = Path(path)
+    return path.with_name(path.name + ".tmp")
+
+def commit_output(path):
+    """Atomically moves a finished temporary output onto its final path."""
+    os.replace(atomic_output(path), path)
@@ -0,0 +1,71 @@
+import logging
+from collections import defaultdict
+from pathlib import Path
+from tqdm import tqdm
+from fasta_index import FastaIndex
+
+FASTA_LINE_LENGTH = 60  # Matches SeqIO.write
+
+def write_fasta_record(handle, description, sequence, line_length=FASTA_LINE_LENGTH):
+    """Writes one FASTA record, wrapping the sequence like `SeqIO.write`."""
+    handle.write(f">{description}\n")
+    for i in range(0, len(sequence), line_length):
+        handle.write(sequence[i:i + line_length] + "\n")
+
+def extract_hit_sequences(hits, proteomes_dir, index_file, output_dir, file_name="{subunit}_hits.fasta", workers=None):
+    """
+    Writes the protein sequences of HMMER hits to one FASTA file per subunit.
+
+    Records are located through a persistent FastaIndex of protein accession ->
+    (proteome file, offset, length), so each proteome is indexed once and later extractions
+    (e.g. after changing an E-value cutoff) read only the hit records. All subunits are
+    served in a single pass: every proteome is opened once, its records are read in
+    offset order and streamed to the subunit files as they are read.
+
+    Args:
+        hits (pd.DataFrame): Hits with ProteomeFile, ProteinAccession and Subunit.
+        proteomes_dir (Path): Directory holding the proteome FASTA files.
+        index_file (Path): SQLite index file, created or updated as needed.
+        output_dir (Path): Directory for the per-subunit FASTA files.
+        file_name (str): Output file name template with a `{subunit}` field.
+        workers (int): Processes used to index new or changed proteomes.
+
+    Returns:
+        dict: Number of sequences written per subunit.
+    """
+    proteomes_dir, output_dir = Path(proteomes_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    hits = hits[['ProteomeFile', 'ProteinAccession', 'Subunit']].drop_duplicates().sort_values(['ProteomeFile', 'Subunit'])
+
+    proteome_files = []
+    for proteome_file in hits['ProteomeFile'].unique():
+        proteome_path = proteomes_dir / proteome_file
+        if proteome_path.exists():
+            proteome_files.append(proteome_path)
+        else:
+            logging.warning(f"⚠️ Proteome file not found: {proteome_path}")
+
+    # A protein can be a hit for several subunits
+    wanted = defaultdict(list)
+    for proteome_file, accession, subunit in hits.itertuples(index=False):
+        wanted[(proteomes_dir / proteome_file, accession)].append(subunit)
+
+    subunits = sorted(hits['Subunit'].unique())
+    counts = dict.fromkeys(subunits, 0)
+    handles = {subunit: open(output_dir / file_name.format(subunit=subunit), 'w') for subunit in subunits}
+    try:
+        with FastaIndex(index_file) as index:
+            index.update(proteome_files, workers)
+            records = index.fetch(wanted)
+            for proteome_path, accession, description, sequence in tqdm(records, total=len(wanted), desc="Extracting hit sequences"):
+                sequence = sequence.replace('*', '')
+                for subunit in wanted[(proteome_path, accession)]:
+                    write_fasta_record(handles[subunit], description, sequence)
+                    counts[subunit] += 1
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    logging.info(f"✅ Wrote {sum(counts.values())} hit sequences for {len(subunits)} subunits to {output_dir}")
+    return counts
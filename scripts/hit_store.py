@@ -0,0 +1,310 @@
+import os
+import sqlite3
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from complex_i_analysis import extract_strand
+
+# Columns that get an index; notebooks filter on these
+INDEXED_COLUMNS = ['Accession', 'Subunit', 'Species', 'GenomeFile']
+
+# Compact in-memory schema. Repeated text becomes categorical; evalue stays float64 because
+# HMMER E-values go far below float32's ~1e-38 range (log10evalue keeps their magnitude).
+CATEGORICAL_COLUMNS = ['Accession', 'Subunit', 'Species', 'Organism', 'GenomeFile', 'ProteomeFile', 'Replicon']
+COMPACT_DTYPES = {
+    'Start': np.int32, 'End': np.int32, 'EstProtLength': np.int32, 'Strand': np.int8,
+    'BitScore': np.float32, 'Bias': np.float32, 'log10evalue': np.float32, 'SequenceLength(Mb)': np.float32,
+}
+MEMORY_SAMPLE_ROWS = 10_000
+
+def quote_identifier(name):
+    """Quotes a column or table name for SQLite (names such as `SequenceLength(Mb)` need it)."""
+    return '"' + name.replace('"', '""') + '"'
+
+def load_replicon_metadata(genome_metadata_file, genome_dataset_file):
+    """
+    Joins per-replicon genome metadata with species information, as the notebooks do.
+
+    Args:
+        genome_metadata_file (Path): CSV with Accession, Replicon, GenomeFile and SequenceLength(Mb).
+        genome_dataset_file (Path): CSV with GenomeFile, Species and Organism.
+
+    Returns:
+        pd.DataFrame: One row per replicon Accession.
+    """
+    genomes_metadata = pd.read_csv(genome_metadata_file)
+    genomes_dataset = pd.read_csv(genome_dataset_file, usecols=['GenomeFile', 'Species', 'Organism'])
+    return genomes_metadata.merge(genomes_dataset.drop_duplicates(), on='GenomeFile')
+
+def enrich_hits(hits, replicons):
+    """
+    Adds replicon metadata and the derived columns the notebooks compute.
+
+    Hits on replicons without metadata are dropped, matching the notebooks' inner merges.
+
+    Args:
+        hits (pd.DataFrame): Formatted hits from `10_process_hmmer_results.py`.
+        replicons (pd.DataFrame): Output of `load_replicon_metadata`.
+
+    Returns:
+        pd.DataFrame: Hits with Replicon, GenomeFile, SequenceLength(Mb), Species, Organism,
+            EstProtLength and Strand.
+    """
+    hits = replicons.merge(hits, on='Accession')
+    hits['EstProtLength'] = np.round((hits['Start'] - hits['End']).abs() / 3).astype(np.int32)
+    hits['Strand'] = extract_strand(hits['SequenceDesc'])
+    return hits
+
+def compact_hits(hits, categories=None):
+    """
+    Converts a hits frame to the compact schema.
+
+    Args:
+        hits (pd.DataFrame): Hits with any subset of the store columns.
+        categories (dict): Column -> fixed category list, so separately loaded chunks share
+            categories and concatenate without falling back to object dtype.
+
+    Returns:
+        pd.DataFrame: The converted frame.
+    """
+    categories = categories or {}
+    for column in hits.columns:
+        if column in CATEGORICAL_COLUMNS:
+            dtype = pd.CategoricalDtype(categories[column]) if column in categories else 'category'
+            hits[column] = hits[column].astype(dtype)
+        elif column in COMPACT_DTYPES:
+            hits[column] = hits[column].astype(COMPACT_DTYPES[column])
+        elif column == 'ProteinAccession':
+            hits[column] = hits[column].astype('string[pyarrow]')
+    return hits
+
+def memory_report(frame, label="hits"):
+    """
+    Logs the deep memory footprint of a frame, largest columns first.
+
+    Returns:
+        pd.Series: Bytes per column.
+    """
+    usage = frame.memory_usage(deep=True, index=False).sort_values(ascending=False)
+    top = ", ".join(f"{column} {size / 2**20:.1f} MiB" for column, size in usage.head(5).items())
+    logging.info(f"🧮 {label}: {len(frame):,} rows, {usage.sum() / 2**20:.1f} MiB ({top})")
+    return usage
+
+class HitStore:
+    """
+    SQLite store of HMMER hits with metadata joins and derived columns materialised.
+
+    The `hits` table holds one denormalised row per hit, indexed on Accession, Subunit,
+    Species and GenomeFile, so analyses load only the rows and columns they query instead
+    of re-reading and re-merging the full CSV. The long prodigal `SequenceDesc` strings are
+    kept in a separate `descriptions` table keyed by ProteinAccession, since their
+    coordinates and strand are already materialised as columns.
+    """
+
+    def __init__(self, store_file):
+        self.store_file = Path(store_file)
+        self.connection = sqlite3.connect(self.store_file)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @classmethod
+    def build(cls, hit_chunks, store_file, replicons):
+        """
+        Writes a new store from chunks of formatted hits, replacing any existing one.
+
+        The store is built in a temporary file and renamed into place when complete.
+
+        Args:
+            hit_chunks (iterable): DataFrames of formatted hits.
+            store_file (Path): SQLite file to create.
+            replicons (pd.DataFrame): Output of `load_replicon_metadata`.
+
+        Returns:
+            int: Number of hits stored.
+        """
+        store_file = Path(store_file)
+        temp_file = store_file.with_name(store_file.name + ".tmp")
+        temp_file.unlink(missing_ok=True)
+
+        total_hits = 0
+        with sqlite3.connect(temp_file) as connection:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute("CREATE TABLE descriptions (ProteinAccession TEXT PRIMARY KEY, SequenceDesc TEXT)")
+            for hits in hit_chunks:
+                hits = enrich_hits(hits, replicons)
+                connection.executemany(
+                    "INSERT OR IGNORE INTO descriptions VALUES (?, ?)",
+                    zip(hits['ProteinAccession'], hits['SequenceDesc'])
+                )
+                hits.drop(columns=['SequenceDesc']).to_sql(
+                    'hits', connection, if_exists='append', index=False, chunksize=50_000
+                )
+                total_hits += len(hits)
+
+            if total_hits:
+                for column in INDEXED_COLUMNS:
+                    connection.execute(
+                        f"CREATE INDEX {quote_identifier('hits_' + column)} ON hits ({quote_identifier(column)})"
+                    )
+                connection.execute("ANALYZE")
+        connection.close()
+
+        os.replace(temp_file, store_file)
+        logging.info(f"✅ Hit store written: {total_hits} hits in {store_file}")
+        return total_hits
+
+    def columns(self):
+        """Returns the queryable columns: the hits table plus SequenceDesc from the side table."""
+        return [row[1] for row in self.connection.execute("PRAGMA table_info(hits)")] + ['SequenceDesc']
+
+    def _where(self, subunits=None, species=None, accessions=None, genome_files=None, max_evalue=None):
+        """Builds the WHERE clause and parameters for the query filters."""
+        conditions, params = [], []
+        filters = {'Subunit': subunits, 'Species': species, 'Accession': accessions, 'GenomeFile': genome_files}
+        for column, values in filters.items():
+            if values is None:
+                continue
+            # Filter values go through a temporary table, so long lists avoid SQLite's parameter limit
+            table = quote_identifier(f"filter_{column}")
+            self.connection.execute(f"DROP TABLE IF EXISTS temp.{table}")
+            self.connection.execute(f"CREATE TEMP TABLE {table} (value TEXT PRIMARY KEY)")
+            self.connection.executemany(f"INSERT OR IGNORE INTO temp.{table} VALUES (?)", ((value,) for value in values))
+            conditions.append(f"hits.{quote_identifier(column)} IN (SELECT value FROM temp.{table})")
+        if max_evalue is not None:
+            conditions.append("hits.evalue <= ?")
+            params.append(max_evalue)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def _select(self, columns, where):
+        """Builds the SELECT statement, joining the descriptions table only when SequenceDesc is requested."""
+        available = self.columns()
+        unknown = set(columns) - set(available)
+        if unknown:
+            raise ValueError(f"Unknown hit store columns: {sorted(unknown)}")
+
+        selected = ", ".join(
+            "descriptions.SequenceDesc" if column == 'SequenceDesc' else f"hits.{quote_identifier(column)}"
+            for column in columns
+        )
+        query = f"SELECT {selected} FROM hits"
+        if 'SequenceDesc' in columns:
+            query += " LEFT JOIN descriptions USING (ProteinAccession)"
+        return query + where
+
+    def categories(self, columns):
+        """Returns the store-wide categories of the indexed categorical columns among `columns`."""
+        return {
+            column: self.distinct(column)
+            for column in columns if column in CATEGORICAL_COLUMNS and column in INDEXED_COLUMNS
+        }
+
+    def query(self, columns=None, compact=True, **filters):
+        """
+        Loads hits, reading only the requested columns and matching rows.
+
+        Args:
+            columns (list): Columns to return (default: all except SequenceDesc).
+            compact (bool): Return the compact schema (categoricals, int32, float32).
+            **filters: subunits, species, accessions, genome_files (lists) and max_evalue.
+
+        Returns:
+            pd.DataFrame: Matching hits.
+        """
+        columns = columns or self.columns()[:-1]
+        where, params = self._where(**filters)
+        hits = pd.read_sql_query(self._select(columns, where), self.connection, params=params)
+        return compact_hits(hits, self.categories(columns)) if compact else hits
+
+    def iter_query(self, chunk_rows, columns=None, compact=True, **filters):
+        """
+        Yields matching hits in chunks of at most `chunk_rows` rows, with store-wide categories.
+
+        Args:
+            chunk_rows (int): Rows per chunk.
+            columns (list): Columns to return (default: all except SequenceDesc).
+            compact (bool): Return the compact schema.
+            **filters: As for `query`.
+
+        Yields:
+            pd.DataFrame: Chunks of matching hits.
+        """
+        columns = columns or self.columns()[:-1]
+        categories = self.categories(columns) if compact else None
+        where, params = self._where(**filters)
+        for chunk in pd.read_sql_query(self._select(columns, where), self.connection, params=params, chunksize=chunk_rows):
+            yield compact_hits(chunk, categories) if compact else chunk
+
+    def count(self, **filters):
+        """Returns the number of hits matching the filters."""
+        where, params = self._where(**filters)
+        return self.connection.execute(f"SELECT COUNT(*) FROM hits{where}", params).fetchone()[0]
+
+    def estimate_memory(self, columns=None, compact=True, **filters):
+        """
+        Estimates the in-memory size of a query from a sample of its rows.
+
+        Returns:
+            tuple: (matching rows, estimated bytes).
+        """
+        columns = columns or self.columns()[:-1]
+        rows = self.count(**filters)
+        where, params = self._where(**filters)
+        sample = pd.read_sql_query(
+            self._select(columns, where) + f" LIMIT {MEMORY_SAMPLE_ROWS}", self.connection, params=params
+        )
+        if compact:
+            sample = compact_hits(sample)
+        bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / max(1, len(sample))
+        return rows, int(rows * bytes_per_row)
+
+    def distinct(self, column):
+        """Returns the sorted distinct values of one column, e.g. to list subunits or species."""
+        if column not in self.columns()[:-1]:
+            raise ValueError(f"Unknown hit store column: {column}")
+        rows = self.connection.execute(
+            f"SELECT DISTINCT {quote_identifier(column)} FROM hits WHERE {quote_identifier(column)} IS NOT NULL ORDER BY 1"
+        )
+        return [row[0] for row in rows]
+
+def _iter_hits(store_file, chunk_rows, **query):
+    """Yields query chunks from a store that stays open until the last chunk is consumed."""
+    with HitStore(store_file) as store:
+        yield from store.iter_query(chunk_rows, **query)
+
+def load_hits(store_file, memory_budget=None, **query):
+    """
+    Loads hits from the store in the compact schema, within an optional memory budget.
+
+    When the estimated footprint of the query exceeds `memory_budget`, nothing is loaded up
+    front and an iterator of DataFrame chunks sized to fit the budget is returned instead,
+    so callers can aggregate chunk by chunk.
+
+    Args:
+        store_file (Path): SQLite file written by `HitStore.build`.
+        memory_budget (int): Maximum bytes to load at once (default: no limit).
+        **query: Arguments for `HitStore.query` (columns, compact, subunits, species, ...).
+
+    Returns:
+        pd.DataFrame | iterator: All matching hits, or chunks of them when over budget.
+    """
+    with HitStore(store_file) as store:
+        if memory_budget is not None:
+            rows, estimated_bytes = store.estimate_memory(**query)
+            if estimated_bytes > memory_budget:
+                chunk_rows = max(1, int(rows * memory_budget / estimated_bytes))
+                logging.warning(f"⚠️ Query needs ~{estimated_bytes / 2**20:.1f} MiB, over the "
+                                f"{memory_budget / 2**20:.1f} MiB budget; loading in chunks of {chunk_rows:,} rows")
+                return _iter_hits(store_file, chunk_rows, **query)
+
+        hits = store.query(**query)
+    memory_report(hits)
+    return hits
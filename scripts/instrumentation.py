@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import heapq
+import atexit
+import logging
+import platform
+import resource
+import threading
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import psutil
+
+RSS_SAMPLE_INTERVAL = 0.5  # Seconds between peak RSS samples of the process tree during a stage
+SLOWEST_COMMANDS = 10  # Slowest invocations kept per tool in the report
+# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+MAXRSS_BYTES = 1 if sys.platform == "darwin" else 1024
+# Tools whose first argument is a subcommand worth reporting separately (e.g. `mmseqs cluster`)
+SUBCOMMAND_TOOLS = {"mmseqs"}
+PROFILERS = ("cprofile", "pyinstrument")
+
+_active_run = None
+
+def tree_rss(process):
+    """Returns the summed resident memory of a process and all its descendants, in bytes."""
+    total = 0
+    try:
+        members = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    for member in members:
+        try:
+            total += member.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+def _cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+def _io_counters(process):
+    """Returns (bytes read, bytes written) by this process, or (None, None) where unsupported."""
+    try:
+        counters = process.io_counters()
+    except (AttributeError, psutil.AccessDenied, NotImplementedError):
+        return None, None
+    # read_chars/write_chars include page-cache hits, which is what a stage actually reads
+    return getattr(counters, 'read_chars', counters.read_bytes), getattr(counters, 'write_chars', counters.write_bytes)
+
+class _RssSampler(threading.Thread):
+    """Samples the resident memory of this process tree until stopped, keeping the peak."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = tree_rss(self.process)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, tree_rss(self.process))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, tree_rss(self.process))
+        return self.peak
+
+class RunReport:
+    """
+    Resource accounting for one script run: its stages and the external tools they launch.
+
+    Stages are timed with wall clock, `getrusage` CPU of the process and of its reaped
+    children (worker pools, tools), a sampled peak RSS of the whole process tree, psutil
+    I/O counters (which on Linux include reaped children) and, when given, the number and size of input files. Every subprocess
+    started through `run_subprocess` is reaped with `wait4`, so its own CPU time and peak
+    RSS are known exactly; invocations are aggregated per tool, keeping the slowest ones.
+    `finish` writes the report as JSON and prints a summary table.
+    """
+
+    def __init__(self, script, report_dir, profiler=None):
+        self.script = script
+        self.report_dir = Path(report_dir)
+        self.profiler = profiler
+        self.started = datetime.now()
+        self.run_id = f"{script}_{self.started:%Y%m%d-%H%M%S}_{os.getpid()}"
+        self.stages = []
+        self.tools = {}
+        self._stage_names = []
+        self._lock = threading.Lock()
+        self._process = psutil.Process()
+        self._start_wall = time.perf_counter()
+        self._start_self = resource.getrusage(resource.RUSAGE_SELF)
+        self._start_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._finished = False
+
+    @property
+    def current_stage(self):
+        return self._stage_names[-1] if self._stage_names else None
+
+    @contextmanager
+    def stage(self, name, inputs=None):
+        """
+        Measures a block of work as a named stage.
+
+        Args:
+            name (str): Stage name used in the report.
+            inputs (list): Input files; their number and total size are recorded.
+
+        Yields:
+            dict: The stage record; callers may add counts (e.g. `record['files'] = n`).
+        """
+        record = {'stage': name, 'started': datetime.now().isoformat(timespec='seconds')}
+        if inputs is not None:
+            inputs = list(inputs)
+            record['files'] = len(inputs)
+            record['input_bytes'] = sum(os.path.getsize(path) for path in inputs if os.path.exists(path))
+
+        sampler = _RssSampler()
+        sampler.start()
+        profiler = self._start_profiler()
+        read_before, written_before = _io_counters(self._process)
+        self_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        self._stage_names.append(name)
+        record['status'] = 'failed'
+        try:
+            yield record
+            record['status'] = 'ok'
+        finally:
+            self._stage_names.pop()
+            elapsed = time.perf_counter() - start
+            self_after = resource.getrusage(resource.RUSAGE_SELF)
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            read_after, written_after = _io_counters(self._process)
+            self._stop_profiler(profiler, name)
+
+            record.update({
+                'wall_seconds': round(elapsed, 3),
+                'cpu_seconds': round(_cpu_seconds(self_after) - _cpu_seconds(self_before), 3),
+                'children_cpu_seconds': round(_cpu_seconds(children_after) - _cpu_seconds(children_before), 3),
+                'peak_rss_mb': round(sampler.stop() / 2**20, 1),
+                'read_bytes': read_after - read_before if read_before is not None else None,
+                'write_bytes': written_after - written_before if written_before is not None else None,
+            })
+            with self._lock:
+                self.stages.append(record)
+
+    def record_command(self, command, wall_seconds, usage, returncode):
+        """Adds one finished subprocess to its tool's aggregate."""
+        tool = Path(command[0]).name
+        if tool in SUBCOMMAND_TOOLS and len(command) > 1:
+            tool = f"{tool} {command[1]}"
+        cpu = _cpu_seconds(usage) if usage is not None else None
+        max_rss_mb = round(usage.ru_maxrss * MAXRSS_BYTES / 2**20, 1) if usage is not None else None
+        invocation = {
+            'command': " ".join(map(str, command))[:500], 'stage': self.current_stage,
+            'wall_seconds': round(wall_seconds, 3), 'cpu_seconds': round(cpu, 3) if cpu is not None else None,
+            'max_rss_mb': max_rss_mb, 'returncode': returncode,
+        }
+
+        with self._lock:
+            summary = self.tools.setdefault(tool, {
+                'calls': 0, 'failures': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'max_wall_seconds': 0.0,
+                'max_rss_mb': 0.0, 'slowest': [],
+            })
+            summary['calls'] += 1
+            summary['failures'] += returncode != 0
+            summary['wall_seconds'] += wall_seconds
+            summary['cpu_seconds'] += cpu or 0.0
+            summary['max_wall_seconds'] = max(summary['max_wall_seconds'], wall_seconds)
+            summary['max_rss_mb'] = max(summary['max_rss_mb'], max_rss_mb or 0.0)
+            # Min-heap of (wall, call number, invocation) keeps the slowest invocations
+            entry = (wall_seconds, summary['calls'], invocation)
+            if len(summary['slowest']) < SLOWEST_COMMANDS:
+                heapq.heappush(summary['slowest'], entry)
+            else:
+                heapq.heappushpop(summary['slowest'], entry)
+
+    def _start_profiler(self):
+        if self.profiler == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+
+    def _stop_profiler(self, profiler, stage_name):
+        """Stops a stage profiler and writes its dump next to the report."""
+        if profiler is None:
+            return
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.report_dir / f"{self.run_id}_{stage_name.replace(' ', '_')}"
+        if self.profiler == "cprofile":
+            profiler.disable()
+            profiler.dump_stats(f"{stem}.prof")
+        else:
+            profiler.stop()
+            Path(f"{stem}.html").write_text(profiler.output_html())
+
+    def to_dict(self):
+        finished_self = resource.getrusage(resource.RUSAGE_SELF)
+        finished_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        with self._lock:
+            tools = {
+                tool: {**summary, 'wall_seconds': round(summary['wall_seconds'], 3), 'cpu_seconds': round(summary['cpu_seconds'], 3),
+                       'max_wall_seconds': round(summary['max_wall_seconds'], 3),
+                       'slowest': [invocation for _, _, invocation in sorted(summary['slowest'], key=lambda entry: -entry[0])]}
+                for tool, summary in self.tools.items()
+            }
+            stages = list(self.stages)
+        return {
+            'run_id': self.run_id,
+            'script': self.script,
+            'argv': sys.argv,
+            'started': self.started.isoformat(timespec='seconds'),
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+            'wall_seconds': round(time.perf_counter() - self._start_wall, 3),
+            'cpu_seconds': round(_cpu_seconds(finished_self) - _cpu_seconds(self._start_self), 3),
+            'children_cpu_seconds': round(_cpu_seconds(finished_children) - _cpu_seconds(self._start_children), 3),
+            'max_rss_mb': round(finished_self.ru_maxrss * MAXRSS_BYTES / 2**20, 1),
+            'stages': stages,
+            'tools': tools,
+        }
+
+    def summary_table(self, report=None):
+        """Formats per-stage and per-tool totals as a plain-text table."""
+        report = report or self.to_dict()
+        lines = [f"{'stage':<32} {'wall s':>10} {'cpu s':>10} {'child cpu s':>12} {'peak RSS MB':>12} {'files':>8} {'status':>7}"]
+        for stage in report['stages']:
+            lines.append(
+                f"{stage['stage'][:32]:<32} {stage['wall_seconds']:>10.2f} {stage['cpu_seconds']:>10.2f} "
+                f"{stage['children_cpu_seconds']:>12.2f} {stage['peak_rss_mb']:>12.1f} {stage.get('files', ''):>8} {stage['status']:>7}"
+            )
+        if report['tools']:
+            lines.append("")
+            lines.append(f"{'tool':<32} {'calls':>10} {'wall s':>10} {'cpu s':>12} {'max RSS MB':>12} {'failed':>8}")
+            for tool, summary in sorted(report['tools'].items(), key=lambda item: -item[1]['wall_seconds']):
+                lines.append(
+                    f"{tool[:32]:<32} {summary['calls']:>10} {summary['wall_seconds']:>10.2f} {summary['cpu_seconds']:>12.2f} "
+                    f"{summary['max_rss_mb']:>12.1f} {summary['failures']:>8}"
+                )
+        lines.append(f"Total: {report['wall_seconds']:.1f}s wall, {report['cpu_seconds']:.1f}s CPU, "
+                     f"{report['children_cpu_seconds']:.1f}s child CPU, max RSS {report['max_rss_mb']:.0f} MB")
+        return "\n".join(lines)
+
+    def finish(self):
+        """Writes the JSON report and prints the summary table; later calls do nothing."""
+        if self._finished:
+            return None
+        self._finished = True
+        report = self.to_dict()
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        report_file = self.report_dir / f"{self.run_id}.json"
+        with open(report_file, 'w') as handle:
+            json.dump(report, handle, indent=2, default=str)
+        print(self.summary_table(report))
+        print(f"📊 Run report saved to {report_file}")
+        return report_file
+
+class _NullReport:
+    """Stand-in used when no run is being instrumented, so library code can always call `stage`."""
+
+    @contextmanager
+    def stage(self, name, inputs=None):
+        yield {}
+
+    def record_command(self, *args):
+        pass
+
+def add_report_arguments(parser, report_dir):
+    """Adds the `--report-dir` and `--profile` options shared by the pipeline scripts."""
+    parser.add_argument("--report-dir", type=Path, default=report_dir,
+                        help="Directory for the JSON run report and profiler dumps")
+    parser.add_argument("--profile", choices=PROFILERS, default=None,
+                        help="Profile the Python code of every stage (main thread only) and save one dump per stage")
+
+def start_run(script, report_dir, profiler=None):
+    """
+    Starts instrumenting this process as a run of `script`.
+
+    The report is written when the process exits (including on errors), or earlier by
+    calling `finish()`.
+
+    Returns:
+        RunReport: The active run.
+    """
+    global _active_run
+    if profiler == "pyinstrument":
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            logging.warning("⚠️ pyinstrument is not installed; profiling with cProfile instead")
+            profiler = "cprofile"
+    _active_run = RunReport(script, report_dir, profiler)
+    atexit.register(_active_run.finish)
+    return _active_run
+
+def active_run():
+    """Returns the active run, or a no-op report when none was started."""
+    return _active_run or _NullReport()
+
+def run_subprocess(command, check=False):
+    """
+    Runs an external tool like `subprocess.run(..., capture_output=True, text=True)`, recording its resources.
+
+    The child is reaped with `os.wait4`, which returns the CPU time and peak RSS of that
+    invocation alone (including any processes it waited for). Output is spooled to
+    temporary files, so large outputs (e.g. alignments on stdout) do not block the tool.
+
+    Returns:
+        subprocess.CompletedProcess: With text stdout and stderr.
+
+    Raises:
+        subprocess.CalledProcessError: If `check` is set and the tool fails.
+    """
+    command = [str(part) for part in command]
+    start = time.perf_counter()
+    usage = None
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=stdout, stderr=stderr)
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            process.wait()
+        wall_seconds = time.perf_counter() - start
+        stdout.seek(0)
+        stderr.seek(0)
+        output, errors = stdout.read().decode(errors='replace'), stderr.read().decode(errors='replace')
+
+    active_run().record_command(command, wall_seconds, usage, process.returncode)
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, output, errors)
+    return subprocess.CompletedProcess(command, process.returncode, output, errors)
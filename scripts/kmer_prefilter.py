@@ -0,0 +1,287 @@
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from proteome_shards import tag_sequence_id
+from pyhmmer_search import PYHMMER_AVAILABLE, press_profiles, read_proteome, search_block, subset_block, worker_profiles
+
+# Murphy, Wallqvist & Levy (2000) 10-letter alphabet. Residues in a group often replace each
+# other in homologues, so reduced k-mers (with a larger k) stay shared between diverged sequences
+REDUCED_ALPHABET = ("LVIM", "C", "A", "G", "ST", "P", "FYW", "EDNQ", "KR", "H")
+PROTEIN_ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+DEFAULT_KMER_SIZE = 6
+DEFAULT_MIN_SHARED = 2
+# Reference set of a subunit, as concatenated from the InterPro and CDS sequences by `08_hmm_pipeline.py`
+REFERENCE_FILE_NAME = "combined_cds_interpro_{subunit}.faa"
+RECALL_THRESHOLDS = (10.0, 1e-5, 1e-10, 1e-25, 1e-50)
+MAX_TABLE_SIZE = 2**27  # Entries of the dense k-mer table (20^6, or the reduced alphabet up to k=8)
+
+def residue_codes(reduced=False):
+    """Returns a byte → residue code lookup table (255 outside the alphabet) and the alphabet size."""
+    groups = REDUCED_ALPHABET if reduced else tuple(PROTEIN_ALPHABET)
+    table = np.full(256, 255, dtype=np.uint8)
+    for code, group in enumerate(groups):
+        for residue in group:
+            table[ord(residue)] = table[ord(residue.lower())] = code
+    return table, len(groups)
+
+def read_sequences(fasta_file):
+    """Returns the `(ID, sequence)` records of a FASTA file, the ID being the header up to the first whitespace."""
+    records = []
+    with open(fasta_file, 'rb') as handle:
+        for record in handle.read().split(b"\n>"):
+            header, _, sequence = record.lstrip(b">").partition(b"\n")
+            if header.strip():
+                records.append((header.split(None, 1)[0].decode(), sequence.replace(b"\n", b"").replace(b"\r", b"")))
+    return records
+
+def sequence_kmers(sequences, codes, alphabet_size, kmer_size):
+    """
+    Encodes the k-mers of a list of sequences as integers.
+
+    Args:
+        sequences (list): Sequences as bytes.
+        codes (np.ndarray): Lookup table from `residue_codes`.
+        alphabet_size (int): Number of residue codes.
+        kmer_size (int): k.
+
+    Returns:
+        tuple: (k-mer codes, index of the sequence each k-mer comes from). K-mers spanning
+        a residue outside the alphabet (X, stop codons) are skipped.
+    """
+    residues = codes[np.frombuffer(b"*".join(sequences) + b"*", dtype=np.uint8)]
+    count = len(residues) - kmer_size + 1
+    if not sequences or count <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    outside = residues == 255
+    spanned = np.concatenate(([0], np.cumsum(outside)))
+    invalid = spanned[kmer_size:] - spanned[:count] > 0
+    residues = np.where(outside, 0, residues).astype(np.int64)
+    kmers = residues[:count].copy()
+    for offset in range(1, kmer_size):
+        kmers *= alphabet_size
+        kmers += residues[offset:offset + count]
+    lengths = np.fromiter((len(sequence) + 1 for sequence in sequences), dtype=np.int64, count=len(sequences))
+    owners = np.repeat(np.arange(len(sequences)), lengths)[:count]
+    return kmers[~invalid], owners[~invalid]
+
+class KmerIndex:
+    """
+    Reference k-mers of each subunit, used to pick the proteins worth a full profile search.
+
+    A protein is a candidate for a subunit when at least `min_shared` of its k-mers occur
+    in the subunit's reference set, over the 20 amino acids or the reduced alphabet.
+    The index is a dense table holding, for every possible k-mer, a bitmask of the subunits
+    it occurs in. Finding candidates is one table lookup per residue, so it costs far
+    less than scoring every protein against every profile.
+    """
+
+    def __init__(self, subunits, masks, kmer_size=DEFAULT_KMER_SIZE, reduced=False):
+        self.subunits = list(subunits)
+        self.masks = masks
+        self.kmer_size = kmer_size
+        self.reduced = reduced
+        self.codes, self.alphabet_size = residue_codes(reduced)
+
+    @classmethod
+    def from_reference_files(cls, reference_files, kmer_size=DEFAULT_KMER_SIZE, reduced=False):
+        """
+        Builds an index from a `{subunit: reference FASTA}` mapping.
+
+        Raises:
+            ValueError: If the k-mer table would exceed MAX_TABLE_SIZE entries or there are more than 64 subunits.
+        """
+        codes, alphabet_size = residue_codes(reduced)
+        subunits = sorted(reference_files)
+        if alphabet_size ** kmer_size > MAX_TABLE_SIZE:
+            raise ValueError(f"{alphabet_size}^{kmer_size} k-mers exceed the table limit of {MAX_TABLE_SIZE}; use a smaller k")
+        if len(subunits) > 64:
+            raise ValueError(f"{len(subunits)} reference sets exceed the 64 subunits a k-mer bitmask holds")
+
+        dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64) if np.iinfo(dtype).bits >= len(subunits))
+        masks = np.zeros(alphabet_size ** kmer_size, dtype=dtype)
+        for number, subunit in enumerate(subunits):
+            sequences = [sequence for _, sequence in read_sequences(reference_files[subunit])]
+            kmers, _ = sequence_kmers(sequences, codes, alphabet_size, kmer_size)
+            masks[kmers] |= dtype(1) << dtype(number)
+        return cls(subunits, masks, kmer_size, reduced)
+
+    def shared_kmers(self, sequences):
+        """Returns a (sequences × subunits) array counting the k-mers of each sequence found in each reference set."""
+        kmers, owners = sequence_kmers(sequences, self.codes, self.alphabet_size, self.kmer_size)
+        masks = self.masks[kmers]
+        found = masks != 0
+        owners, masks = owners[found], masks[found]
+        counts = [
+            np.bincount(owners[(masks >> masks.dtype.type(number)) & 1 == 1], minlength=len(sequences))
+            for number in range(len(self.subunits))
+        ]
+        return np.stack(counts, axis=1) if counts else np.zeros((len(sequences), 0), dtype=np.int64)
+
+    def candidates(self, sequences, min_shared=DEFAULT_MIN_SHARED):
+        """Returns a boolean (sequences × subunits) array marking the candidates of each subunit."""
+        return self.shared_kmers(sequences) >= min_shared
+
+def profile_subunit(profile_name):
+    """Returns the subunit of a profile file or name (`NuoA_0.85_...` → `NuoA`)."""
+    return Path(profile_name).stem.split('_')[0]
+
+def reference_files(profile_files, reference_dir):
+    """Maps the subunit of each profile to its reference set in `reference_dir`, where one exists."""
+    references = {}
+    for profile_file in profile_files:
+        subunit = profile_subunit(profile_file)
+        reference_file = Path(reference_dir) / REFERENCE_FILE_NAME.format(subunit=subunit.lower())
+        if reference_file.exists():
+            references[subunit] = reference_file
+    return references
+
+def select_candidates(index, proteome_file, subunits, min_shared=DEFAULT_MIN_SHARED):
+    """
+    Picks the proteins of a proteome that should be searched with the profiles of `subunits`.
+
+    A subunit without a reference set in the index cannot be prefiltered, so if one is
+    requested every protein is kept.
+
+    Returns:
+        tuple: (number of sequences in the proteome, IDs of the candidate sequences)
+    """
+    records = read_sequences(proteome_file)
+    if not set(subunits) <= set(index.subunits):
+        return len(records), [sequence_id for sequence_id, _ in records]
+    columns = sorted({index.subunits.index(subunit) for subunit in subunits})
+    keep = index.candidates([sequence for _, sequence in records], min_shared)[:, columns].any(axis=1)
+    return len(records), [sequence_id for (sequence_id, _), kept in zip(records, keep) if kept]
+
+def write_candidates(proteome_file, candidate_ids, output_file, tag=None):
+    """
+    Writes the candidate records of a proteome to a FASTA file, headers unchanged.
+
+    Args:
+        proteome_file (Path): Proteome FASTA file.
+        candidate_ids (iterable): Sequence IDs to keep.
+        output_file (Path): Destination FASTA file.
+        tag (int): Optional shard tag for the IDs, see `proteome_shards.tag_sequence_id`.
+    """
+    candidate_ids, keep = set(candidate_ids), False
+    with open(proteome_file, 'r') as infile, open(output_file, 'w') as outfile:
+        for line in infile:
+            if line.startswith('>'):
+                keep = line[1:].split(None, 1)[0] in candidate_ids if line[1:].strip() else False
+                if keep and tag is not None:
+                    line = f">{tag_sequence_id(tag, line[1:])}"
+            if keep:
+                outfile.write(line)
+
+def recall_report(index, profiles, proteome_files, min_shared=DEFAULT_MIN_SHARED, thresholds=RECALL_THRESHOLDS, cpus=1):
+    """
+    Measures the prefilter's recall and speed against full searches of `proteome_files`.
+
+    Each proteome is searched in full, then only on its candidates. The candidate search
+    uses Z set to the full proteome size, so a recovered hit keeps its score and E-value.
+    Both searches run in-process with pyhmmer.
+
+    Args:
+        index (KmerIndex): Prefilter index.
+        profiles (list): Optimised profiles, see `pyhmmer_search.worker_profiles`.
+        proteome_files (list): Benchmark subset of proteome files.
+        min_shared (int): Prefilter threshold, see `KmerIndex.candidates`.
+        thresholds (tuple): E-value cutoffs at which recall is reported.
+        cpus (int): Threads pyhmmer uses for each search.
+
+    Returns:
+        tuple: (DataFrame of full and recovered hits per subunit and cutoff, dict of totals and timings)
+    """
+    subunits = sorted({profile_subunit(profile.name) for profile in profiles})
+    alphabet = profiles[0].alphabet if profiles else None
+    totals = dict(proteomes=len(proteome_files), proteins=0, candidates=0, residues=0, candidate_residues=0,
+                  prefilter_s=0.0, full_search_s=0.0, candidate_search_s=0.0)
+    hits = []
+
+    for proteome_file in proteome_files:
+        start = time.perf_counter()
+        total, candidate_ids = select_candidates(index, proteome_file, subunits, min_shared)
+        totals['prefilter_s'] += time.perf_counter() - start
+
+        sequences = read_proteome(proteome_file, alphabet)
+        candidates = subset_block(sequences, candidate_ids)
+        totals['proteins'] += total
+        totals['candidates'] += len(candidates)
+        totals['residues'] += sum(len(sequence) for sequence in sequences)
+        totals['candidate_residues'] += sum(len(sequence) for sequence in candidates)
+
+        start = time.perf_counter()
+        full = search_block(profiles, sequences, cpus).to_pandas()
+        totals['full_search_s'] += time.perf_counter() - start
+        start = time.perf_counter()
+        recovered = search_block(profiles, candidates, cpus, z=len(sequences)).to_pandas()
+        totals['candidate_search_s'] += time.perf_counter() - start
+
+        recovered_pairs = set(zip(recovered['ProteinAccession'], recovered['Profile']))
+        full['Recovered'] = [pair in recovered_pairs for pair in zip(full['ProteinAccession'], full['Profile'])]
+        hits.append(full[['Profile', 'evalue', 'Recovered']])
+
+    hits = pd.concat(hits, ignore_index=True) if hits else pd.DataFrame(columns=['Profile', 'evalue', 'Recovered'])
+    hits['Subunit'] = hits['Profile'].map(profile_subunit)
+    rows = []
+    for threshold in thresholds:
+        passing = hits[hits['evalue'] <= threshold]
+        for subunit, group in [(subunit, passing[passing['Subunit'] == subunit]) for subunit in subunits] + [("all", passing)]:
+            rows.append((subunit, threshold, len(group), int(group['Recovered'].sum()),
+                         group['Recovered'].mean() if len(group) else np.nan))
+    recall = pd.DataFrame(rows, columns=['Subunit', 'MaxEvalue', 'FullHits', 'RecoveredHits', 'Recall'])
+
+    prefiltered_s = totals['prefilter_s'] + totals['candidate_search_s']
+    totals['candidate_fraction'] = totals['candidates'] / max(totals['proteins'], 1)
+    totals['speedup'] = totals['full_search_s'] / prefiltered_s if prefiltered_s else np.nan
+    return recall, totals
+
+if __name__ == "__main__":
+    from config import HMM_CLUST_SEQS_DIR, HMM_PROFILES_DIR, HMM_PROTEOMES_DIR, HMM_RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="Report the recall and speed of the k-mer hit prefilter against full HMMER searches.")
+    parser.add_argument("--sample", type=int, default=20, help="Number of proteomes in the benchmark subset")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for picking the subset")
+    parser.add_argument("--kmer-size", type=int, default=DEFAULT_KMER_SIZE, help="k-mer length")
+    parser.add_argument("--min-shared", type=int, default=DEFAULT_MIN_SHARED,
+                        help="Distinct k-mers a protein must share with a reference set to be searched")
+    parser.add_argument("--reduced-alphabet", action="store_true",
+                        help="Build k-mers over the reduced 10-letter alphabet instead of the 20 amino acids")
+    parser.add_argument("--cpus", type=int, default=1, help="pyhmmer threads per search")
+    parser.add_argument("--output", type=Path, default=HMM_RESULTS_DIR / "prefilter_recall.csv", help="Recall report CSV")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if not PYHMMER_AVAILABLE:
+        parser.error("the recall report requires the pyhmmer package")
+
+    profile_files = sorted(HMM_PROFILES_DIR.glob("*.hmm"))
+    references = reference_files(profile_files, HMM_CLUST_SEQS_DIR)
+    missing = sorted({profile_subunit(profile_file) for profile_file in profile_files} - set(references))
+    if missing:
+        logging.warning(f"⚠️ No reference set in {HMM_CLUST_SEQS_DIR} for {', '.join(missing)}; their proteomes are not prefiltered.")
+    index = KmerIndex.from_reference_files(references, args.kmer_size, args.reduced_alphabet)
+    logging.info(f"✅ Indexed {np.count_nonzero(index.masks)} k-mers of {len(references)} reference sets")
+
+    proteome_files = sorted(HMM_PROTEOMES_DIR.glob("*.faa"))
+    proteome_files = sorted(random.Random(args.seed).sample(proteome_files, min(args.sample, len(proteome_files))))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database_file = Path(temp_dir) / "profiles_db.hmm"
+        press_profiles(profile_files, database_file)
+        recall, totals = recall_report(index, worker_profiles(database_file), proteome_files, args.min_shared, cpus=args.cpus)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    recall.to_csv(args.output, index=False)
+    print(recall[recall['Subunit'] == "all"].to_string(index=False))
+    print(f"\nk={args.kmer_size}, min shared {args.min_shared}, {'reduced' if args.reduced_alphabet else 'full'} alphabet: "
+          f"{totals['candidates']}/{totals['proteins']} proteins ({100 * totals['candidate_fraction']:.2f}%) and "
+          f"{totals['candidate_residues']}/{totals['residues']} residues searched on {totals['proteomes']} proteomes")
+    print(f"Full search {totals['full_search_s']:.2f}s, prefilter {totals['prefilter_s']:.2f}s + candidate search "
+          f"{totals['candidate_search_s']:.2f}s ({totals['speedup']:.1f}x)")
+    print(f"📊 Recall per subunit saved to {args.output}")
@@ -0,0 +1,100 @@
+# Stand-in for `hmmsearch` used by the benchmark suite on synthetic data (see `benchmark.py`).
+# Synthetic profiles carry the motif planted in every protein of their subunit in their DESC
+# line, and a target is reported when it contains that motif. Only the options
+# `09_hmmer_search.py` passes are understood and only the `--tblout` table is written. The
+# standard library is enough, so the start-up cost per call stays close to the real binary's.
+import os
+import sys
+import zlib
+
+MOTIF_PREFIX = "synthetic motif "
+TBLOUT_HEADER = (
+    "#                                                               --- full sequence ---- --- best 1 domain ---- --- domain number estimation ----\n"
+    "# target name        accession  query name           accession    E-value  score  bias   E-value  score  bias   exp reg clu  ov env dom rep inc description of target\n"
+    "#------------------- ---------- -------------------- ---------- --------- ------ ----- --------- ------ -----   --- --- --- --- --- --- --- --- ---------------------\n"
+)
+TBLOUT_FOOTER = "#\n# Program:         hmmsearch\n# Version:         synthetic (benchmark mock)\n# [ok]\n"
+
+def read_profiles(profile_file):
+    """Returns (NAME, motif) for every profile in a (multi-)profile file."""
+    profiles, name = [], None
+    with open(profile_file, 'r') as handle:
+        for line in handle:
+            if line.startswith("NAME "):
+                name = line.split()[1]
+            elif line.startswith("DESC ") and MOTIF_PREFIX in line:
+                profiles.append((name, line.split(MOTIF_PREFIX, 1)[1].strip()))
+    return profiles
+
+def read_targets(fasta_file):
+    """Yields (sequence ID, description, sequence) for every record of a FASTA file."""
+    header, lines = None, []
+    with open(fasta_file, 'r') as handle:
+        for line in handle:
+            if line.startswith(">"):
+                if header is not None:
+                    yield (*_split_header(header), "".join(lines))
+                header, lines = line[1:].rstrip("\n"), []
+            else:
+                lines.append(line.strip())
+    if header is not None:
+        yield (*_split_header(header), "".join(lines))
+
+def _split_header(header):
+    parts = header.split(None, 1)
+    return parts[0], parts[1] if len(parts) > 1 else "-"
+
+def search(profile_file, fasta_file, tblout_file, z=None, max_evalue=10.0):
+    """
+    Writes a tblout of every target containing a profile's motif.
+
+    Scores are derived deterministically from the target ID, and E-values scale with the
+    database size (`-Z`, default: number of targets) as hmmsearch's do.
+
+    Returns:
+        int: Number of reported hits.
+    """
+    profiles = read_profiles(profile_file)
+    targets = list(read_targets(fasta_file))
+    z = z or max(len(targets), 1)
+
+    rows = []
+    for name, motif in profiles:
+        for target, description, sequence in targets:
+            if motif not in sequence:
+                continue
+            score = 80 + zlib.crc32(f"{name}:{target}".encode()) % 400 / 2
+            evalue = z * 2.0 ** -score
+            if evalue > max_evalue:
+                continue
+            rows.append(
+                f"{target:<20} {'-':<10} {name:<20} {'-':<10} {evalue:9.2g} {score:6.1f} {0.1:5.1f} "
+                f"{evalue:9.2g} {score - 0.2:6.1f} {0.1:5.1f} {1.0:5.1f}   1   0   0   1   1   1   1 {description}\n"
+            )
+
+    with open(tblout_file, 'w') as handle:
+        handle.write(TBLOUT_HEADER)
+        handle.writelines(rows)
+        handle.write(TBLOUT_FOOTER)
+    return len(rows)
+
+def main(argv):
+    options, positional = {}, []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument in ("--tblout", "-o", "-Z", "-E", "--cpu"):
+            options[argument] = next(arguments)
+        elif argument.startswith("-"):
+            continue  # Flags without values (e.g. --noali)
+        else:
+            positional.append(argument)
+
+    if len(positional) != 2:
+        sys.stderr.write("Usage: hmmsearch [options] <hmmfile> <seqdb>\n")
+        return 1
+    tblout_file = options.get("--tblout", os.devnull)
+    search(positional[0], positional[1], tblout_file, int(options.get("-Z", 0)) or None, float(options.get("-E", 10.0)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,233 @@
+import sqlite3
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import pandas as pd
+from tqdm import tqdm
+from Bio import Align
+from Bio.Align import substitution_matrices
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+# EMBOSS water defaults, as previously run per pair through the psa wrapper
+SUBSTITUTION_MATRIX = "BLOSUM62"
+GAP_OPEN = 10.0
+GAP_EXTEND = 0.5
+BATCH_SIZE = 1000
+SQLITE_MAX_VARIABLES = 900
+SCORE_COLUMNS = ['Identity', 'Similarity', 'QueryCoverage']
+
+_aligner = None
+
+def sequence_hash(sequence):
+    """Returns a hex digest identifying a protein sequence."""
+    return hashlib.blake2b(sequence.upper().encode(), digest_size=16).hexdigest()
+
+def reference_key(reference, matrix=SUBSTITUTION_MATRIX, gap_open=GAP_OPEN, gap_extend=GAP_EXTEND):
+    """Returns the cache key of a reference sequence under a scoring scheme, so cached scores are never reused across schemes."""
+    return sequence_hash(f"{matrix}:{gap_open}:{gap_extend}:{reference}")
+
+def make_aligner(matrix=SUBSTITUTION_MATRIX, gap_open=GAP_OPEN, gap_extend=GAP_EXTEND):
+    """
+    Builds a local (Smith-Waterman) aligner scored like EMBOSS water.
+
+    A gap of length n costs `gap_open + (n - 1) * gap_extend`, as in EMBOSS.
+    """
+    return Align.PairwiseAligner(
+        mode='local',
+        substitution_matrix=substitution_matrices.load(matrix),
+        open_gap_score=-gap_open,
+        extend_gap_score=-gap_extend,
+    )
+
+def alignment_scores(aligner, reference, sequence):
+    """
+    Aligns a hit sequence to its reference.
+
+    Identity and similarity are percentages of the alignment length (aligned columns plus
+    internal gaps), rounded to one decimal as EMBOSS reports them; query coverage is the
+    percentage of the reference spanned by the local alignment (psa's `query_coverage()`,
+    with the reference passed as query).
+
+    Returns:
+        tuple: (identity, similarity, query coverage); zeros when nothing aligns, including
+        for an empty hit sequence (or one holding only stop codons).
+    """
+    sequence = _mask_unknown(sequence, aligner.substitution_matrix.alphabet)
+    if not sequence or not reference:
+        return 0.0, 0.0, 0.0
+    try:
+        alignment = aligner.align(reference, sequence)[0]
+    except (IndexError, ValueError):  # No local alignment, or a sequence Biopython rejects
+        return 0.0, 0.0, 0.0
+
+    counts = alignment.counts(aligner.substitution_matrix)
+    length = counts.aligned + counts.gaps
+    if length == 0:
+        return 0.0, 0.0, 0.0
+    start, end = alignment.coordinates[0, 0], alignment.coordinates[0, -1]
+    return (
+        round(100 * counts.identities / length, 1),
+        round(100 * counts.positives / length, 1),
+        100 * int(end - start) / len(reference),
+    )
+
+def _mask_unknown(sequence, alphabet):
+    """Replaces residues the substitution matrix has no scores for (e.g. U, O) with X."""
+    return "".join(residue if residue in alphabet else 'X' for residue in sequence.upper().replace('*', ''))
+
+def _init_worker(matrix, gap_open, gap_extend):
+    global _aligner
+    _aligner = make_aligner(matrix, gap_open, gap_extend)
+
+def _score_batch(reference, batch):
+    """Scores a batch of (hash, sequence) pairs in a worker process."""
+    return [(key, *alignment_scores(_aligner, reference, sequence)) for key, sequence in batch]
+
+class AlignmentCache:
+    """
+    SQLite cache of alignment scores keyed by (reference key, hit sequence hash).
+
+    Identical hit sequences (common across strains) are aligned once, and scores are
+    committed batch by batch, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.cache_file)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS scores (
+                reference TEXT NOT NULL,
+                sequence TEXT NOT NULL,
+                identity REAL NOT NULL,
+                similarity REAL NOT NULL,
+                coverage REAL NOT NULL,
+                PRIMARY KEY (reference, sequence)
+            ) WITHOUT ROWID
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def lookup(self, reference, hashes):
+        """Returns {sequence hash: (identity, similarity, coverage)} for the cached hashes."""
+        hashes = list(hashes)
+        found = {}
+        for i in range(0, len(hashes), SQLITE_MAX_VARIABLES):
+            chunk = hashes[i:i + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"SELECT sequence, identity, similarity, coverage FROM scores "
+                f"WHERE reference = ? AND sequence IN ({','.join('?' * len(chunk))})",
+                (reference, *chunk)
+            )
+            found.update((key, tuple(scores)) for key, *scores in rows)
+        return found
+
+    def store(self, reference, rows):
+        """Saves (sequence hash, identity, similarity, coverage) rows for a reference."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+                ((reference, *row) for row in rows)
+            )
+
+def score_sequences(reference, records, cache_file, workers=None, batch_size=BATCH_SIZE,
+                    matrix=SUBSTITUTION_MATRIX, gap_open=GAP_OPEN, gap_extend=GAP_EXTEND, desc="Aligning"):
+    """
+    Scores hit sequences against a reference across a process pool.
+
+    Only sequences without cached scores are aligned; each unique sequence is aligned once.
+
+    Args:
+        reference (str): Reference protein sequence.
+        records (iterable): (protein accession, sequence) pairs.
+        cache_file (Path): SQLite score cache, created if needed.
+        workers (int): Number of worker processes (default: number of CPUs).
+        batch_size (int): Sequences sent to a worker per task.
+        matrix (str): Substitution matrix name.
+        gap_open (float): Gap opening penalty.
+        gap_extend (float): Gap extension penalty.
+        desc (str): Progress bar label.
+
+    Returns:
+        pd.DataFrame: ProteinAccession and SCORE_COLUMNS, in input order.
+    """
+    reference = _mask_unknown(reference, substitution_matrices.load(matrix).alphabet)
+    ref_key = reference_key(reference, matrix, gap_open, gap_extend)
+    accessions, hashes, unique = [], [], {}
+    for accession, sequence in records:
+        key = sequence_hash(sequence)
+        accessions.append(accession)
+        hashes.append(key)
+        unique.setdefault(key, sequence)
+
+    with AlignmentCache(cache_file) as cache:
+        scores = cache.lookup(ref_key, unique)
+        pending = [(key, sequence) for key, sequence in unique.items() if key not in scores]
+        logging.info(f"🧮 {desc}: {len(accessions)} hits, {len(unique)} unique sequences, {len(pending)} to align")
+
+        if pending:
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(matrix, gap_open, gap_extend)) as executor:
+                futures = [executor.submit(_score_batch, reference, batch) for batch in batches]
+                with tqdm(total=len(pending), desc=desc) as progress:
+                    for future in as_completed(futures):
+                        rows = future.result()
+                        cache.store(ref_key, rows)
+                        scores.update((key, tuple(row)) for key, *row in rows)
+                        progress.update(len(rows))
+
+    results = pd.DataFrame([scores[key] for key in hashes], columns=SCORE_COLUMNS)
+    results.insert(0, 'ProteinAccession', accessions)
+    return results
+
+def score_hit_files(hits_dir, references_dir, output_dir, cache_file, workers=None, batch_size=BATCH_SIZE):
+    """
+    Scores every `{subunit}_*.fasta` hit file against `{references_dir}/{subunit}/{subunit}_protein.fasta`.
+
+    Writes one `{subunit}_alignment.csv` per subunit with ReferenceSubunit,
+    ProteinAccession, Identity, Similarity and QueryCoverage.
+
+    Args:
+        hits_dir (Path): Directory with the hit FASTA files (see `hit_sequences.py`).
+        references_dir (Path): Directory with one reference protein per subunit.
+        output_dir (Path): Directory for the alignment tables.
+        cache_file (Path): SQLite score cache shared across subunits and runs.
+        workers (int): Number of worker processes (default: number of CPUs).
+        batch_size (int): Sequences sent to a worker per task.
+
+    Returns:
+        dict: Output CSV path per subunit.
+    """
+    hits_dir, references_dir, output_dir = Path(hits_dir), Path(references_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    outputs = {}
+    for hits_fasta in sorted(hits_dir.glob("*.fasta")):
+        subunit = hits_fasta.name.split('_')[0]
+        reference_fasta = references_dir / subunit / f"{subunit}_protein.fasta"
+        if not reference_fasta.exists():
+            logging.warning(f"⚠️ Skipping {subunit}: reference file {reference_fasta} not found")
+            continue
+
+        with open(reference_fasta) as handle:
+            _, reference = next(SimpleFastaParser(handle))
+        with open(hits_fasta) as handle:
+            records = [(title.split(None, 1)[0], sequence) for title, sequence in SimpleFastaParser(handle)]
+
+        results = score_sequences(reference, records, cache_file, workers, batch_size, desc=f"Alignment on {subunit} hits")
+        results.insert(0, 'ReferenceSubunit', subunit)
+        output_csv = output_dir / f"{subunit}_alignment.csv"
+        results.to_csv(output_csv, index=False)
+        outputs[subunit] = output_csv
+        logging.info(f"✅ Alignment results for {subunit} saved to {output_csv}")
+
+    return outputs
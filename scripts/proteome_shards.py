@@ -0,0 +1,267 @@
+import os
+import heapq
+import logging
+import argparse
+from pathlib import Path
+import pandas as pd
+from dataset_delta import assembly_from_file
+from file_utils import atomic_output, commit_output
+
+ID_SEPARATOR = "__"  # Separates the proteome's index within its shard from the original sequence ID
+SHARD_INDEX_FILE_NAME = "shard_index.csv"
+SHARD_PREFIX = "shard_"
+DEFAULT_SHARD_SIZE_MB = 64
+INDEX_COLUMNS = ['Shard', 'ShardIndex', 'ProteomeFile', 'Assembly', 'Sequences', 'SourceSize', 'SourceMtimeNs']
+
+def tag_sequence_id(index, header):
+    """Prefixes a FASTA header (without `>`) with the index of its proteome in a shard."""
+    return f"{index}{ID_SEPARATOR}{header}"
+
+def untag_sequence_id(tagged_id):
+    """Returns (proteome index within the shard, original sequence ID) for a tagged ID."""
+    index, sequence_id = tagged_id.split(ID_SEPARATOR, 1)
+    return int(index), sequence_id
+
+def append_tagged_proteome(outfile, index, proteome_file):
+    """
+    Appends a proteome to an open FASTA file, tagging each sequence ID with `index`.
+
+    Returns:
+        int: Number of sequences appended.
+    """
+    count, line = 0, "\n"
+    with open(proteome_file, 'r') as infile:
+        for line in infile:
+            if line.startswith('>'):
+                count += 1
+                line = f">{tag_sequence_id(index, line[1:])}"
+            outfile.write(line)
+    if not line.endswith("\n"):
+        outfile.write("\n")
+    return count
+
+def balance_shards(sizes, num_shards):
+    """
+    Assigns items to shards so that shard sizes are as even as possible.
+
+    Items are placed largest first into the currently smallest shard (the LPT rule), which
+    keeps every shard within the size of one item of the mean.
+
+    Args:
+        sizes (list): Size of each item.
+        num_shards (int): Number of shards.
+
+    Returns:
+        list: Item indices per shard, each in ascending order.
+    """
+    heap = [(0, shard) for shard in range(num_shards)]
+    shards = [[] for _ in range(num_shards)]
+    for item in sorted(range(len(sizes)), key=lambda item: -sizes[item]):
+        total, shard = heapq.heappop(heap)
+        shards[shard].append(item)
+        heapq.heappush(heap, (total + sizes[item], shard))
+    return [sorted(items) for items in shards if items]
+
+def load_shard_index(shards_dir):
+    """Returns the sidecar index of a shard directory, or None if it has not been packed."""
+    index_file = Path(shards_dir) / SHARD_INDEX_FILE_NAME
+    if not index_file.exists():
+        return None
+    return pd.read_csv(index_file, dtype={'Shard': str, 'ProteomeFile': str, 'Assembly': str})
+
+def shard_file_name(shard_number):
+    """Returns the file name of a numbered shard."""
+    return f"{SHARD_PREFIX}{shard_number:05d}.faa"
+
+def write_shard(shard_file, proteome_files):
+    """
+    Writes one shard from its member proteomes, tagging sequence IDs with each member's position.
+
+    Returns:
+        list: One shard index row per member, see `INDEX_COLUMNS`.
+    """
+    shard_file, rows = Path(shard_file), []
+    with open(atomic_output(shard_file), 'w') as outfile:
+        for index, proteome_file in enumerate(proteome_files):
+            stat = os.stat(proteome_file)
+            count = append_tagged_proteome(outfile, index, proteome_file)
+            rows.append((shard_file.name, index, Path(proteome_file).name, assembly_from_file(Path(proteome_file).name),
+                         count, stat.st_size, stat.st_mtime_ns))
+    commit_output(shard_file)
+    return rows
+
+def save_shard_index(shard_index, shards_dir):
+    """Writes the sidecar index and removes shard files it no longer lists."""
+    shards_dir = Path(shards_dir)
+    index_file = shards_dir / SHARD_INDEX_FILE_NAME
+    shard_index.to_csv(atomic_output(index_file), index=False)
+    commit_output(index_file)
+    listed = set(shard_index['Shard'])
+    for shard_file in shards_dir.glob(f"{SHARD_PREFIX}*.faa"):
+        if shard_file.name not in listed:
+            shard_file.unlink()
+
+def shard_count(total_size, shard_size_mb=DEFAULT_SHARD_SIZE_MB, num_shards=None, min_shards=1):
+    """Returns `num_shards`, or the number of shards of about `shard_size_mb` (at least `min_shards`) for `total_size` bytes."""
+    if num_shards is not None:
+        return max(1, num_shards)
+    return max(1, min_shards, round(total_size / (shard_size_mb * 2**20)))
+
+def shards_are_current(shard_index, proteome_files, shards_dir):
+    """Checks that a shard index covers exactly these proteome files, unchanged since packing, and its shards exist."""
+    if shard_index is None or len(shard_index) != len(proteome_files):
+        return False
+    packed = {row.ProteomeFile: (row.SourceSize, row.SourceMtimeNs) for row in shard_index.itertuples(index=False)}
+    for proteome_file in proteome_files:
+        stat = os.stat(proteome_file)
+        if packed.get(Path(proteome_file).name) != (stat.st_size, stat.st_mtime_ns):
+            return False
+    return all((Path(shards_dir) / shard).exists() for shard in shard_index['Shard'].unique())
+
+def pack_proteomes(proteome_files, shards_dir, shard_size_mb=DEFAULT_SHARD_SIZE_MB, num_shards=None, min_shards=1):
+    """
+    Packs proteome FASTA files into size-balanced shards with a sidecar index.
+
+    Each shard is a concatenated FASTA in which every sequence ID is prefixed with the
+    index of its proteome in the shard (`3__NZ_CP000001.1_12`). `shard_index.csv` lists,
+    per proteome, its shard, that index, its file name, assembly and sequence count, and
+    the size and mtime of the source file, so hits can be attributed back to ProteomeFile
+    and Accession and stale shards detected. Previous shards in the directory are replaced;
+    use `ensure_shards` to update existing shards in place.
+
+    Args:
+        proteome_files (list): Proteome FASTA files to pack.
+        shards_dir (Path): Output directory for the shards and the index.
+        shard_size_mb (float): Target shard size in MB, used when `num_shards` is not given.
+        num_shards (int): Exact number of shards (e.g. a multiple of the search workers).
+        min_shards (int): Lower bound on the number of size-derived shards, so every worker gets one.
+
+    Returns:
+        pd.DataFrame: The shard index.
+    """
+    shards_dir = Path(shards_dir)
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    proteome_files = sorted(Path(proteome_file) for proteome_file in proteome_files)
+    sizes = [os.stat(proteome_file).st_size for proteome_file in proteome_files]
+    num_shards = shard_count(sum(sizes), shard_size_mb, num_shards, min_shards)
+    assignments = balance_shards(sizes, min(num_shards, len(proteome_files)) or 1)
+
+    rows = []
+    for shard_number, items in enumerate(assignments):
+        rows += write_shard(shards_dir / shard_file_name(shard_number), [proteome_files[item] for item in items])
+    shard_index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+    save_shard_index(shard_index, shards_dir)
+
+    shard_bytes = shard_index.groupby('Shard')['SourceSize'].sum()
+    logging.info(f"📦 Packed {len(proteome_files)} proteomes into {len(assignments)} shards in {shards_dir} "
+                 f"({shard_bytes.min() / 2**20:.1f}-{shard_bytes.max() / 2**20:.1f} MB each)")
+    return shard_index
+
+def update_shards(shard_index, proteome_files, shards_dir, shard_size_mb=DEFAULT_SHARD_SIZE_MB, num_shards=None,
+                  min_shards=1):
+    """
+    Updates packed shards for added, removed and changed proteomes, rewriting only the shards affected.
+
+    Shards whose members are all unchanged are kept as they are. Removed and changed
+    proteomes are dropped from their shards; added and changed ones go, largest first, into
+    the smallest shard still below the target size (the total size over the shard count
+    `pack_proteomes` would use), or into a new shard once every shard has reached it.
+    Affected shards are written under new file names and the old files are only deleted
+    after the index is saved, so an interrupted update leaves the previous shards usable.
+
+    Args:
+        shard_index (pd.DataFrame): Index of the existing shards, whose files must all exist.
+        proteome_files (list): Proteome FASTA files the shards should hold.
+        shards_dir (Path): Directory of the shards and the index.
+        shard_size_mb (float): Target shard size in MB, used when `num_shards` is not given.
+        num_shards (int): Shard count the target size is derived from.
+        min_shards (int): Lower bound on the size-derived shard count.
+
+    Returns:
+        pd.DataFrame: The updated shard index.
+    """
+    shards_dir = Path(shards_dir)
+    proteome_paths = {Path(proteome_file).name: Path(proteome_file) for proteome_file in proteome_files}
+    stats = {name: os.stat(path) for name, path in proteome_paths.items()}
+    unchanged = pd.Series([
+        name in stats and (stats[name].st_size, stats[name].st_mtime_ns) == (size, mtime_ns)
+        for name, size, mtime_ns in zip(shard_index['ProteomeFile'], shard_index['SourceSize'], shard_index['SourceMtimeNs'])
+    ], index=shard_index.index)
+    kept = shard_index[unchanged].sort_values(['Shard', 'ShardIndex'])
+    affected = set(shard_index.loc[~unchanged, 'Shard'])
+    added = sorted(set(stats) - set(kept['ProteomeFile']), key=lambda name: (-stats[name].st_size, name))
+
+    members = {shard: group['ProteomeFile'].tolist() for shard, group in kept.groupby('Shard', sort=True)}
+    total_size = sum(stat.st_size for stat in stats.values())
+    target = total_size / shard_count(total_size, shard_size_mb, num_shards, min_shards)
+    heap = [(int(size), shard) for shard, size in kept.groupby('Shard', sort=True)['SourceSize'].sum().items()]
+    heapq.heapify(heap)
+    new_shards = 0
+    for name in added:
+        if heap and heap[0][0] < target:
+            size, shard = heapq.heappop(heap)
+        else:
+            size, shard = 0, f"new shard {new_shards}"
+            new_shards += 1
+            members[shard] = []
+        members[shard].append(name)
+        affected.add(shard)
+        heapq.heappush(heap, (size + stats[name].st_size, shard))
+
+    # Affected shards get fresh numbers after the highest one in use
+    next_number = max((int(shard[len(SHARD_PREFIX):-len(".faa")]) for shard in shard_index['Shard']), default=-1) + 1
+    rows = [row for row in kept.itertuples(index=False, name=None) if row[0] not in affected]
+    rewritten = 0
+    for shard in sorted(shard for shard in affected if members.get(shard)):
+        rows += write_shard(shards_dir / shard_file_name(next_number), [proteome_paths[name] for name in members[shard]])
+        next_number += 1
+        rewritten += 1
+    updated_index = pd.DataFrame(rows, columns=INDEX_COLUMNS).sort_values(['Shard', 'ShardIndex'], ignore_index=True)
+    save_shard_index(updated_index, shards_dir)
+
+    removed = int((~shard_index['ProteomeFile'].isin(list(stats))).sum())
+    logging.info(f"📦 Updated proteome shards in {shards_dir}: {len(added)} proteomes added or changed, {removed} removed, "
+                 f"{rewritten} of {updated_index['Shard'].nunique()} shards rewritten")
+    return updated_index
+
+def ensure_shards(proteome_files, shards_dir, shard_size_mb=DEFAULT_SHARD_SIZE_MB, num_shards=None, min_shards=1):
+    """
+    Returns the shard index for these proteomes.
+
+    Current shards are reused as they are, stale ones are updated with `update_shards`,
+    and the proteomes are packed from scratch when there are no usable shards yet.
+    """
+    shard_index = load_shard_index(shards_dir)
+    if shard_index is None or not all((Path(shards_dir) / shard).exists() for shard in shard_index['Shard'].unique()):
+        logging.info(f"📦 No usable proteome shards in {shards_dir}; packing")
+        return pack_proteomes(proteome_files, shards_dir, shard_size_mb, num_shards, min_shards)
+    if shards_are_current(shard_index, proteome_files, shards_dir):
+        logging.info(f"📦 Using {shard_index['Shard'].nunique()} current proteome shards in {shards_dir}")
+        return shard_index
+    return update_shards(shard_index, proteome_files, shards_dir, shard_size_mb, num_shards, min_shards)
+
+def shard_members(shard_index):
+    """
+    Groups a shard index by shard.
+
+    Returns:
+        list: `(shard file name, proteome file names, sequence counts)` per shard, members in index order.
+    """
+    shard_index = shard_index.sort_values(['Shard', 'ShardIndex'])
+    return [
+        (shard, group['ProteomeFile'].tolist(), group['Sequences'].tolist())
+        for shard, group in shard_index.groupby('Shard', sort=True)
+    ]
+
+if __name__ == "__main__":
+    from config import HMM_PROTEOMES_DIR, HMM_PROTEOME_SHARDS_DIR
+
+    parser = argparse.ArgumentParser(description="Pack proteome FASTA files into size-balanced shards for searching.")
+    parser.add_argument("--shards-dir", type=Path, default=HMM_PROTEOME_SHARDS_DIR, help="Output directory for the shards")
+    parser.add_argument("--shard-size-mb", type=float, default=DEFAULT_SHARD_SIZE_MB, help="Target shard size in MB")
+    parser.add_argument("--num-shards", type=int, default=None,
+                        help="Exact number of shards, e.g. a multiple of the search workers (overrides --shard-size-mb)")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    pack_proteomes(sorted(HMM_PROTEOMES_DIR.glob("*.faa")), args.shards_dir, args.shard_size_mb, args.num_shards)
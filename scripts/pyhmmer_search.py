@@ -0,0 +1,166 @@
+import threading
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+from proteome_shards import untag_sequence_id
+from file_utils import atomic_output, commit_output
+
+try:
+    import pyhmmer
+    from pyhmmer.easel import Alphabet, SequenceFile
+    from pyhmmer.plan7 import HMMFile
+    PYHMMER_AVAILABLE = True
+except ImportError:  # Only the in-process search backend needs pyhmmer; hit tables are read with pyarrow alone
+    PYHMMER_AVAILABLE = False
+
+# One Parquet hit table per proteome holds the reported hits of every profile
+HIT_TABLE_SUFFIX = "_hits.parquet"
+HIT_TABLE_SCHEMA = pa.schema([
+    ('ProteinAccession', pa.string()),
+    ('Profile', pa.string()),
+    ('evalue', pa.float64()),
+    ('BitScore', pa.float64()),
+    ('Bias', pa.float64()),
+    ('SequenceDesc', pa.string()),
+])
+
+_worker = threading.local()
+
+def hit_table_file(hit_tables_dir, proteome_file):
+    """Returns the hit table path for a proteome."""
+    return Path(hit_tables_dir) / f"{Path(proteome_file).stem}{HIT_TABLE_SUFFIX}"
+
+def press_profiles(profile_files, database_file):
+    """
+    Presses HMM profiles into one binary database, as `hmmpress` does.
+
+    The pressed `.h3p` file holds the profiles already in their vectorised search form,
+    so workers load them without rebuilding them from the text `.hmm` files.
+
+    Args:
+        profile_files (list): Paths to the individual `.hmm` profiles.
+        database_file (Path): Base name of the pressed database (`.h3m/.h3i/.h3f/.h3p` are written).
+
+    Returns:
+        int: Number of profiles pressed.
+    """
+    hmms = []
+    for profile_file in profile_files:
+        with HMMFile(profile_file) as handle:
+            hmms.extend(handle)
+    return pyhmmer.hmmer.hmmpress(hmms, database_file)
+
+def worker_profiles(database_file):
+    """
+    Returns the optimised profiles of a pressed database, loaded once per worker thread.
+
+    Searches reconfigure profiles for each target length, so threads never share them.
+    """
+    if getattr(_worker, 'database_file', None) != str(database_file):
+        with HMMFile(database_file) as handle:
+            _worker.profiles = list(handle.optimized_profiles())
+        _worker.database_file = str(database_file)
+    return _worker.profiles
+
+def read_proteome(proteome_file, alphabet=None):
+    """Reads a protein FASTA file into a digital sequence block (empty for an empty file)."""
+    alphabet = alphabet or Alphabet.amino()
+    try:
+        with SequenceFile(proteome_file, digital=True, alphabet=alphabet, format="fasta") as handle:
+            return handle.read_block()
+    except EOFError:
+        return pyhmmer.easel.DigitalSequenceBlock(alphabet)
+
+def subset_block(sequences, sequence_ids):
+    """Returns the sequences of a block whose name is in `sequence_ids`, in block order."""
+    sequence_ids = set(sequence_ids)
+    return pyhmmer.easel.DigitalSequenceBlock(sequences.alphabet, [sequence for sequence in sequences if sequence.name in sequence_ids])
+
+def search_block(profiles, sequences, cpus=1, tagged=False, z=None):
+    """
+    Searches every profile against a block of sequences and collects the reported hits.
+
+    E-values are computed against the size of the block, so a block holding one proteome
+    gives the E-values of a per-pair `hmmsearch`. Values are rounded to the precision of a
+    `--tblout` table, which keeps downstream results identical to those of the subprocess
+    backend.
+
+    Args:
+        profiles (list): Optimised profiles, see `worker_profiles`.
+        sequences (DigitalSequenceBlock): Target sequences.
+        cpus (int): Threads pyhmmer uses for this search.
+        tagged (bool): Sequence IDs carry a shard tag to strip (see `proteome_shards.py`).
+        z (int): Database size for E-values, when the block is a subset of a proteome.
+
+    Returns:
+        pa.RecordBatch: One row per reported (profile, target) hit, in HIT_TABLE_SCHEMA.
+    """
+    columns = {name: [] for name in HIT_TABLE_SCHEMA.names}
+    if len(sequences):
+        for top_hits in pyhmmer.hmmsearch(profiles, sequences, cpus=cpus, Z=z):
+            profile = top_hits.query.name
+            for hit in top_hits.reported:
+                columns['ProteinAccession'].append(untag_sequence_id(hit.name)[1] if tagged else hit.name)
+                columns['Profile'].append(profile)
+                columns['evalue'].append(float(f"{hit.evalue:.2g}"))
+                columns['BitScore'].append(float(f"{hit.score:.1f}"))
+                columns['Bias'].append(float(f"{hit.bias:.1f}"))
+                columns['SequenceDesc'].append(hit.description or "-")
+    return pa.RecordBatch.from_pydict(columns, schema=HIT_TABLE_SCHEMA)
+
+def save_hit_table(hits, output_file):
+    """Writes a hit batch as a Parquet hit table, atomically."""
+    pq.write_table(pa.Table.from_batches([hits], schema=HIT_TABLE_SCHEMA), atomic_output(output_file))
+    commit_output(output_file)
+
+def write_hit_table(profiles, proteome_file, output_file, cpus=1, candidate_ids=None):
+    """
+    Searches one proteome file and writes its hit table.
+
+    With `candidate_ids` (see `kmer_prefilter.py`), only those sequences are searched, with
+    E-values still computed against the size of the whole proteome.
+
+    Returns:
+        int: Number of hits written.
+    """
+    sequences = read_proteome(proteome_file, profiles[0].alphabet if profiles else None)
+    if candidate_ids is None:
+        hits = search_block(profiles, sequences, cpus)
+    else:
+        hits = search_block(profiles, subset_block(sequences, candidate_ids), cpus, z=len(sequences))
+    save_hit_table(hits, output_file)
+    return hits.num_rows
+
+def write_shard_hit_tables(profiles, shard_file, sequence_counts, output_files, cpus=1):
+    """
+    Searches the proteomes of a shard, reading the shard once, and writes one hit table per proteome.
+
+    Each proteome is searched as its own slice of the shard's sequence block, so its
+    E-values are those of a per-pair search. Proteomes whose output file is None are
+    skipped, which lets a rerun search only the pending members of a shard.
+
+    Args:
+        profiles (list): Optimised profiles, see `worker_profiles`.
+        shard_file (Path): Shard FASTA written by `proteome_shards.pack_proteomes`.
+        sequence_counts (list): Number of sequences of each proteome, in shard order.
+        output_files (list): Hit table path of each proteome (or None to skip it), in shard order.
+        cpus (int): Threads pyhmmer uses for each search.
+
+    Returns:
+        int: Number of hits written.
+
+    Raises:
+        ValueError: If the shard does not hold the number of sequences its index lists.
+    """
+    sequences = read_proteome(shard_file, profiles[0].alphabet if profiles else None)
+    if len(sequences) != sum(sequence_counts):
+        raise ValueError(f"{shard_file} holds {len(sequences)} sequences, its index lists {sum(sequence_counts)}")
+
+    start, total_hits = 0, 0
+    for count, output_file in zip(sequence_counts, output_files):
+        if output_file is not None:
+            hits = search_block(profiles, sequences[start:start + count], cpus, tagged=True)
+            save_hit_table(hits, output_file)
+            total_hits += hits.num_rows
+        start += count
+    return total_hits
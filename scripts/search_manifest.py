@@ -0,0 +1,93 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from file_utils import file_digest
+
+class SearchManifest:
+    """
+    Append-only JSONL record of completed HMMER searches.
+
+    Each line records one (profile, proteome) job: content hashes of both inputs, the
+    tblout path and the exit status. A job is considered done when a successful record
+    exists for the current input hashes and its output file is still present, so reruns
+    only execute missing or stale pairs. File hashes are cached against size and mtime,
+    which keeps reruns over unchanged inputs down to a `stat` per file.
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = Path(manifest_file)
+        self.completed = {}  # (profile_hash, proteome_hash, output) -> record
+        self.hash_cache = {}  # (path, size, mtime_ns) -> hash
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Reads existing records, ignoring a truncated last line left by a crash."""
+        if not self.manifest_file.exists():
+            return
+
+        with open(self.manifest_file, 'r') as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                for role in ("profile", "proteome"):
+                    stat_key = (record[role], record[f"{role}_size"], record[f"{role}_mtime_ns"])
+                    self.hash_cache[stat_key] = record[f"{role}_hash"]
+
+                key = (record["profile_hash"], record["proteome_hash"], record["output"])
+                if record["exit_status"] == 0:
+                    self.completed[key] = record
+                else:
+                    self.completed.pop(key, None)
+
+        logging.info(f"📒 Loaded {len(self.completed)} completed searches from {self.manifest_file}")
+
+    def _stat_key(self, path):
+        stat = os.stat(path)
+        return (str(path), stat.st_size, stat.st_mtime_ns)
+
+    def file_hash(self, path):
+        """Returns the content hash of a file, reusing the cached value if it is unchanged."""
+        stat_key = self._stat_key(path)
+        with self._lock:
+            cached = self.hash_cache.get(stat_key)
+        if cached is None:
+            cached = file_digest(path)
+            with self._lock:
+                self.hash_cache[stat_key] = cached
+        return cached
+
+    def is_done(self, profile_file, proteome_file, output_file):
+        """Checks whether this exact (profile, proteome) search already completed successfully."""
+        key = (self.file_hash(profile_file), self.file_hash(proteome_file), str(output_file))
+        with self._lock:
+            done = key in self.completed
+        return done and Path(output_file).exists()
+
+    def record(self, profile_file, proteome_file, output_file, exit_status):
+        """Appends a job record to the manifest."""
+        record = {"output": str(output_file), "exit_status": exit_status}
+        for role, path in (("profile", profile_file), ("proteome", proteome_file)):
+            stat_key = self._stat_key(path)
+            record.update({
+                role: stat_key[0],
+                f"{role}_size": stat_key[1],
+                f"{role}_mtime_ns": stat_key[2],
+                f"{role}_hash": self.file_hash(path),
+            })
+        record["completed_at"] = datetime.now().isoformat(timespec="seconds")
+
+        key = (record["profile_hash"], record["proteome_hash"], record["output"])
+        with self._lock:
+            with open(self.manifest_file, 'a') as handle:
+                handle.write(json.dumps(record) + "\n")
+            if exit_status == 0:
+                self.completed[key] = record
+            else:
+                self.completed.pop(key, None)
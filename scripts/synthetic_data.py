@@ -0,0 +1,254 @@
+import gzip
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tqdm import tqdm
+from complex_i_analysis import VARIANTS_FILE
+from mock_hmmsearch import MOTIF_PREFIX, search as mock_search
+
+AMINO_ACIDS = b"ACDEFGHIKLMNPQRSTVWY"
+NUCLEOTIDES = b"ACGT"
+# One non-stop codon per amino acid, for back-translating proteins into CDS (table 11)
+CODONS = {
+    'A': "GCT", 'C': "TGT", 'D': "GAT", 'E': "GAA", 'F': "TTT", 'G': "GGT", 'H': "CAT", 'I': "ATT", 'K': "AAA",
+    'L': "CTG", 'M': "ATG", 'N': "AAT", 'P': "CCG", 'Q': "CAG", 'R': "CGT", 'S': "TCT", 'T': "ACC", 'V': "GTT",
+    'W': "TGG", 'Y': "TAT",
+}
+STOP_CODON = "TAA"
+MOTIF_LENGTH = 12  # A random 12-mer essentially never occurs by chance in the background proteins
+PROTEIN_LENGTH = (80, 500)
+BACKGROUND_GAP = (20, 150)
+OPERON_GAP = (0, 100)  # Well below the default intergenic distance of 250 bp
+SPLIT_GAP = 2_000  # Splits an operon into two clusters
+PLASMID_GENE_FRACTION = 0.1
+GENOME_LINE_WIDTH = 80
+PROTEIN_LINE_WIDTH = 60
+# Profile names follow Subunit_SeqsClustThreshold_HMMParameter
+PROFILE_NAME = "{subunit}_0.85_synthetic"
+
+# Share of genomes per planted layout: a complete variant operon, an operon split by a
+# long gap (two Nuo-Partial clusters) or no Complex I at all
+LAYOUT_WEIGHTS = {'operon': 0.8, 'split': 0.1, 'absent': 0.1}
+
+_CODON_TABLE = np.zeros((256, 3), dtype=np.uint8)
+for _residue, _codon in CODONS.items():
+    _CODON_TABLE[ord(_residue)] = np.frombuffer(_codon.encode(), dtype=np.uint8)
+
+def wrap(sequence, width):
+    """Returns a sequence as FASTA lines of `width` characters (str or bytes)."""
+    newline = b"\n" if isinstance(sequence, bytes) else "\n"
+    return newline.join(sequence[i:i + width] for i in range(0, len(sequence), width)) + newline
+
+def back_translate(protein):
+    """Returns a CDS encoding `protein`, ending in a stop codon."""
+    codons = _CODON_TABLE[np.frombuffer(protein.encode(), dtype=np.uint8)]
+    return codons.tobytes().decode() + STOP_CODON
+
+def genome_names(index):
+    """Returns the assembly accession and file name stem of the `index`-th synthetic genome."""
+    assembly = f"GCA_{900_000_000 + index:09d}.1"
+    return assembly, f"{assembly}_SYN{index:05d}"
+
+def _random_protein(rng, length):
+    residues = np.frombuffer(AMINO_ACIDS, dtype=np.uint8)[rng.integers(0, len(AMINO_ACIDS), length)]
+    return "M" + residues[1:].tobytes().decode()
+
+def _place_genes(rng, proteins, gaps):
+    """Lays genes out along a replicon; returns (start, end) per gene and the replicon end."""
+    coordinates, position = [], 1
+    for protein, gap in zip(proteins, gaps):
+        end = position + 3 * (len(protein) + 1) - 1
+        coordinates.append((position, end))
+        position = end + 1 + gap
+    return coordinates, position
+
+def _build_genome(task):
+    """Generates and writes the genome, CDS and proteome FASTA of one synthetic genome."""
+    index, seed, scale, layout, operon, motifs, dirs = task
+    rng = np.random.default_rng([seed, index])
+    assembly, stem = genome_names(index)
+    has_plasmid = rng.random() < scale['plasmid_fraction']
+
+    replicons = [(f"NZ_SYC{index:06d}.1", 'chromosome')]
+    if has_plasmid:
+        replicons.append((f"NZ_SYP{index:06d}.1", 'plasmid'))
+
+    genome_lines, cds_lines, protein_lines, truth = [], [], [], []
+    counts = {'cds_records': 0, 'nuo_proteins': 0, 'chromosome_nuo_cds': 0, 'genome_bp': 0}
+    gene_total = scale['genes_per_genome']
+    plasmid_genes = int(gene_total * PLASMID_GENE_FRACTION) if has_plasmid else 0
+
+    for replicon_number, (accession, kind) in enumerate(replicons, start=1):
+        n_genes = gene_total - plasmid_genes if kind == 'chromosome' else plasmid_genes
+        proteins = [_random_protein(rng, n) for n in rng.integers(*PROTEIN_LENGTH, n_genes)]
+        subunits = [None] * n_genes
+        strands = list(rng.choice([1, -1], n_genes))
+        gaps = list(rng.integers(*BACKGROUND_GAP, n_genes))
+
+        if kind == 'chromosome' and layout != 'absent':
+            operon_proteins, operon_gaps = [], list(rng.integers(*OPERON_GAP, len(operon)))
+            for subunit in operon:
+                protein = _random_protein(rng, rng.integers(*PROTEIN_LENGTH))
+                position = rng.integers(1, len(protein) - MOTIF_LENGTH)
+                operon_proteins.append(protein[:position] + motifs[subunit] + protein[position + MOTIF_LENGTH:])
+            operon_gaps[-1] = gaps[0]
+            if layout == 'split':
+                operon_gaps[len(operon) // 2 - 1] = SPLIT_GAP
+            strand = int(rng.choice([1, -1]))
+            insert_at = int(rng.integers(0, n_genes + 1))
+            proteins[insert_at:insert_at] = operon_proteins
+            subunits[insert_at:insert_at] = operon
+            strands[insert_at:insert_at] = [strand] * len(operon)
+            gaps[insert_at:insert_at] = operon_gaps
+
+            variant = layout_variant(layout, operon)
+            truth.extend((f"{stem}_genomic.fna.gz", accession, strand, part) for part in variant)
+            counts['nuo_proteins'] += len(operon)
+            counts['chromosome_nuo_cds'] += len(operon)
+
+        coordinates, replicon_end = _place_genes(rng, proteins, gaps)
+        length = max(int(scale['genome_length'] * (1 - PLASMID_GENE_FRACTION if kind == 'chromosome' and has_plasmid
+                                                  else PLASMID_GENE_FRACTION if kind == 'plasmid' else 1)), replicon_end)
+        description = (f"Synthetica bacterium strain {index} chromosome, complete genome" if kind == 'chromosome'
+                       else f"Synthetica bacterium strain {index} plasmid pSYN{index}, complete sequence")
+        sequence = np.frombuffer(NUCLEOTIDES, dtype=np.uint8)[rng.integers(0, 4, length)].tobytes()
+        genome_lines.append(f">{accession} {description}\n".encode() + wrap(sequence, GENOME_LINE_WIDTH))
+        counts['genome_bp'] += length
+
+        for gene_number, (protein, subunit, strand, (start, end)) in enumerate(zip(proteins, subunits, strands, coordinates), start=1):
+            gene = f"nuo{subunit[3:]}" if subunit else f"syn{gene_number}"
+            product = f"NADH-quinone oxidoreductase subunit {subunit[3:]}" if subunit else "hypothetical protein"
+            protein_id = f"WP_{index:06d}{replicon_number}{gene_number:05d}.1"
+            location = f"{start}..{end}" if strand == 1 else f"complement({start}..{end})"
+            cds_lines.append(
+                f">lcl|{accession}_cds_{protein_id}_{gene_number} [gene={gene}] [locus_tag=SYN{index}_{gene_number:05d}] "
+                f"[protein={product}] [protein_id={protein_id}] [location={location}] [gbkey=CDS]\n"
+                + wrap(back_translate(protein), GENOME_LINE_WIDTH)
+            )
+            protein_lines.append(
+                f">{accession}_{gene_number} # {start} # {end} # {strand} # ID={replicon_number}_{gene_number};partial=00;start_type=ATG\n"
+                + wrap(protein + "*", PROTEIN_LINE_WIDTH)
+            )
+        counts['cds_records'] += len(proteins)
+
+    with gzip.open(dirs['genomes_dir'] / f"{stem}_genomic.fna.gz", 'wb', compresslevel=1) as handle:
+        handle.writelines(genome_lines)
+    with gzip.open(dirs['cds_dir'] / f"{stem}_cds_from_genomic.fna.gz", 'wt', compresslevel=1) as handle:
+        handle.writelines(cds_lines)
+    with open(dirs['proteomes_dir'] / f"{stem}_cds_proteins.faa", 'w') as handle:
+        handle.writelines(protein_lines)
+
+    counts['replicons'] = len(replicons)
+    counts['proteins'] = counts['cds_records']
+    return counts, truth
+
+def layout_variant(layout, operon):
+    """Returns the expected classification of each cluster a planted operon forms."""
+    return ['Nuo-Partial', 'Nuo-Partial'] if layout == 'split' else [operon.variant]
+
+class Operon(list):
+    """Ordered subunits of a planted operon, remembering the variant they were taken from."""
+
+    def __init__(self, subunits, variant):
+        super().__init__(subunits)
+        self.variant = variant
+
+def write_profiles(profiles_dir, motifs):
+    """Writes one minimal HMMER3 profile per subunit, carrying its motif for `mock_hmmsearch.py`."""
+    profile_files = []
+    for subunit, motif in motifs.items():
+        name = PROFILE_NAME.format(subunit=subunit)
+        profile_file = profiles_dir / f"{name}.hmm"
+        with open(profile_file, 'w') as handle:
+            handle.write(f"HMMER3/f [synthetic]\nNAME  {name}\nDESC  {MOTIF_PREFIX}{motif}\nLENG  {MOTIF_LENGTH}\nALPH  amino\n//\n")
+        profile_files.append(profile_file)
+    return profile_files
+
+def _search_proteome(task):
+    profile_files, proteome_file, results_dir = task
+    for profile_file in profile_files:
+        output_dir = results_dir / profile_file.stem
+        mock_search(profile_file, proteome_file, output_dir / f"{proteome_file.stem}_results.txt")
+
+def generate_dataset(genomes_dir, cds_dir, proteomes_dir, profiles_dir, results_dir, genome_dataset_file, truth_file,
+                     genomes=50, genes_per_genome=1000, genome_length=1_000_000, plasmid_fraction=0.3,
+                     species=None, seed=0, tblout=True, workers=None, variants_file=VARIANTS_FILE):
+    """
+    Writes a synthetic dataset in the layout the pipeline scripts expect.
+
+    Every genome gets a gzipped genome FASTA, an NCBI-style CDS FASTA and a prodigal-style
+    proteome sharing its assembly prefix. Chromosomes carry an operon of one Complex I
+    variant from `complex_i_variants.json` (or a split operon, or none; see
+    LAYOUT_WEIGHTS), whose proteins contain a per-subunit motif that the synthetic
+    profiles and `mock_hmmsearch.py` recognise. The expected classification of every
+    planted cluster is written to `truth_file`.
+
+    Args:
+        genomes_dir, cds_dir, proteomes_dir (Path): Sequence directories (GENOMES_DIR, CDS_DIR, PROTEOMES_DIR).
+        profiles_dir (Path): Directory for the synthetic `.hmm` profiles (HMM_PROFILES_DIR).
+        results_dir (Path): Directory for per-profile tblout results (HMM_RESULTS_DIR / HMM_PROFILES_DIR.name).
+        genome_dataset_file (Path): GenomeFile/Species/Organism table (GENOME_DATASET_FILE).
+        truth_file (Path): CSV of GenomeFile, Accession, Strand and expected Variant per planted cluster.
+        genomes (int): Number of genomes.
+        genes_per_genome (int): Background genes per genome.
+        genome_length (int): Nominal genome length in bp.
+        plasmid_fraction (float): Share of genomes with a plasmid.
+        species (int): Number of species genomes are spread over (default: one per 5 genomes).
+        seed (int): Random seed; the same seed and scale give identical files.
+        tblout (bool): Also write mock hmmsearch results, so result processing can run without step 09.
+        workers (int): Number of worker processes (default: number of CPUs).
+        variants_file (Path): Variant definitions to plant.
+
+    Returns:
+        dict: Dataset counts (genomes, replicons, genome_bp, cds_records, proteins, nuo_proteins,
+            chromosome_nuo_cds, profiles, searches, planted_clusters).
+    """
+    with open(variants_file, 'r') as handle:
+        variants = json.load(handle)['variants']
+    for directory in (genomes_dir, cds_dir, proteomes_dir, profiles_dir, results_dir, Path(genome_dataset_file).parent, Path(truth_file).parent):
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    subunits = sorted({subunit for variant_subunits in variants.values() for subunit in variant_subunits})
+    motifs = {subunit: np.frombuffer(AMINO_ACIDS, dtype=np.uint8)[rng.integers(0, len(AMINO_ACIDS), MOTIF_LENGTH)].tobytes().decode()
+              for subunit in subunits}
+    profile_files = write_profiles(Path(profiles_dir), motifs)
+
+    scale = {'genes_per_genome': genes_per_genome, 'genome_length': genome_length, 'plasmid_fraction': plasmid_fraction}
+    dirs = {'genomes_dir': Path(genomes_dir), 'cds_dir': Path(cds_dir), 'proteomes_dir': Path(proteomes_dir)}
+    layouts = rng.choice(list(LAYOUT_WEIGHTS), genomes, p=list(LAYOUT_WEIGHTS.values()))
+    variant_names = rng.choice(list(variants), genomes)
+    tasks = [
+        (index, seed, scale, layout, Operon(variants[variant], variant), motifs, dirs)
+        for index, (layout, variant) in enumerate(zip(layouts, variant_names), start=1)
+    ]
+
+    totals, truth = {}, []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for counts, genome_truth in tqdm(executor.map(_build_genome, tasks, chunksize=4), total=genomes, desc="Generating genomes"):
+            for key, value in counts.items():
+                totals[key] = totals.get(key, 0) + value
+            truth.extend(genome_truth)
+
+        if tblout:
+            for profile_file in profile_files:
+                (Path(results_dir) / profile_file.stem).mkdir(parents=True, exist_ok=True)
+            proteome_files = sorted(Path(proteomes_dir).glob("*.faa"))
+            searches = [(profile_files, proteome_file, Path(results_dir)) for proteome_file in proteome_files]
+            list(tqdm(executor.map(_search_proteome, searches, chunksize=4), total=len(searches), desc="Writing mock results"))
+
+    n_species = species or max(1, genomes // 5)
+    dataset = pd.DataFrame({
+        'Assembly Accession': [genome_names(index)[0] for index in range(1, genomes + 1)],
+        'GenomeFile': [f"{genome_names(index)[1]}_genomic.fna.gz" for index in range(1, genomes + 1)],
+        'Species': [f"Synthetica species{index % n_species}" for index in range(1, genomes + 1)],
+        'Organism': 'Bacteria',
+    })
+    dataset.to_csv(genome_dataset_file, index=False)
+    pd.DataFrame(truth, columns=['GenomeFile', 'Accession', 'Strand', 'Variant']).to_csv(truth_file, index=False)
+
+    totals.update(genomes=genomes, profiles=len(profile_files), searches=len(profile_files) * genomes,
+                  planted_clusters=len(truth))
+    return {key: int(value) for key, value in totals.items()}
@@ -0,0 +1,194 @@
+import os
+import csv
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Ranks kept in the taxonomy table, mapped to their column names
+RANK_COLUMNS = {
+    'superkingdom': 'Superkingdom', 'phylum': 'Phylum', 'class': 'Class', 'order': 'Order',
+    'family': 'Family', 'genus': 'Genus', 'species': 'Species', 'strain': 'Strain',
+}
+# Taxdumps from 2025 on name the top rank "domain"
+RANK_ALIASES = {'domain': 'superkingdom'}
+TAXONOMY_COLUMNS = ['TaxID', 'Organism', *RANK_COLUMNS.values(), 'Lineage']
+TAXDUMP_FILES = ('nodes.dmp', 'names.dmp', 'merged.dmp', 'delnodes.dmp')
+ROOT_TAXID = 1
+
+def parse_lineages(lineages):
+    """
+    Converts `;`-separated lineage strings into one column per rank.
+
+    Names and ranks are split into aligned wide tables, stacked to long form and pivoted
+    on rank, so no Python code runs per TaxID. When a rank occurs twice in a lineage the
+    deepest name is kept.
+
+    Args:
+        lineages (pd.DataFrame): TaxID, FullLineage and FullLineageRanks, as from
+            `taxonkit lineage` / `pytaxonkit.lineage(..., formatstr="{s}")`.
+
+    Returns:
+        pd.DataFrame: TAXONOMY_COLUMNS, one row per input row. Organism is the second
+            lineage entry (the domain below "cellular organisms").
+    """
+    lineages = lineages.reset_index(drop=True)
+    names = lineages['FullLineage'].fillna('').str.split(';', expand=True)
+    ranks = lineages['FullLineageRanks'].fillna('').str.split(';', expand=True).replace(RANK_ALIASES)
+
+    long = pd.DataFrame({'Name': names.stack(), 'Rank': ranks.stack()}).dropna()
+    long = long[long['Rank'].isin(list(RANK_COLUMNS))]
+    long.index = long.index.get_level_values(0)
+    by_rank = (
+        long.reset_index(names='Row')
+        .drop_duplicates(['Row', 'Rank'], keep='last')
+        .pivot(index='Row', columns='Rank', values='Name')
+        .reindex(index=lineages.index, columns=list(RANK_COLUMNS))
+        .rename(columns=RANK_COLUMNS)
+    )
+
+    taxonomy = pd.DataFrame({
+        'TaxID': lineages['TaxID'].astype(str),
+        'Organism': names[1] if names.shape[1] > 1 else None,
+    })
+    taxonomy = taxonomy.join(by_rank)
+    taxonomy['Lineage'] = lineages['FullLineage']
+    return taxonomy[TAXONOMY_COLUMNS]
+
+def taxdump_version(taxdump_dir):
+    """Returns a short fingerprint of a taxdump directory from the size and mtime of its files."""
+    digest = hashlib.blake2b(digest_size=8)
+    for file_name in TAXDUMP_FILES:
+        path = Path(taxdump_dir) / file_name
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{file_name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+def taxonkit_data_dir():
+    """Returns the taxdump directory taxonkit reads (TAXONKIT_DB or ~/.taxonkit)."""
+    return Path(os.environ.get('TAXONKIT_DB', Path.home() / '.taxonkit'))
+
+def _read_dmp(path, columns):
+    """Reads selected fields of a `\\t|\\t`-separated taxdump file with the C parser."""
+    # Splitting on tabs leaves the `|` separators in odd columns, so field i is column 2*i
+    return pd.read_csv(path, sep='\t', header=None, usecols=[2 * i for i in columns],
+                       quoting=csv.QUOTE_NONE, dtype=str, keep_default_na=False)
+
+class Taxdump:
+    """
+    Lineage lookup straight from a local NCBI taxdump (`nodes.dmp`, `names.dmp`, `merged.dmp`).
+
+    Parent pointers are held as a NumPy index array, and lineages for all requested TaxIDs
+    are built by stepping every ID towards the root at once, so no taxonkit install or
+    network access is needed.
+    """
+
+    def __init__(self, taxdump_dir):
+        self.taxdump_dir = Path(taxdump_dir)
+        nodes = _read_dmp(self.taxdump_dir / 'nodes.dmp', [0, 1, 2])
+        nodes.columns = ['TaxID', 'Parent', 'Rank']
+        names = _read_dmp(self.taxdump_dir / 'names.dmp', [0, 1, 3])
+        names.columns = ['TaxID', 'Name', 'NameClass']
+        scientific = names[names['NameClass'] == 'scientific name'].drop_duplicates('TaxID').set_index('TaxID')['Name']
+
+        self.taxids = pd.Index(nodes['TaxID'].astype(np.int64))
+        self.parent = self.taxids.get_indexer(nodes['Parent'].astype(np.int64))
+        self.ranks = nodes['Rank'].to_numpy(dtype=object)
+        self.names = scientific.reindex(nodes['TaxID']).fillna('').to_numpy(dtype=object)
+
+        merged_file = self.taxdump_dir / 'merged.dmp'
+        if merged_file.exists():
+            merged = _read_dmp(merged_file, [0, 1]).astype(np.int64)
+            self.merged = dict(zip(merged[0], merged[2]))
+        else:
+            self.merged = {}
+
+    def lineage(self, taxids):
+        """
+        Builds root-to-leaf lineages, excluding the root node, in taxonkit's format.
+
+        Args:
+            taxids (iterable): TaxIDs; merged IDs resolve to their replacement, unknown or
+                deleted IDs get an empty lineage.
+
+        Returns:
+            pd.DataFrame: TaxID, FullLineage and FullLineageRanks.
+        """
+        taxids = pd.Series(list(taxids), dtype=str)
+        numeric = pd.to_numeric(taxids, errors='coerce').fillna(-1).astype(np.int64)
+        current = self.taxids.get_indexer(numeric.map(self.merged).fillna(numeric).astype(np.int64))
+
+        rows, steps = [], []
+        row = np.arange(len(taxids))
+        active = current >= 0
+        while active.any():
+            rows.append(row[active])
+            steps.append(current[active])
+            parent = self.parent[current]
+            active &= (parent != current) & (parent >= 0)
+            current = np.where(active, parent, current)
+
+        path = pd.DataFrame({
+            'Row': np.concatenate(rows) if rows else np.array([], dtype=np.int64),
+            'Node': np.concatenate(steps) if steps else np.array([], dtype=np.int64),
+        })
+        path = path[self.taxids[path['Node']] != ROOT_TAXID]
+        # Nodes were collected leaf-first; reverse within each row for root-to-leaf order
+        path = path.iloc[::-1].sort_values('Row', kind='stable')
+        path['Name'] = self.names[path['Node']]
+        path['Rank'] = self.ranks[path['Node']]
+
+        joined = path.groupby('Row').agg({'Name': ';'.join, 'Rank': ';'.join}).reindex(range(len(taxids)))
+        return pd.DataFrame({
+            'TaxID': taxids,
+            'FullLineage': joined['Name'].fillna('').to_numpy(),
+            'FullLineageRanks': joined['Rank'].fillna('').to_numpy(),
+        })
+
+def resolve_taxonomy(taxids, cache_dir, taxdump_dir=None, threads=None):
+    """
+    Returns the rank table for a set of TaxIDs, resolving only those not cached yet.
+
+    Resolved rows are cached in `cache_dir` in a file keyed by the taxdump version, so a
+    refresh against the same taxdump only resolves new TaxIDs, and a new taxdump starts a
+    fresh cache.
+
+    Args:
+        taxids (iterable): TaxIDs to resolve.
+        cache_dir (Path): Directory for cached rank tables.
+        taxdump_dir (Path): Local NCBI taxdump to read directly; if None, `pytaxonkit` is
+            used with taxonkit's own data directory.
+        threads (int): taxonkit threads (default: number of CPUs).
+
+    Returns:
+        pd.DataFrame: TAXONOMY_COLUMNS for the requested TaxIDs.
+    """
+    taxids = pd.unique(pd.Series(list(taxids)).astype(str))
+    version = taxdump_version(taxdump_dir if taxdump_dir is not None else taxonkit_data_dir())
+    cache_dir = Path(cache_dir)
+    cache_file = cache_dir / f"taxonomy_{version}.csv"
+
+    cached = pd.read_csv(cache_file, dtype=str) if cache_file.exists() else pd.DataFrame(columns=TAXONOMY_COLUMNS)
+    missing = np.setdiff1d(taxids, cached['TaxID'].to_numpy(dtype=str))
+    logging.info(f"🧬 Taxonomy cache {cache_file.name}: {len(taxids) - len(missing)} cached, {len(missing)} to resolve")
+
+    if len(missing):
+        if taxdump_dir is not None:
+            lineages = Taxdump(taxdump_dir).lineage(missing)
+        else:
+            import pytaxonkit
+            lineages = pytaxonkit.lineage(list(missing), formatstr="{s}", threads=threads or os.cpu_count())
+        cached = pd.concat([cached, parse_lineages(lineages)], ignore_index=True)
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(".tmp")
+        cached.to_csv(temp_file, index=False)
+        os.replace(temp_file, cache_file)
+
+    return cached[cached['TaxID'].isin(taxids)].drop_duplicates().reset_index(drop=True)
+
+def load_taxonomy(taxonomy_file):
+    """Reads the taxonomy table written by `02_fetch_taxonomy_prepare_downloads.py`, keeping TaxIDs as strings."""
+    return pd.read_csv(taxonomy_file, dtype={'TaxID': str})
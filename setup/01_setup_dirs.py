@@ -28,6 +28,7 @@ subdirs = {
     "hmm_clust_seqs": base_dir / "data/hmm_data/clustered_prot_seqs",
     "hmm_msa_seqs": base_dir / "data/hmm_data/clustered_msa_seqs",
     "hmm_combined_seqs": base_dir / "data/hmm_data/combined_interpro_cds_seqs",
+    "hmm_results": base_dir / "data/hmm_data/results",
 }
 
 # Create directories if they don't exist
@@ -36,15 +37,18 @@ for key, path in subdirs.items():
     print(f"✅ Created: {path}")
 
 # Generate `config.py`
-config_content = f"""from pathlib import Path
+config_content = f"""import os
+from pathlib import Path
 
-BASE_DIR = Path("{base_dir}")
+# NUOHMMER_BASE_DIR overrides the project root, e.g. to run against synthetic benchmark data
+BASE_DIR = Path(os.environ.get("NUOHMMER_BASE_DIR", "{base_dir}"))
 
 # Data directories
 SEQUENCE_DATA_DIR = BASE_DIR / "data/sequence_data"
 GENOMES_DIR = SEQUENCE_DATA_DIR / "genomes"
 CDS_DIR = SEQUENCE_DATA_DIR / "cds"
 PROTEOMES_DIR = SEQUENCE_DATA_DIR / "proteomes"
+PROTEOME_INDEX_FILE = SEQUENCE_DATA_DIR / "proteome_index.sqlite"
 
 # Metadata directories
 GENOMIC_METADATA_DIR = BASE_DIR / "data/genomic_metadata"
@@ -63,19 +67,35 @@ HMM_CDS_SEQS_DIR = HMM_ANALYSIS_DIR / "cds_prot_seqs"
 HMM_CLUST_SEQS_DIR = HMM_ANALYSIS_DIR / "clustered_prot_seqs"
 HMM_MSA_SEQS_DIR = HMM_ANALYSIS_DIR / "clustered_msa_seqs"
 HMM_COMBINED_SEQS_DIR = HMM_ANALYSIS_DIR / "combined_interpro_cds_seqs"
+HMM_PROTEOMES_DIR = PROTEOMES_DIR
+HMM_PROTEOME_SHARDS_DIR = SEQUENCE_DATA_DIR / "proteome_shards"
+HMM_RESULTS_DIR = HMM_ANALYSIS_DIR / "results"
+HMM_HIT_TABLES_DIR = HMM_RESULTS_DIR / "hit_tables"
+HMM_PREFILTERED_RESULTS_DIR = HMM_ANALYSIS_DIR / "prefiltered_results"
+HIT_STORE_FILE = HMM_RESULTS_DIR / "hit_store.sqlite"
+PAIRWISE_CACHE_FILE = HMM_ANALYSIS_DIR / "pairwise_alignment_cache.sqlite"
 
 # Output directories
 OUTPUT_DIR = SEQUENCE_DATA_DIR / "clustered_protein_sequences"
+# Per-run resource reports (JSON) and profiler dumps of the pipeline scripts
+RUN_REPORTS_DIR = BASE_DIR / "run_reports"
 
 # Specific file paths
 PROKARYOTES_FILE = NCBI_GENOME_RECORDS_DIR / "prokaryotes.txt"
 GENOME_DATASET_FILE = GENOME_METADATA_DIR / "genomes_dataset.csv"
+TAXONOMY_FILE = NCBI_GENOME_RECORDS_DIR / "taxonomy.csv"
+TAXONOMY_CACHE_DIR = NCBI_GENOME_RECORDS_DIR / "taxonomy_cache"
+ASSEMBLY_SNAPSHOT_FILE = NCBI_GENOME_RECORDS_DIR / "assemblies_snapshot.csv"
+ASSEMBLY_DELTA_FILE = NCBI_GENOME_RECORDS_DIR / "assembly_delta.csv"
 NUO_CDS_FILE = CDS_METADATA_DIR / "nuo_cds_prescreened.csv"
 NDU_CDS_FILE = CDS_METADATA_DIR / "ndu_cds_prescreened.csv"
 GENOME_METADATA_FILE = GENOME_METADATA_DIR / "genomes_metadata.csv"
 
 # InterPro classification file (NEW)
 INTERPRO_CSV = EXTERNAL_METADATA_DIR / "nuo_interpro_classification_accessions.csv"
+
+# Local NCBI taxdump (nodes.dmp, names.dmp, merged.dmp); used instead of taxonkit when present
+TAXDUMP_DIR = EXTERNAL_METADATA_DIR / "taxdump"
 """
 
 # Write config.py
@@ -0,0 +1,96 @@
+import sys
+import json
+import hashlib
+import importlib
+import threading
+from functools import partial
+from pathlib import Path
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+download_genomes = importlib.import_module("03_download_genomes_cds")
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler without request logging; it ignores Range headers and always replies 200."""
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "server" / "GCA_000000001.1_ASM1v1"
+    root.mkdir(parents=True)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(tmp_path / "server")))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{httpd.server_port}/{root.name}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def make_downloader(tmp_path):
+    manifest = download_genomes.DownloadManifest(tmp_path / "manifest.jsonl")
+    return download_genomes.Downloader(manifest, max_retries=0, timeout=5)
+
+def publish(root, name, content, checksum=None):
+    (root / name).write_bytes(content)
+    checksum = checksum or hashlib.md5(content).hexdigest()
+    (root / download_genomes.CHECKSUM_FILE_NAME).write_text(f"{checksum}  ./{name}\n")
+
+def manifest_statuses(tmp_path):
+    return [json.loads(line)["status"] for line in (tmp_path / "manifest.jsonl").read_text().splitlines()]
+
+def test_fresh_download_then_skip(tmp_path, server):
+    root, base_url = server
+    content = b">seq1\nMKV\n" * 1000
+    publish(root, "genomic.fna.gz", content)
+    target_dir = tmp_path / "genomes"
+    target_dir.mkdir()
+
+    assert make_downloader(tmp_path).download(f"{base_url}/genomic.fna.gz", target_dir) == "downloaded"
+    assert (target_dir / "genomic.fna.gz").read_bytes() == content
+    assert make_downloader(tmp_path).download(f"{base_url}/genomic.fna.gz", target_dir) == "skipped"
+    assert manifest_statuses(tmp_path) == ["ok"]
+
+def test_range_request_answered_with_200(tmp_path, server):
+    root, base_url = server
+    content = b">seq1\nMKV\n" * 1000
+    publish(root, "genomic.fna.gz", content)
+    target_dir = tmp_path / "genomes"
+    target_dir.mkdir()
+    # A leftover partial transfer makes the downloader send a Range request, which the server ignores
+    (target_dir / "genomic.fna.gz.part").write_bytes(content[:100])
+
+    assert make_downloader(tmp_path).download(f"{base_url}/genomic.fna.gz", target_dir) == "downloaded"
+    assert (target_dir / "genomic.fna.gz").read_bytes() == content
+    assert not (target_dir / "genomic.fna.gz.part").exists()
+
+def test_checksum_mismatch_fails(tmp_path, server):
+    root, base_url = server
+    publish(root, "genomic.fna.gz", b">seq1\nMKV\n", checksum="0" * 32)
+    target_dir = tmp_path / "genomes"
+    target_dir.mkdir()
+
+    assert make_downloader(tmp_path).download(f"{base_url}/genomic.fna.gz", target_dir) == "failed"
+    assert not (target_dir / "genomic.fna.gz").exists()
+    assert manifest_statuses(tmp_path) == ["checksum_mismatch"]
+
+def test_missing_file_is_recorded_as_failed(tmp_path, server):
+    _, base_url = server
+    target_dir = tmp_path / "genomes"
+    target_dir.mkdir()
+
+    outcomes = download_genomes.download_all([f"{base_url}/missing.fna.gz"], target_dir, make_downloader(tmp_path), 2)
+    assert outcomes == {"skipped": 0, "downloaded": 0, "failed": 1}
+    assert manifest_statuses(tmp_path) == ["failed"]
+
+def test_local_file_error_is_recorded_as_failed(tmp_path, server):
+    root, base_url = server
+    publish(root, "genomic.fna.gz", b">seq1\nMKV\n")
+
+    # The target directory does not exist, so writing the partial file raises an OSError
+    downloader = make_downloader(tmp_path)
+    assert downloader.download(f"{base_url}/genomic.fna.gz", tmp_path / "missing_dir") == "failed"
+    assert manifest_statuses(tmp_path) == ["failed"]
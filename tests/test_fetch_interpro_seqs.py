@@ -0,0 +1,113 @@
+import sys
+import json
+import asyncio
+import importlib
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+fetch_interpro = importlib.import_module("07_fetch_interpro_seqs")
+
+def protein(accession, sequence):
+    return {"metadata": {"accession": accession, "name": f"{accession} name"}, "extra_fields": {"sequence": sequence}}
+
+class StubInterPro(BaseHTTPRequestHandler):
+    """Serves the API root, a two-page query for IPR000001 and a query for IPR000002 whose second page is missing."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data=None, headers=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state, base = self.server.state, f"http://127.0.0.1:{self.server.server_port}/api"
+        state["requests"].append(self.path)
+        path = urlsplit(self.path).path
+        if path == "/api/":
+            self.send_json(200, {"databases": {"interpro": {"version": state["release"]}}})
+        elif "/entry/InterPro/IPR000001/" in path:
+            self.send_json(200, {"results": [protein("P1", state["sequence"])], "next": f"{base}/pages/IPR000001/2"})
+        elif path == "/api/pages/IPR000001/2":
+            if state["throttle"]:
+                state["throttle"] -= 1
+                self.send_json(429, {"detail": "slow down"}, {"Retry-After": "0"})
+            else:
+                self.send_json(200, {"results": [protein("P2", "MKV"), protein("P3", "MAL")], "next": None})
+        elif "/entry/InterPro/IPR000002/" in path:
+            self.send_json(200, {"results": [protein("P4", "MKV")], "next": f"{base}/pages/IPR000002/2"})
+        else:
+            self.send_json(404, {"detail": "not found"})
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubInterPro)
+    server.state = {"release": "100.0", "sequence": "MSTN", "throttle": 1, "requests": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.state, f"http://127.0.0.1:{server.server_port}/api"
+    server.shutdown()
+    server.server_close()
+
+def make_fetcher(accession, api_base, tmp_path):
+    fetcher = fetch_interpro.InterProFetcher(accession, 2, "NuoA", "bacteria", api_base)
+    fetcher.output_file = tmp_path / f"nuoa_bacteria_{accession.lower()}_interpro.faa"
+    return fetcher
+
+def fetch(fetchers, api_base, cache_dir=None, refresh=False):
+    async def main():
+        session = fetch_interpro.FetchSession(concurrency=2, rate=100, max_retries=2, refresh=refresh)
+        if cache_dir is not None:
+            release = await fetch_interpro.interpro_release(session, api_base)
+            session.cache = fetch_interpro.ResponseCache(cache_dir, release)
+        return await fetch_interpro.fetch_all(fetchers, session)
+    return asyncio.run(main())
+
+def headers(fasta_file):
+    return [line[1:].split("|")[0] for line in fasta_file.read_text().splitlines() if line.startswith(">")]
+
+def test_pages_are_followed_and_throttling_retried(tmp_path, stub):
+    state, api_base = stub
+    fetcher = make_fetcher("IPR000001", api_base, tmp_path)
+
+    assert fetch([fetcher], api_base) == []
+    assert headers(fetcher.output_file) == ["P1", "P2", "P3"]
+    assert state["throttle"] == 0
+    assert state["requests"].count("/api/pages/IPR000001/2") == 2
+
+def test_failed_page_keeps_previous_output(tmp_path, stub):
+    _, api_base = stub
+    fetcher = make_fetcher("IPR000002", api_base, tmp_path)
+    fetcher.output_file.write_text(">P0|previous\nMKV\n")
+
+    assert fetch([fetcher], api_base) == [fetcher]
+    assert fetcher.output_file.read_text() == ">P0|previous\nMKV\n"
+    assert not fetcher.output_file.with_suffix(".tmp").exists()
+
+def test_cache_is_kept_per_release(tmp_path, stub):
+    state, api_base = stub
+    fetcher, cache_dir = make_fetcher("IPR000001", api_base, tmp_path), tmp_path / "cache"
+    fetch([fetcher], api_base, cache_dir)
+
+    state["sequence"] = "MSTNEW"
+    fetch([fetcher], api_base, cache_dir)
+    assert "MSTN\n" in fetcher.output_file.read_text()  # Same release: pages replayed from the cache
+
+    fetch([fetcher], api_base, cache_dir, refresh=True)
+    assert "MSTNEW" in fetcher.output_file.read_text()
+
+    state["release"], state["sequence"] = "101.0", "MSTNEXT"
+    fetch([fetcher], api_base, cache_dir)
+    assert "MSTNEXT" in fetcher.output_file.read_text()
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["100.0", "101.0"]
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from pairwise_scoring import alignment_scores, make_aligner, score_sequences
+
+REFERENCE = "MKVLAAGIVGLLLAGCSSEKPTETAKS"
+
+def test_empty_sequence_scores_zero():
+    assert alignment_scores(make_aligner(), REFERENCE, "") == (0.0, 0.0, 0.0)
+
+def test_stop_codon_only_sequence_scores_zero():
+    assert alignment_scores(make_aligner(), REFERENCE, "**") == (0.0, 0.0, 0.0)
+
+def test_score_sequences_with_empty_record(tmp_path):
+    records = [("HIT1", REFERENCE), ("HIT2", ""), ("HIT3", "*")]
+    scores = score_sequences(REFERENCE, records, tmp_path / "scores.sqlite", workers=1)
+    assert scores['ProteinAccession'].tolist() == ["HIT1", "HIT2", "HIT3"]
+    assert scores.iloc[0, 1:].tolist() == [100.0, 100.0, 100.0]
+    assert scores.iloc[1:, 1:].to_numpy().sum() == 0
@@ -0,0 +1,30 @@
+import sys
+import logging
+import importlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+# A root handler turns the script's logging.basicConfig into a no-op, so no log file is written
+logging.getLogger().addHandler(logging.NullHandler())
+process_results = importlib.import_module("10_process_hmmer_results")
+
+FIELDS = "- NuoA_85_x - {evalue} 50.0 0.1 1e-30 99.0 0.1 1.0 1 1 0 1 1 1 1"
+
+def write_tblout(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("# target name accession query name\n" + "".join(f"{row}\n" for row in rows))
+
+def test_malformed_rows_are_dropped(tmp_path):
+    write_tblout(tmp_path / "NuoA" / "good_results.txt", [f"NZ_1_1 {FIELDS.format(evalue='1e-30')} # 10 # 300 # 1"])
+    write_tblout(tmp_path / "NuoA" / "bad_results.txt", [
+        f"NZ_2_1 {FIELDS.format(evalue='1e-3x')} desc",
+        f"NZ_2_2 {FIELDS.format(evalue='1e-10')} desc",
+        "NZ_2_3 - NuoA_85_x - 1e-3",
+    ])
+
+    hits = process_results.process_hmmer_results(tmp_path).sort_values('ProteinAccession')
+    assert hits['ProteinAccession'].tolist() == ["NZ_1_1", "NZ_2_2"]
+    assert hits['ProteomeFile'].tolist() == ["good.faa", "bad.faa"]
+    assert hits[['evalue', 'BitScore', 'Bias']].notna().all().all()
+    assert hits['Start'].tolist() == [10, 0]